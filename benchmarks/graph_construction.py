@@ -0,0 +1,67 @@
+"""Benchmark building the computation graphs of bricks.
+
+The time it takes to apply a deep MLP and to build the cost and the
+generation graph of a sequence generator with attention is reported.
+Allocating the bricks is included, but initializing them is not.
+
+"""
+import timeit
+from argparse import ArgumentParser
+
+from theano import tensor
+
+from blocks.bricks import MLP, Tanh
+from blocks.bricks.attention import SequenceContentAttention
+from blocks.bricks.recurrent import GatedRecurrent
+from blocks.bricks.sequence_generators import (
+    LookupFeedback, Readout, SequenceGenerator, SoftmaxEmitter)
+
+
+def build_mlp(layers, dim):
+    mlp = MLP([Tanh()] * layers, [dim] * (layers + 1))
+    return mlp.apply(tensor.matrix('features'))
+
+
+def build_sequence_generator(dim, vocabulary_size):
+    transition = GatedRecurrent(dim, name='transition')
+    attention = SequenceContentAttention(
+        state_names=transition.apply.states, attended_dim=dim,
+        match_dim=dim, name='attention')
+    generator = SequenceGenerator(
+        Readout(readout_dim=vocabulary_size,
+                source_names=[transition.apply.states[0],
+                              attention.take_glimpses.outputs[0]],
+                emitter=SoftmaxEmitter(name='emitter'),
+                feedback_brick=LookupFeedback(vocabulary_size, dim),
+                name='readout'),
+        transition=transition, attention=attention, name='generator')
+    attended = tensor.tensor3('attended')
+    attended_mask = tensor.matrix('attended_mask')
+    cost = generator.cost_matrix(
+        tensor.lmatrix('outputs'), tensor.matrix('mask'),
+        attended=attended, attended_mask=attended_mask)
+    generated = generator.generate(
+        n_steps=10, batch_size=attended.shape[1], attended=attended,
+        attended_mask=attended_mask)
+    return cost, generated
+
+
+def main(layers, dim, vocabulary_size, repeat):
+    mlp_time = min(timeit.repeat(lambda: build_mlp(layers, dim),
+                                 number=1, repeat=repeat))
+    print("{}-layer MLP: {:.3f}s".format(layers, mlp_time))
+    generator_time = min(timeit.repeat(
+        lambda: build_sequence_generator(dim, vocabulary_size),
+        number=1, repeat=repeat))
+    print("sequence generator with attention: {:.3f}s".format(
+        generator_time))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--layers", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=10)
+    parser.add_argument("--vocabulary-size", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.layers, args.dim, args.vocabulary_size, args.repeat)
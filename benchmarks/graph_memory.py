@@ -0,0 +1,51 @@
+"""Benchmark the memory used by the graph of an attention model.
+
+The cost and generation graphs of a number of sequence generators with
+attention are built and wrapped in a model, after which the memory
+allocated since is reported, as well as the part of it which was
+allocated by Blocks itself (e.g. annotations and roles) rather than by
+Theano. Requires Python 3.4 or later, because it uses :mod:`tracemalloc`.
+
+"""
+import gc
+import os
+import tracemalloc
+from argparse import ArgumentParser
+
+import blocks
+from blocks.model import Model
+
+from graph_construction import build_sequence_generator
+
+
+def main(models, dim, vocabulary_size):
+    # Theano and Blocks allocate caches the first time a graph is built
+    build_sequence_generator(dim, vocabulary_size)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    graphs = []
+    for _ in range(models):
+        cost, generated = build_sequence_generator(dim, vocabulary_size)
+        graphs.append(Model([cost] + generated))
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = after.compare_to(before, 'filename')
+    blocks_directory = os.path.dirname(blocks.__file__)
+    print("{} models, {} variables".format(
+        len(graphs), sum(len(graph.variables) for graph in graphs)))
+    print("allocated: {:.1f} MB, by Blocks: {:.1f} MB".format(
+        sum(stat.size_diff for stat in statistics) / 2. ** 20,
+        sum(stat.size_diff for stat in statistics
+            if stat.traceback[0].filename.startswith(blocks_directory)) /
+        2. ** 20))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--models", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=10)
+    parser.add_argument("--vocabulary-size", type=int, default=30)
+    args = parser.parse_args()
+    main(args.models, args.dim, args.vocabulary_size)
@@ -0,0 +1,50 @@
+"""Benchmark lookup tables for large vocabularies.
+
+A dense lookup table and hashed lookup tables with different numbers of
+hash functions are allocated and initialized, after which the memory
+taken by their parameters and the number of indices they look up per
+second, drawn uniformly from the vocabulary, are reported.
+
+"""
+import timeit
+from argparse import ArgumentParser
+
+import numpy
+import theano
+from theano import tensor
+
+from blocks.bricks.lookup import HashedLookupTable, LookupTable
+from blocks.initialization import IsotropicGaussian
+
+
+def main(length, dim, buckets, num_hashes, batch_size, repeat):
+    indices = tensor.lvector('indices')
+    batch = numpy.random.randint(length, size=batch_size)
+    tables = [('dense', LookupTable(length, dim))]
+    tables.extend(('hashed, {} hashes'.format(num_hashes_),
+                   HashedLookupTable(length, dim, buckets, num_hashes_))
+                  for num_hashes_ in num_hashes)
+    for description, table in tables:
+        table.weights_init = IsotropicGaussian()
+        initialize_time = timeit.timeit(table.initialize, number=1)
+        lookup = theano.function([indices], table.apply(indices))
+        lookup_time = min(timeit.repeat(lambda: lookup(batch), number=1,
+                                        repeat=repeat))
+        print("{:>17}: {:>8.1f} MB, initialize {:.2f}s, "
+              "{:.2e} lookups/s".format(
+                  description, table.W.get_value(borrow=True).nbytes /
+                  2. ** 20, initialize_time, batch_size / lookup_time))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--length", type=int, default=10 ** 6)
+    parser.add_argument("--dim", type=int, default=32)
+    parser.add_argument("--buckets", type=int, default=10 ** 5)
+    parser.add_argument("--num-hashes", type=int, nargs='+',
+                        default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=10 ** 5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.length, args.dim, args.buckets, args.num_hashes,
+         args.batch_size, args.repeat)
@@ -0,0 +1,78 @@
+"""Benchmark saving and loading the parameters of a large model.
+
+A number of shared variables with random values are dumped with
+different numbers of compression threads and compression levels, and
+to a number of shards, after which the time it takes to load them again
+is reported.
+
+"""
+import os
+import timeit
+import zipfile
+from argparse import ArgumentParser
+from multiprocessing import cpu_count
+from tempfile import mkstemp
+
+import numpy
+import theano
+
+from blocks.serialization import (Shards, dump, load, load_parameter_values,
+                                  shard_paths)
+
+
+def main(parameters, size, levels, threads, shards):
+    shared_variables = [
+        theano.shared(numpy.random.randn(size, size).astype('float32'),
+                      name='parameter_{}'.format(i))
+        for i in range(parameters)]
+    print("{} parameters of {}x{}, {:.0f} MB".format(
+        parameters, size, size, parameters * size * size * 4 / 2. ** 20))
+    handle, path = mkstemp()
+    os.close(handle)
+    try:
+        settings = [(zipfile.ZIP_STORED, None, 1, None)]
+        settings.extend((zipfile.ZIP_DEFLATED, level, threads_, None)
+                        for level in levels
+                        for threads_ in sorted(set([1, threads])))
+        if shards > 1:
+            settings.append((zipfile.ZIP_STORED, None, threads, shards))
+            settings.extend((zipfile.ZIP_DEFLATED, level, threads, shards)
+                            for level in levels)
+        for compression, level, threads_, shards_ in settings:
+            def dump_():
+                with open(path, 'wb') as f:
+                    dump(shared_variables, f, compression=compression,
+                         compression_level=level, threads=threads_,
+                         shards=Shards(path, shards_, compression, level,
+                                       threads_) if shards_ else None)
+            dump_time = timeit.timeit(dump_, number=1)
+            load_time = timeit.timeit(
+                lambda: load(path, threads=threads_), number=1)
+            values_time = timeit.timeit(
+                lambda: load_parameter_values(path, threads=threads_),
+                number=1)
+            method = ('deflated' if compression == zipfile.ZIP_DEFLATED
+                      else 'stored')
+            paths = shard_paths(path)
+            print("{:>8} level {:>4} threads {:>2} shards {:>2}: dump "
+                  "{:.2f}s, load {:.2f}s, load_parameter_values {:.2f}s, "
+                  "{:.0f} MB".format(
+                      method, str(level), threads_, len(paths), dump_time,
+                      load_time, values_time,
+                      sum(os.path.getsize(path_) for path_ in
+                          [path] + paths) / 2. ** 20))
+            for shard in paths:
+                os.remove(shard)
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--parameters", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--levels", type=int, nargs='+', default=[1, 6])
+    parser.add_argument("--threads", type=int, default=cpu_count())
+    parser.add_argument("--shards", type=int, default=4)
+    args = parser.parse_args()
+    main(args.parameters, args.size, args.levels, args.threads, args.shards)
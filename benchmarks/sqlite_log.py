@@ -0,0 +1,71 @@
+"""Benchmark reading from an SQLite log which was resumed many times.
+
+A synthetic log is written directly to the database, split into a chain
+of logs that were resumed from each other, after which the time it takes
+to look up single records and to scan a whole series is reported.
+
+"""
+import os
+import random
+import timeit
+from argparse import ArgumentParser
+from tempfile import mkstemp
+from uuid import UUID, uuid4
+
+from blocks.log import SQLiteLog
+
+
+def create_log(database, iterations, resumptions):
+    """Write a synthetic log to a database and return its UUID."""
+    log = SQLiteLog(database, buffered=False)
+    uuids = [log.h_uuid] + [uuid4().hex for _ in range(resumptions)]
+    iterations_per_log = iterations // len(uuids) + 1
+    with log.conn:
+        for i, uuid in enumerate(uuids):
+            parent = uuids[i - 1] if i else None
+            log.conn.execute("INSERT OR REPLACE INTO status VALUES (?, ?, ?)",
+                             (uuid, 'resumed_from', parent))
+            times = range(i * iterations_per_log,
+                          min((i + 1) * iterations_per_log, iterations))
+            log.conn.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?)",
+                ((uuid, time, key, random.random())
+                 for time in times for key in ('cost', 'gradient_norm')))
+    log.conn.close()
+    return UUID(uuids[-1])
+
+
+def main(iterations, resumptions, lookups):
+    handle, database = mkstemp(suffix='.sqlite')
+    os.close(handle)
+    try:
+        uuid = create_log(database, iterations, resumptions)
+        log = SQLiteLog(database, buffered=False, uuid=uuid)
+        times = [random.randrange(iterations) for _ in range(lookups)]
+
+        def lookup():
+            for time in times:
+                log[time]['cost']
+
+        def scan():
+            for time in log:
+                log[time]['cost']
+
+        print("{} iterations, {} resumptions".format(iterations, resumptions))
+        print("{} key lookups: {:.3f}s".format(
+            lookups, timeit.timeit(lookup, number=1)))
+        print("len(log): {:.3f}s".format(
+            timeit.timeit(lambda: len(log), number=1)))
+        print("full series scan: {:.3f}s".format(
+            timeit.timeit(scan, number=1)))
+    finally:
+        os.remove(database)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=10 ** 6)
+    parser.add_argument("--resumptions", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.iterations, args.resumptions, args.lookups)
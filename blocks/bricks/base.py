@@ -2,17 +2,22 @@ import inspect
 from abc import ABCMeta
 from collections import OrderedDict
 from functools import wraps
+from itertools import chain
 from operator import attrgetter
 from types import MethodType
 
 import six
+import theano
 from six import add_metaclass
 from theano import tensor
-from theano.gof import Variable
+from theano.gof import Apply, Variable
 
+from blocks.config import config
 from blocks.graph import add_annotation, Annotation
-from blocks.roles import add_role, PARAMETER, INPUT, OUTPUT
-from blocks.utils import dict_union, pack, repr_attrs, reraise_as, unpack
+from blocks.initialization import parallel_initialization
+from blocks.roles import add_role, role_tuple, PARAMETER, INPUT, OUTPUT
+from blocks.utils import (dict_union, mapped_parameters, pack, repr_attrs,
+                          unpack)
 from blocks.utils.containers import AnnotatingList
 
 
@@ -89,6 +94,32 @@ class Application(object):
         the current call was made by a parent brick.
     brick : type
         The brick class to which this instance belongs.
+    memoize : bool
+        If ``True``, applying a brick again to the same variables (and
+        other arguments) returns the outputs of the first application
+        instead of building the graph anew. The arguments are compared by
+        identity for Theano variables and by value otherwise, and calls
+        with unhashable arguments are never memoized. The cached outputs
+        can be removed with :meth:`Brick.clear_application_cache`.
+        ``None`` by default, in which case
+        :attr:`~blocks.config.config.memoize_applications` is used. Can
+        be set for a brick instance, like :attr:`inputs`. Applications
+        whose graph depends on anything else, e.g. which draw from random
+        streams, must set it to ``False``, unless the state they depend
+        on is part of the :attr:`memoization_context`.
+    memoization_context : :obj:`list`
+        Objects whose state changes the graphs built by applications,
+        e.g. :class:`~blocks.bricks.BatchNormalization` bricks in
+        training mode. Applications are only memoized within the same
+        context, e.g. applying a brick within
+        :func:`~blocks.graph.batch_normalization` doesn't return the
+        outputs of an application outside of it, and vice versa.
+    args_names : list of str
+        The names of the arguments of the application function, except
+        for the first one (the brick).
+    varargs_name : str
+        The name of the variable positional arguments of the application
+        function, ``None`` if it has none.
 
     Raises
     ------
@@ -112,6 +143,8 @@ class Application(object):
 
     """
     call_stack = []
+    memoize = None
+    memoization_context = []
 
     def __init__(self, application_function):
         self.__doc__ = application_function.__doc__
@@ -119,6 +152,10 @@ class Application(object):
         self.application_name = application_function.__name__
         self.delegate_function = None
         self.properties = {}
+        # The signature is needed for every call, so it is inspected once
+        argspec = _getargspec(application_function)
+        self.args_names = argspec[0][1:]
+        self.varargs_name = argspec[1]
 
     @property
     def application_function(self):
@@ -225,9 +262,8 @@ class Application(object):
 
     @inputs.setter
     def inputs(self, inputs):
-        args_names, varargs_name, _, _ = inspect.getargspec(
-            self.application_function)
-        if not all(input_ in args_names + [varargs_name] for input_ in inputs):
+        if not all(input_ in self.args_names + [self.varargs_name]
+                   for input_ in inputs):
             raise ValueError("Unexpected inputs")
         self._inputs = inputs
 
@@ -248,14 +284,40 @@ class Application(object):
             raise ValueError
 
         brick = bound_application.brick
+        memoize = bound_application.memoize
+        if memoize is None:
+            memoize = config.memoize_applications
+        key = (_memoization_key(self.application_name, args, kwargs,
+                                self.memoization_context)
+               if memoize else None)
+        cache = (brick.__dict__.setdefault('_application_cache', {})
+                 if key is not None else {})
+        if key in cache:
+            outputs = list(cache[key][2])
+        else:
+            outputs = self._apply(bound_application, args, dict(kwargs))
+            if key is not None:
+                # The inputs are kept so that their ids aren't reused
+                cache[key] = (args, kwargs, list(outputs))
 
-        # Find the names of the inputs to the application method
-        args_names, varargs_name, _, _ = inspect.getargspec(
-            self.application_function)
-        args_names = args_names[1:]
+        # Return values
+        if as_list:
+            return outputs
+        if as_dict:
+            return OrderedDict(zip(bound_application.outputs, outputs))
+        return unpack(outputs)
+
+    def _apply(self, bound_application, args, kwargs):
+        """Build the graph of the application, returns a list of outputs."""
+        brick = bound_application.brick
+
+        # The names of the inputs to the application method
+        args_names, varargs_name = self.args_names, self.varargs_name
 
         # Construct the ApplicationCall, used to store data in for this call
         call = ApplicationCall(bound_application)
+        # Shared by the tags of all the inputs and outputs
+        annotations = (brick, call)
         args = list(args)
         if 'application' in args_names:
             args.insert(args_names.index('application'), bound_application)
@@ -269,14 +331,16 @@ class Application(object):
         # Annotate all the input variables which are Theano variables
         def copy_and_tag(variable, role, name):
             """Helper method to copy a variable and annotate it."""
-            copy = variable.copy()
+            copy = _copy(variable)
             # Theano name
-            copy.name = _variable_name(brick.name, self.name, name)
-            add_annotation(copy, brick)
-            add_annotation(copy, call)
+            copy.name = _variable_name(brick.name, self.application_name,
+                                       name)
+            # The copy has no annotations or roles yet, so they can be set
+            # without the checks of `add_annotation` and `add_role`
+            copy.tag.annotations = annotations
             # Blocks name
             copy.tag.name = name
-            add_role(copy, role)
+            copy.tag.roles = role_tuple([role])
             return copy
 
         for i, input_ in enumerate(args):
@@ -307,24 +371,22 @@ class Application(object):
             self.call_stack.pop()
 
         # Rename and annotate output variables
+        try:
+            outputs_names = bound_application.outputs
+        except AttributeError:
+            outputs_names = None
         for i, output in enumerate(outputs):
             if isinstance(output, tensor.Variable):
-                try:
-                    name = bound_application.outputs[i]
-                except AttributeError:
+                if outputs_names is None:
                     name = "output_{}".format(i)
-                except IndexError:
-                    reraise_as(ValueError("Unexpected outputs"))
+                elif i < len(outputs_names):
+                    name = outputs_names[i]
+                else:
+                    raise ValueError("Unexpected outputs")
                 # TODO Tag with dimensions, axes, etc. for error-checking
                 outputs[i] = copy_and_tag(outputs[i],
                                           OUTPUT, name)
-
-        # Return values
-        if as_list:
-            return outputs
-        if as_dict:
-            return OrderedDict(zip(bound_application.outputs, outputs))
-        return unpack(outputs)
+        return outputs
 
     # Application instances are used instead of usual methods in bricks.
     # The usual methods are not pickled per-se, similarly to classes
@@ -563,6 +625,24 @@ class Brick(Annotation):
     def __repr__(self):
         return repr_attrs(self, 'name')
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_application_cache', None)
+        return state
+
+    def clear_application_cache(self):
+        """Forget the memoized applications of this brick and its children.
+
+        Subsequent applications build new graphs, e.g. after the graph
+        was transformed by :func:`~blocks.graph.apply_dropout`. See
+        :attr:`Application.memoize`.
+
+        """
+        self.__dict__.pop('_application_cache', None)
+        for child in self.children:
+            if child is not None:
+                child.clear_application_cache()
+
     @property
     def parameters(self):
         return self._parameters
@@ -612,8 +692,10 @@ class Brick(Annotation):
                                  '{}'.format(', '.join(missing_config)))
         if not self.allocation_config_pushed:
             self.push_allocation_config()
-        for child in self.children:
-            child.allocate()
+        # The parameter files of this brick don't apply to its children
+        with mapped_parameters({}):
+            for child in self.children:
+                child.allocate()
         self.parameters = []
         self._allocate()
         self.allocated = True
@@ -631,17 +713,31 @@ class Brick(Annotation):
         """
         pass
 
-    def initialize(self):
+    def initialize(self, threads=None):
         """Initialize parameters.
 
         Intialize parameters, such as weight matrices and biases.
 
+        Parameters
+        ----------
+        threads : int, optional
+            If given, the parameters of this brick and its children are
+            generated in parallel by this number of threads, see
+            :func:`.parallel_initialization`. Every parameter then gets a
+            seed of its own, so the values are different from those of a
+            serial initialization, but they don't depend on the number of
+            threads.
+
         Notes
         -----
         If the brick has not allocated its parameters yet, this method will
         call the :meth:`allocate` method in order to do so.
 
         """
+        if threads is not None:
+            with parallel_initialization(threads):
+                self.initialize()
+            return
         if hasattr(self, 'initialization_args'):
             missing_config = [arg for arg in self.initialization_args
                               if getattr(self, arg) is NoneInitialization]
@@ -771,8 +867,37 @@ class Brick(Annotation):
             return [self]
 
 
+def _getargspec(f):
+    """Return the argument names of a function, see `inspect.getargspec`.
+
+    Uses :func:`inspect.getfullargspec` where available, which supports
+    keyword-only arguments and doesn't raise a deprecation warning.
+
+    """
+    if six.PY3:
+        return inspect.getfullargspec(f)[:4]
+    return inspect.getargspec(f)
+
+
+def _copy(variable):
+    """Copy a variable by applying the identity to it.
+
+    For tensors this builds the node of :func:`~tensor.tensor_copy`
+    directly, which gives the same result as :meth:`~tensor.copy` but
+    skips the type checks and the scalar graph of
+    :class:`~tensor.Elemwise`. These take most of the time of applying a
+    brick.
+
+    """
+    if (type(variable.type) is tensor.TensorType and
+            theano.config.compute_test_value == 'off'):
+        return Apply(tensor.tensor_copy, [variable],
+                     [variable.type()]).outputs[0]
+    return variable.copy()
+
+
 def args_to_kwargs(args, f):
-    arg_names, vararg_names, _, _ = inspect.getargspec(f)
+    arg_names, vararg_names, _, _ = _getargspec(f)
     return dict((arg_name, arg) for arg_name, arg
                 in zip(arg_names + [vararg_names], args))
 
@@ -878,11 +1003,45 @@ class ApplicationCall(Annotation):
     <blocks.bricks.base.ApplicationCall object at ...>
 
     """
+    # There is an application call for every application of a brick, so
+    # its attributes are stored in slots instead of a dictionary
+    __slots__ = ('application', '_metadata', 'auxiliary_variables',
+                 'updates')
+
     def __init__(self, application):
         self.application = application
-        self.metadata = {}
+        self._metadata = None
         super(ApplicationCall, self).__init__()
 
+    def __getstate__(self):
+        state = getattr(self, '__dict__', {}).copy()
+        state.update((slot, getattr(self, slot))
+                     for slot in ApplicationCall.__slots__)
+        return state
+
+    def __setstate__(self, state):
+        if 'metadata' in state:
+            # Application calls pickled before slots were used
+            state = dict(state)
+            state['_metadata'] = state.pop('metadata')
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    @property
+    def metadata(self):
+        """A dictionary of information about the call.
+
+        Created when it is first used.
+
+        """
+        if self._metadata is None:
+            self._metadata = {}
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value):
+        self._metadata = value
+
     def add_auxiliary_variable(self, variable, roles=None, name=None):
         if name:
             variable.name = _variable_name(
@@ -948,5 +1107,27 @@ def application(*args, **kwargs):
         return wrap_application
 
 
+def _memoization_key(application_name, args, kwargs, context):
+    """Identify the arguments and context of an application call.
+
+    Returns
+    -------
+    tuple
+        The key, or ``None`` if an argument isn't hashable.
+
+    """
+    key = [application_name, tuple(context)]
+    for name, value in chain(enumerate(args), sorted(kwargs.items())):
+        if isinstance(value, Variable):
+            key.append((name, Variable, id(value)))
+            continue
+        try:
+            hash(value)
+        except TypeError:
+            return None
+        key.append((name, type(value), value))
+    return tuple(key)
+
+
 def _variable_name(brick_name, application_name, name):
     return "{}_{}_{}".format(brick_name, application_name, name)
@@ -15,7 +15,7 @@ from ..roles import (BATCH_NORM_POPULATION_MEAN,
                      add_role)
 from ..utils import (shared_floatx_zeros, shared_floatx,
                      shared_floatx_nans)
-from .base import lazy, application
+from .base import Application, lazy, application
 from .sequences import Sequence, Feedforward, MLP
 from .interfaces import RNGMixin
 
@@ -156,9 +156,12 @@ class BatchNormalization(RNGMixin, Feedforward):
 
     def __enter__(self):
         self._training_mode.append(True)
+        # The memoized applications in inference mode can't be reused
+        Application.memoization_context.append(self)
 
     def __exit__(self, *exc_info):
         self._training_mode.pop()
+        Application.memoization_context.remove(self)
 
     def _compute_training_statistics(self, input_):
         axes = (0,) + tuple((i + 1) for i, b in
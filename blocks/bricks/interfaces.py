@@ -4,6 +4,7 @@ from six import add_metaclass
 from theano.sandbox.rng_mrg import MRG_RandomStreams
 
 from ..config import config
+from ..utils import mapped_parameters, memmap_floatx
 from .base import _Brick, Brick, lazy
 
 
@@ -130,6 +131,27 @@ class Initializable(RNGMixin, Brick):
         :meth:`~.Brick.initialize`. Only supported by bricks for which
         :attr:`has_biases` is ``True``.
     rng : :class:`numpy.random.RandomState`
+    parameter_files : dict, optional
+        A mapping from the names of parameters of this brick to ``.npy``
+        files, e.g. written by :func:`numpy.save`, from which their values
+        are memory-mapped instead of being allocated in memory. These
+        parameters are skipped by :meth:`~.Brick.initialize`, so that
+        bricks with large parameters (e.g. a :class:`.LookupTable` of
+        pretrained embeddings) start quickly, and processes which map the
+        same files share the pages that were read. See
+        :func:`~blocks.utils.memmap_floatx`. Parameters created by
+        :func:`~blocks.utils.shared_floatx_nans` or
+        :func:`~blocks.utils.shared_floatx_zeros` are never allocated in
+        memory, others are replaced after allocation. Bricks which set the
+        values of their parameters in :meth:`~.Brick._initialize` without
+        an initialization scheme need to skip parameters whose
+        ``tag.filename`` is set.
+    mmap_mode : str, optional
+        The mode in which the `parameter_files` are mapped. Defaults to
+        ``'r'``, which is suitable for inference only: updating the
+        parameters in place fails. Use ``'c'`` to train the parameters
+        without changing the files, or ``'r+'`` to write the changes to
+        the files.
 
     Attributes
     ----------
@@ -144,7 +166,7 @@ class Initializable(RNGMixin, Brick):
 
     @lazy()
     def __init__(self, weights_init=None, biases_init=None, use_bias=True,
-                 seed=None, **kwargs):
+                 seed=None, parameter_files=None, mmap_mode='r', **kwargs):
         super(Initializable, self).__init__(**kwargs)
         self.weights_init = weights_init
         if self.has_biases:
@@ -153,6 +175,24 @@ class Initializable(RNGMixin, Brick):
             raise ValueError("This brick does not support biases config")
         self.use_bias = use_bias
         self.seed = seed
+        self.parameter_files = parameter_files or {}
+        self.mmap_mode = mmap_mode
+
+    def allocate(self):
+        # Parameters created by `shared_floatx_nans` or `shared_floatx_zeros`
+        # are mapped without being allocated first, others are replaced
+        with mapped_parameters(self.parameter_files, self.mmap_mode):
+            super(Initializable, self).allocate()
+        for parameter in self.parameters:
+            filename = self.parameter_files.get(parameter.name)
+            if (filename is not None and
+                    getattr(parameter.tag, 'filename', None) != filename):
+                shape = parameter.get_value(
+                    borrow=True, return_internal_type=True).shape
+                parameter.set_value(
+                    memmap_floatx(filename, shape, self.mmap_mode),
+                    borrow=True)
+                parameter.tag.filename = filename
 
     def _push_initialization_config(self):
         for child in self.children:
@@ -1,8 +1,13 @@
 """Introduces Lookup brick."""
+import numpy
+from theano import tensor
+
 from blocks.bricks import Initializable
 from blocks.bricks.base import application, lazy
+from blocks.config import config
 from blocks.roles import WEIGHT, add_role
-from blocks.utils import check_theano_variable, shared_floatx_nans
+from blocks.utils import (check_theano_variable, memmap_floatx,
+                          shared_floatx, shared_floatx_nans)
 
 
 class LookupTable(Initializable):
@@ -18,7 +23,10 @@ class LookupTable(Initializable):
 
     Notes
     -----
-    See :class:`.Initializable` for initialization parameters.
+    See :class:`.Initializable` for initialization parameters. Pass
+    ``parameter_files={'W': filename}`` to memory-map the representations
+    from a ``.npy`` file instead of initializing them, in which case the
+    table is never allocated in memory.
 
     """
     has_bias = False
@@ -34,8 +42,17 @@ class LookupTable(Initializable):
         return self.parameters[0]
 
     def _allocate(self):
-        self.parameters.append(shared_floatx_nans((self.length, self.dim),
-                               name='W'))
+        self._allocate_table((self.length, self.dim))
+
+    def _allocate_table(self, shape):
+        filename = self.parameter_files.get('W')
+        if filename is not None:
+            W = shared_floatx(memmap_floatx(filename, shape, self.mmap_mode),
+                              name='W', borrow=True)
+            W.tag.filename = filename
+            self.parameters.append(W)
+        else:
+            self.parameters.append(shared_floatx_nans(shape, name='W'))
         add_role(self.parameters[-1], WEIGHT)
 
     def _initialize(self):
@@ -70,3 +87,109 @@ class LookupTable(Initializable):
         if name == 'indices':
             return 0
         return super(LookupTable, self).get_dim(name)
+
+
+class HashedLookupTable(LookupTable):
+    r"""Represents a range of integers with a smaller, shared table.
+
+    Uses the hashing trick: each index is mapped by `num_hashes` hash
+    functions to rows of a table of `buckets` rows, and its
+    representation is the sum of these rows. The table takes
+    `buckets` instead of `length` times `dim` elements, which allows
+    vocabularies that are too large for a :class:`LookupTable`, at the
+    cost of indices sharing rows. With more than one hash function two
+    indices are unlikely to collide in all of their rows.
+
+    Parameters
+    ----------
+    length : int
+        One plus the maximum index which can be looked up. At most
+        :math:`2^{31} - 1`.
+    dim : int
+        The dimensionality of representations.
+    buckets : int
+        The number of rows of the table.
+    num_hashes : int, optional
+        The number of hash functions, and thus rows, summed for each
+        index. Defaults to 2.
+    hash_seed : int, optional
+        The seed from which the hash functions are drawn. Defaults to
+        :attr:`config.default_seed`, so that bricks built with the same
+        arguments in different processes map indices to the same rows.
+
+    Notes
+    -----
+    The hash functions are of the universal family :math:`h(i) = ((a i +
+    b) \bmod p) \bmod \mathrm{buckets}` with :math:`p = 2^{31} - 1`.
+    The brick has the same :meth:`~LookupTable.apply` and
+    :meth:`~LookupTable.get_dim` interface as :class:`LookupTable`, and
+    can be used instead of it, e.g. by :class:`.LookupFeedback`.
+
+    """
+    prime = 2 ** 31 - 1
+
+    @lazy(allocation=['length', 'dim', 'buckets'])
+    def __init__(self, length, dim, buckets, num_hashes=2, hash_seed=None,
+                 **kwargs):
+        super(HashedLookupTable, self).__init__(length, dim, **kwargs)
+        self.buckets = buckets
+        self.num_hashes = num_hashes
+        if hash_seed is None:
+            hash_seed = config.default_seed
+        rng = numpy.random.RandomState(hash_seed)
+        # The prime is below 2 ** 31, so the values fit in the default
+        # integer type on all platforms
+        self.multipliers = rng.randint(1, self.prime,
+                                       num_hashes).astype('int64')
+        self.increments = rng.randint(0, self.prime,
+                                      num_hashes).astype('int64')
+
+    def _allocate(self):
+        if self.length > self.prime:
+            raise ValueError("length is larger than {}".format(self.prime))
+        self._allocate_table((self.buckets, self.dim))
+
+    def hash_indices(self, indices):
+        """Map indices to the rows of the table.
+
+        Parameters
+        ----------
+        indices : :class:`~tensor.TensorVariable`
+            A vector of indices.
+
+        Returns
+        -------
+        :class:`~tensor.TensorVariable`
+            A matrix with, for each index, the rows given by each of the
+            hash functions.
+
+        """
+        indices = tensor.cast(indices, 'int64')
+        return ((indices[:, None] * self.multipliers + self.increments) %
+                self.prime) % self.buckets
+
+    @application(inputs=['indices'], outputs=['output'])
+    def apply(self, indices):
+        """Perform lookup.
+
+        Parameters
+        ----------
+        indices : :class:`~tensor.TensorVariable`
+            The indices of interest. The dtype must be integer.
+
+        Returns
+        -------
+        output : :class:`~tensor.TensorVariable`
+            Representations for the indices of the query, the sums of the
+            rows they are hashed to. Has :math:`k+1` dimensions, where
+            :math:`k` is the number of dimensions of the `indices`
+            parameter. The last dimension stands for the representation
+            element.
+
+        """
+        check_theano_variable(indices, None, ("int", "uint"))
+        output_shape = [indices.shape[i]
+                        for i in range(indices.ndim)] + [self.dim]
+        rows = self.hash_indices(indices.flatten())
+        return sum(self.W[rows[:, i]]
+                   for i in range(self.num_hashes)).reshape(output_shape)
@@ -556,6 +556,10 @@ class GatedRecurrent(BaseRecurrent, Initializable):
 
     def _initialize(self):
         self.weights_init.initialize(self.state_to_state, self.rng)
+        # The gates are initialized like two separate matrices, unless
+        # their values are memory-mapped from a file
+        if getattr(self.state_to_gates.tag, 'filename', None) is not None:
+            return
         state_to_update = self.weights_init.generate(
             self.rng, (self.dim, self.dim))
         state_to_reset = self.weights_init.generate(
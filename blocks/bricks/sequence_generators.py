@@ -289,7 +289,7 @@ class BaseSequenceGenerator(Initializable):
 
         return costs
 
-    @recurrent
+    @recurrent(memoize=False)
     def generate(self, outputs, **kwargs):
         """A sequence generation step.
 
@@ -693,7 +693,7 @@ class SoftmaxEmitter(AbstractEmitter, Initializable, Random):
     def probs(self, readouts):
         return self.softmax.apply(readouts, extra_ndim=readouts.ndim - 2)
 
-    @application
+    @application(memoize=False)
     def emit(self, readouts):
         probs = self.probs(readouts)
         batch_size = probs.shape[0]
@@ -741,14 +741,29 @@ class LookupFeedback(AbstractFeedback, Initializable):
 
     Stores and retrieves distributed representations of integers.
 
+    Parameters
+    ----------
+    num_outputs : int
+        The number of distinct integers.
+    feedback_dim : int
+        The dimensionality of the representations.
+    lookup : :class:`.LookupTable`, optional
+        The brick storing the representations, e.g. a
+        :class:`.HashedLookupTable` for large numbers of outputs. Its
+        `length` and `dim` are set to `num_outputs` and `feedback_dim`.
+        By default a :class:`.LookupTable` is used.
+
     """
-    def __init__(self, num_outputs=None, feedback_dim=None, **kwargs):
+    def __init__(self, num_outputs=None, feedback_dim=None, lookup=None,
+                 **kwargs):
         super(LookupFeedback, self).__init__(**kwargs)
         self.num_outputs = num_outputs
         self.feedback_dim = feedback_dim
 
-        self.lookup = LookupTable(num_outputs, feedback_dim,
-                                  weights_init=self.weights_init)
+        if lookup is None:
+            lookup = LookupTable(num_outputs, feedback_dim,
+                                 weights_init=self.weights_init)
+        self.lookup = lookup
         self.children = [self.lookup]
 
     def _push_allocation_config(self):
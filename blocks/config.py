@@ -48,18 +48,46 @@ The following configurations are supported:
 .. option:: log_backend
 
    The backend to use for logging experiments. Defaults to `python`, which
-   stores the log as a Python object in memory. The other option is
-   `sqlite`.
+   stores the log as a Python object in memory. The other options are
+   `sqlite` and `columnar`, which stores numerical records as
+   memory-mapped columns, see :class:`~blocks.log.columnar.ColumnarLog`.
 
 .. option:: sqlite_database, BLOCKS_SQLITEDB
 
    The SQLite database file to use.
 
+.. option:: sqlite_buffered
+
+   A boolean value which determines whether the SQLite log commits its
+   records in batches instead of one at a time, see
+   :class:`~blocks.log.sqlite.SQLiteLog`. Defaults to ``False``.
+
+.. option:: sqlite_flush_iterations
+
+   The number of iterations after which a buffered SQLite log is
+   committed to the database. Defaults to 100.
+
+.. option:: sqlite_flush_seconds
+
+   The number of seconds after which a buffered SQLite log is committed to
+   the database. Defaults to 10.
+
+.. option:: columnar_log_directory, BLOCKS_COLUMNARLOG
+
+   The directory in which the columnar log backend stores its files.
+
 .. option:: max_blob_size
 
    The maximum size of an object to store in an SQLite database in bytes.
    Objects beyond this size will trigger a warning. Defaults to 4 kilobyte.
 
+.. option:: memoize_applications
+
+   A boolean value which determines whether applying a brick to the same
+   variables twice returns the outputs of the first application instead
+   of building a duplicate graph, see :attr:`.Application.memoize`.
+   Defaults to ``False``.
+
 .. option:: temp_dir
 
    The directory in which Blocks will create temporary files. If
@@ -181,6 +209,13 @@ config.add_config('log_backend', type_=str, default='python')
 config.add_config('sqlite_database', type_=str,
                   default=os.path.expanduser('~/blocks_log.sqlite'),
                   env_var='BLOCKS_SQLITEDB')
+config.add_config('sqlite_buffered', type_=bool_, default=False)
+config.add_config('sqlite_flush_iterations', type_=int, default=100)
+config.add_config('sqlite_flush_seconds', type_=float, default=10.)
+config.add_config('columnar_log_directory', type_=str,
+                  default=os.path.expanduser('~/blocks_log_columns'),
+                  env_var='BLOCKS_COLUMNARLOG')
 config.add_config('max_blob_size', type_=int, default=4096)
 config.add_config('temp_dir', type_=str_or_none, default=None)
+config.add_config('memoize_applications', type_=bool_, default=False)
 config.load_yaml()
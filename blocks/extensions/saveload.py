@@ -1,13 +1,24 @@
 """Extensions for saving and loading the state of a training process."""
 import os.path
 import logging
+import shutil
+import string
+import sys
+import threading
+import zipfile
+from functools import partial
+from itertools import chain
 
+import six
 from six.moves import cPickle
 
 from blocks.extensions import SimpleExtension, TrainingExtension
+from blocks.log import TrainingLog
+from blocks.log.log import append_to_sidecar, SidecarReference
 from blocks.utils import reraise_as
 from blocks.serialization import (
-    secure_dump, load, load_parameter_values, DEFAULT_PROTOCOL)
+    secure_dump, load, load_parameter_values, DEFAULT_PROTOCOL, stage,
+    dump_staged, BlobStore, MainLoopState, Shards, shard_paths)
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +41,12 @@ class Checkpoint(SimpleExtension):
     Parameters
     ----------
     path : str
-        The destination path for pickling.
+        The destination path for pickling. If its replacement fields all
+        name entries of the status of the main loop, it is formatted with
+        the status, so that e.g. ``'model_{iterations_done}.tar'`` saves
+        each checkpoint to a new file. Other paths, e.g. ones containing
+        literal braces, are used as they are, unless `keep_last` or
+        `keep_best` is given, in which case the path is always formatted.
     save_separately : list of str, optional
         The list of the main loop's attributes to be pickled separately
         to their own files. The paths will be formed by adding
@@ -39,6 +55,75 @@ class Checkpoint(SimpleExtension):
         as usual.
     use_cpickle : bool
         See documentation of :func:`~blocks.serialization.dump`.
+    log_sidecar : bool, optional
+        If ``True``, the rows of a :class:`.TrainingLog` are not pickled
+        with the main loop. Instead, the rows written since the last
+        checkpoint are appended to a sidecar file, whose path is the
+        checkpoint path followed by ``.log``, and the checkpoint only
+        refers to it, by its path relative to the checkpoint. The log is
+        read back from the sidecar file when the checkpoint is loaded, so
+        both files need to be kept together.
+        After the log was pruned, the rows are written to a new sidecar
+        file, whose path also contains the time up to which the log was
+        pruned, and the previous one is removed once the new checkpoint
+        is written. Defaults to ``False``.
+    asynchronous : bool, optional
+        If ``True``, the main loop is only pickled to memory, without
+        compression, when the checkpoint is made. Compressing it and
+        writing it to disk happens in a background thread while training
+        continues. At most one checkpoint is written at a time; making a
+        new checkpoint waits for the previous one to be finished. The
+        `SAVED_TO` record is only made once the file is in place, in the
+        row of the iteration at which this is noticed, and errors in the
+        background thread are re-raised in the main loop. Checkpoints made
+        after training or on error are always finished before the main
+        loop exits. Defaults to ``False``.
+    compress : bool, optional
+        If ``False``, the parameters are stored without compression and
+        aligned to page boundaries, which makes saving faster and allows
+        :func:`~blocks.serialization.load_parameter_values` to
+        memory-map them instead of reading them. Defaults to ``True``.
+    compression_level : int, optional
+        The zlib compression level, from 1 (fastest) to 9 (smallest). The
+        arrays are compressed in parallel by as many threads as there are
+        CPUs, see :class:`~blocks.serialization.ParallelZipFile`.
+    store : str, optional
+        A directory in which to save the parameters, named by the hash of
+        their contents, see :class:`~blocks.serialization.BlobStore`.
+        The checkpoint then only refers to them, so that parameters which
+        didn't change since an earlier checkpoint aren't saved again.
+    keep_last : int, optional
+        If given, only the last `keep_last` checkpoints are kept, older
+        ones are removed. This only makes sense if `path` is a template.
+    keep_best : int, optional
+        If given, checkpoints made when the `best_notification` record is
+        in the log are promoted to best checkpoints, of which the last
+        `keep_best` are kept. Requires `best_notification`. Promotion
+        makes a hard link to the checkpoint (or a copy where links aren't
+        supported), so that the checkpoint isn't written twice and is kept
+        when it is rotated out.
+    best_notification : str or :class:`.TrackTheBest`, optional
+        The log record which marks a checkpoint as the best one, or the
+        :class:`.TrackTheBest` extension which makes it. Make sure this
+        extension comes before the checkpoint in the list of extensions.
+    best_path : str, optional
+        The path to promote the best checkpoints to, formatted like
+        `path`. By default ``'_best'`` is added to the checkpoint path
+        before its extension.
+    state_only : bool, optional
+        If ``True``, only the state of the main loop is saved instead of
+        the whole main loop, see
+        :class:`~blocks.serialization.MainLoopState`. This makes
+        checkpoints smaller and faster to save and load, but resuming
+        training requires a function which builds the main loop again,
+        see :func:`~blocks.serialization.continue_training`. Defaults to
+        ``False``.
+    shards : int, optional
+        If given, the parameters are saved to this number of shard files
+        next to the checkpoint, which are written in parallel, see
+        :class:`~blocks.serialization.Shards`. This can't be combined
+        with `asynchronous` or `store`. Shards which are no longer used
+        by the checkpoints that are kept are removed.
 
     Notes
     -----
@@ -50,17 +135,73 @@ class Checkpoint(SimpleExtension):
       (and vice-versa). Therefore using this extension binds you to using
       only one kind of device.
 
+    Checkpoints are only rotated once they have been written. When the
+    parameters are saved to a `store`, the blobs which are no longer used
+    by the kept checkpoints are then removed, so the store shouldn't be
+    shared with other checkpoints.
 
     """
     def __init__(self, path, save_separately=None, use_cpickle=False,
-                 **kwargs):
+                 log_sidecar=False, asynchronous=False, compress=True,
+                 compression_level=None, store=None, keep_last=None,
+                 keep_best=None, best_notification=None, best_path=None,
+                 state_only=False, shards=None, **kwargs):
         kwargs.setdefault("after_training", True)
         super(Checkpoint, self).__init__(**kwargs)
+        if shards and (asynchronous or store is not None):
+            raise ValueError("shards can't be used with asynchronous "
+                             "checkpoints or a store")
+        if keep_best and best_notification is None:
+            raise ValueError("keep_best requires best_notification")
         if not save_separately:
             save_separately = []
         self.path = path
         self.save_separately = save_separately
         self.use_cpickle = use_cpickle
+        self.log_sidecar = log_sidecar
+        self.asynchronous = asynchronous
+        self.compress = compress
+        self.compression_level = compression_level
+        self.store = store
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.best_notification = getattr(best_notification,
+                                         'notification_name',
+                                         best_notification)
+        self.best_path = best_path
+        self.state_only = state_only
+        self.shards = shards
+        self.sidecars = {}
+        self.sidecar_paths = {}
+        self.checkpoints = []
+        self.best_checkpoints = []
+        self._writer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_writer'] = None
+        return state
+
+    def __setstate__(self, state):
+        # Checkpoints saved by older versions lack the newer options
+        state.setdefault('log_sidecar', False)
+        state.setdefault('asynchronous', False)
+        state.setdefault('compress', True)
+        state.setdefault('compression_level', None)
+        state.setdefault('store', None)
+        state.setdefault('keep_last', None)
+        state.setdefault('keep_best', None)
+        state.setdefault('best_notification', None)
+        state.setdefault('best_path', None)
+        state.setdefault('state_only', False)
+        state.setdefault('shards', None)
+        state.setdefault('sidecars', {})
+        state.setdefault('sidecar_paths', {
+            sidecar[:-len('.log')]: sidecar for sidecar in state['sidecars']})
+        state.setdefault('checkpoints', [])
+        state.setdefault('best_checkpoints', [])
+        state.setdefault('_writer', None)
+        self.__dict__.update(state)
 
     def save_separately_filenames(self, path):
         """Compute paths for separately saved attributes.
@@ -81,6 +222,116 @@ class Checkpoint(SimpleExtension):
         return {attribute: root + "_" + attribute + ext
                 for attribute in self.save_separately}
 
+    def dump_main_loop(self, path, staged=False):
+        """Pickle the main loop, saving the log to a sidecar if needed.
+
+        If `staged` is ``True``, the main loop is pickled to memory using
+        :func:`~blocks.serialization.stage` and the result is returned
+        instead. Only the state of the main loop is pickled if
+        `state_only` is ``True``.
+
+        """
+        log = self.main_loop.log
+        sidecar_path = self.sidecar_path(path)
+        if sidecar_path:
+            # Rows before the time of the last checkpoint are assumed not
+            # to have changed, the last row itself usually has (e.g.
+            # `saved_to`). Pruning the log changes older rows, so they are
+            # written to a new file, leaving the one the last checkpoint
+            # refers to intact.
+            pruned_until = log.status.get('_pruned_until')
+            offset, start, _ = self.sidecars.get(sidecar_path, (0, 0, None))
+            offset = append_to_sidecar(log, sidecar_path, offset, start)
+            self.sidecars[sidecar_path] = (
+                offset, log.status['iterations_done'], pruned_until)
+            self.main_loop.log = SidecarReference(log, sidecar_path, offset,
+                                                  relative_to=path)
+        try:
+            main_loop = (MainLoopState(self.main_loop) if self.state_only
+                         else self.main_loop)
+            if staged:
+                return stage(main_loop, use_cpickle=self.use_cpickle,
+                             store=self.store)
+            shards = None
+            if self.shards:
+                old_shards = (shard_paths(path) if os.path.exists(path)
+                              else [])
+                shards = Shards(path, self.shards, self.compression,
+                                self.compression_level)
+            secure_dump(main_loop, path, use_cpickle=self.use_cpickle,
+                        compression=self.compression,
+                        compression_level=self.compression_level,
+                        store=self.store, shards=shards)
+            if self.shards:
+                self._remove_shards(old_shards, path)
+            self._replace_sidecar(path, sidecar_path)
+        finally:
+            self.main_loop.log = log
+
+    def sidecar_path(self, path):
+        """The path of the sidecar file of a checkpoint.
+
+        Returns ``None`` if the log isn't saved to a sidecar file.
+
+        """
+        log = self.main_loop.log
+        if not (self.log_sidecar and isinstance(log, TrainingLog)):
+            return None
+        pruned_until = log.status.get('_pruned_until')
+        if pruned_until is None:
+            return path + '.log'
+        return '{}.{}.log'.format(path, pruned_until)
+
+    def _replace_sidecar(self, path, sidecar_path):
+        """Remove the previous sidecar file once a checkpoint is written."""
+        if sidecar_path is None:
+            return
+        previous = self.sidecar_paths.get(path)
+        self.sidecar_paths[path] = sidecar_path
+        if previous is not None and previous != sidecar_path:
+            self._remove_sidecars([previous])
+
+    def _remove_sidecars(self, sidecars):
+        """Remove sidecar files unless a checkpoint refers to them."""
+        used = set(self.sidecar_paths.values())
+        for sidecar in sidecars:
+            if sidecar not in used:
+                self.sidecars.pop(sidecar, None)
+                if os.path.exists(sidecar):
+                    os.remove(sidecar)
+
+    @property
+    def compression(self):
+        return zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+
+    def dispatch(self, callback_invoked, *from_main_loop):
+        if self._writer is not None and not self._writer.is_alive():
+            self.wait()
+        super(Checkpoint, self).dispatch(callback_invoked, *from_main_loop)
+        if callback_invoked in ('after_training', 'on_error'):
+            self.wait()
+
+    def format_path(self, path):
+        """Fill in the status of the main loop in a path template.
+
+        The path is returned unchanged if it has no replacement fields, or
+        if some of them don't name an entry of the status and checkpoints
+        aren't rotated.
+
+        """
+        status = dict(self.main_loop.status)
+        if not (self.keep_last or self.keep_best):
+            try:
+                fields = [field for _, field, _, _
+                          in string.Formatter().parse(path)
+                          if field is not None]
+            except ValueError:
+                return path
+            names = [field.split('.')[0].split('[')[0] for field in fields]
+            if not names or not all(name in status for name in names):
+                return path
+        return path.format(**status)
+
     def do(self, callback_name, *args):
         """Pickle the main loop object to the disk.
 
@@ -90,12 +341,35 @@ class Checkpoint(SimpleExtension):
 
         """
         _, from_user = self.parse_args(callback_name, args)
+        if self.asynchronous:
+            self.wait()
         try:
             path = self.path
             if from_user:
                 path, = from_user
-            secure_dump(self.main_loop, path, use_cpickle=self.use_cpickle)
+            path = self.format_path(path)
+            best_path = None
+            if (self.keep_best and
+                    self.main_loop.log.current_row.get(
+                        self.best_notification)):
+                best_path = self.format_path(self.best_path) \
+                    if self.best_path else _add_suffix(path, '_best')
             filenames = self.save_separately_filenames(path)
+            if self.asynchronous:
+                files = [(path,
+                          partial(dump_staged, compression=self.compression,
+                                  compression_level=self.compression_level),
+                          self.dump_main_loop(path, staged=True))]
+                for attribute in self.save_separately:
+                    files.append((filenames[attribute], _write_bytes,
+                                  cPickle.dumps(
+                                      getattr(self.main_loop, attribute),
+                                      protocol=DEFAULT_PROTOCOL)))
+                self._writer = _CheckpointWriter(
+                    path, files, best_path, self.sidecar_path(path))
+                self._writer.start()
+                return
+            self.dump_main_loop(path)
             for attribute in self.save_separately:
                 secure_dump(getattr(self.main_loop, attribute),
                             filenames[attribute], cPickle.dump,
@@ -103,10 +377,160 @@ class Checkpoint(SimpleExtension):
         except Exception:
             path = None
             raise
+        else:
+            self.rotate(path, best_path)
+        finally:
+            if not self.asynchronous or path is None:
+                self._add_saved_to(path)
+
+    def wait(self):
+        """Wait for the checkpoint being written in the background.
+
+        Makes the `SAVED_TO` record once the checkpoint is written, and
+        re-raises the error if writing it failed.
+
+        """
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        writer.join()
+        self._add_saved_to(writer.path if writer.exc_info is None else None)
+        if writer.exc_info is not None:
+            six.reraise(*writer.exc_info)
+        self._replace_sidecar(writer.path, writer.sidecar_path)
+        self.rotate(writer.path, writer.best_path)
+
+    def rotate(self, path, best_path=None):
+        """Keep track of a new checkpoint, removing old ones if needed.
+
+        Parameters
+        ----------
+        path : str
+            The path of the checkpoint which was written.
+        best_path : str, optional
+            If given, the checkpoint is promoted to a best checkpoint with
+            this path.
+
+        """
+        if not (self.keep_last or self.keep_best):
+            return
+        if path in self.checkpoints:
+            self.checkpoints.remove(path)
+        self.checkpoints.append(path)
+        removed = []
+        if best_path:
+            sources = [path] + list(self.save_separately_filenames(
+                path).values())
+            destinations = [best_path] + list(self.save_separately_filenames(
+                best_path).values())
+            for source, destination in zip(sources, destinations):
+                _link(source, destination)
+            if path in self.sidecar_paths:
+                self.sidecar_paths[best_path] = self.sidecar_paths[path]
+            self.best_checkpoints = [
+                (best, source) for best, source in self.best_checkpoints
+                if best != best_path] + [(best_path, path)]
+            while len(self.best_checkpoints) > self.keep_best:
+                best, _ = self.best_checkpoints.pop(0)
+                removed.append(best)
+        while self.keep_last and len(self.checkpoints) > self.keep_last:
+            removed.append(self.checkpoints.pop(0))
+        kept = set(self.checkpoints)
+        kept.update(best for best, _ in self.best_checkpoints)
+        removed_shards = []
+        for checkpoint in removed:
+            if checkpoint in kept:
+                continue
+            if self.shards and os.path.exists(checkpoint):
+                removed_shards.extend(shard_paths(checkpoint))
+            for filename in ([checkpoint] + list(
+                    self.save_separately_filenames(checkpoint).values())):
+                if os.path.exists(filename):
+                    os.remove(filename)
+        for checkpoint in removed:
+            if checkpoint not in kept:
+                self.sidecar_paths.pop(checkpoint, None)
+        self._remove_sidecars(list(self.sidecars))
+        if removed_shards:
+            self._remove_shards(removed_shards)
+        if removed and self.store is not None:
+            BlobStore(self.store).collect_garbage(
+                self.checkpoints + [best for best, _ in self.best_checkpoints])
+
+    def _remove_shards(self, shards, path=None):
+        """Remove shards unless a checkpoint that is kept uses them."""
+        kept = set(self.checkpoints)
+        kept.update(best for best, _ in self.best_checkpoints)
+        if path is not None:
+            kept.add(path)
+        used = set(chain.from_iterable(shard_paths(checkpoint)
+                                       for checkpoint in kept
+                                       if os.path.exists(checkpoint)))
+        for shard in set(shards) - used:
+            if os.path.exists(shard):
+                os.remove(shard)
+
+    def _add_saved_to(self, path):
+        already_saved_to = self.main_loop.log.current_row.get(SAVED_TO, ())
+        self.main_loop.log.current_row[SAVED_TO] = (already_saved_to +
+                                                    (path,))
+
+
+def _add_suffix(path, suffix):
+    root, ext = os.path.splitext(path)
+    return root + suffix + ext
+
+
+def _link(source, destination):
+    """Hard link a file, or copy it if that isn't possible."""
+    temp = destination + '.tmp'
+    if os.path.exists(temp):
+        os.remove(temp)
+    try:
+        os.link(source, temp)
+    except (AttributeError, OSError):
+        shutil.copy2(source, temp)
+    shutil.move(temp, destination)
+
+
+def _write_bytes(data, file_handler):
+    file_handler.write(data)
+
+
+class _CheckpointWriter(threading.Thread):
+    """Writes staged checkpoint files to disk in the background.
+
+    Parameters
+    ----------
+    path : str
+        The path of the checkpoint.
+    files : list of tuples
+        Tuples of a destination path, a dump function and the object to
+        pass to it, see :func:`~blocks.serialization.secure_dump`.
+    best_path : str
+        The path to promote the checkpoint to once it is written, see
+        :meth:`Checkpoint.rotate`.
+    sidecar_path : str
+        The sidecar file the checkpoint refers to, which replaces the
+        previous one once the checkpoint is written.
+
+    """
+    def __init__(self, path, files, best_path=None, sidecar_path=None):
+        super(_CheckpointWriter, self).__init__(name='checkpoint writer')
+        self.path = path
+        self.files = files
+        self.best_path = best_path
+        self.sidecar_path = sidecar_path
+        self.exc_info = None
+
+    def run(self):
+        try:
+            for destination, dump_function, object_ in self.files:
+                secure_dump(object_, destination, dump_function)
+        except Exception:
+            self.exc_info = sys.exc_info()
         finally:
-            already_saved_to = self.main_loop.log.current_row.get(SAVED_TO, ())
-            self.main_loop.log.current_row[SAVED_TO] = (already_saved_to +
-                                                        (path,))
+            self.files = None
 
 
 class Load(TrainingExtension):
@@ -134,8 +558,10 @@ class Load(TrainingExtension):
     their values.
 
     In order to load the iteration state and the log, the saved model needs
-    to be unpickled. Note that resuming training this way is still not
-    entirely seamless because e.g. extensions will not be reloaded.
+    to be unpickled. This also works for checkpoints which only contain
+    the state of the main loop. Note that resuming training this way is
+    still not entirely seamless because e.g. extensions will not be
+    reloaded.
 
     """
     def __init__(self, path, load_iteration_state=False, load_log=False,
@@ -146,13 +572,16 @@ class Load(TrainingExtension):
         self.load_log = load_log
 
     def load_to(self, main_loop):
-        main_loop.model.set_parameter_values(load_parameter_values(self.path))
+        with load_parameter_values(self.path,
+                                   lazy=True) as parameter_values:
+            main_loop.model.set_parameter_values(parameter_values)
         if self.load_iteration_state or self.load_log:
             with open(self.path, "rb") as source:
                 loaded_main_loop = load(source)
             if self.load_log:
                 main_loop.log = loaded_main_loop.log
-            if self.load_iteration_state:
+            if (self.load_iteration_state and
+                    loaded_main_loop.iteration_state is not None):
                 main_loop.iteration_state = loaded_main_loop.iteration_state
 
     def before_training(self):
@@ -99,3 +99,30 @@ class TrackTheBest(SimpleExtension):
                  current_value)):
             self.main_loop.status[self.best_name] = current_value
             self.main_loop.log.current_row[self.notification_name] = True
+
+
+class PruneLog(SimpleExtension):
+    """Thin out old records of the log according to a retention policy.
+
+    Keeps the log from growing linearly with the number of iterations, so
+    that e.g. pickling it in a :class:`.Checkpoint` stays cheap.
+
+    Parameters
+    ----------
+    policy : :class:`.RetentionPolicy`
+        The policy that determines which records are kept.
+
+    Notes
+    -----
+    By default, runs after each epoch. Place this extension before
+    :class:`.Checkpoint` in the list of extensions, so that checkpoints
+    contain the pruned log.
+
+    """
+    def __init__(self, policy, **kwargs):
+        kwargs.setdefault("after_epoch", True)
+        super(PruneLog, self).__init__(**kwargs)
+        self.policy = policy
+
+    def do(self, which_callback, *args):
+        self.main_loop.log.prune(self.policy)
@@ -8,6 +8,7 @@ import numpy
 import theano
 from picklable_itertools.extras import equizip
 from theano import Variable
+from theano.compile import rebuild_collect_shared
 from theano.gof import graph
 from theano.sandbox.rng_mrg import MRG_RandomStreams
 from theano.scan_module.scan_op import Scan
@@ -74,9 +75,35 @@ class ComputationGraph(object):
         self._get_variables()
         self._has_inputs = {}
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_index', None)
+        return state
+
     def __iter__(self):
         return iter(self.variables)
 
+    @property
+    def index(self):
+        """An index of :attr:`variables` by their annotations.
+
+        Built the first time it is needed, for use with
+        :meth:`.VariableFilter.query`. It reflects the annotations of the
+        variables at that time: after adding roles to or renaming
+        variables, delete it (``del cg.index``) to have it rebuilt. See
+        :class:`.VariableIndex`.
+
+        """
+        if '_index' not in self.__dict__:
+            # Avoid circular imports
+            from ..filter import VariableIndex
+            self._index = VariableIndex(self.variables)
+        return self._index
+
+    @index.deleter
+    def index(self):
+        self.__dict__.pop('_index', None)
+
     @property
     def inputs(self):
         """Inputs to the graph, excluding constants and shared variables."""
@@ -169,6 +196,17 @@ class ComputationGraph(object):
             The mapping from variables to be replaced to the corresponding
             substitutes.
 
+        Notes
+        -----
+        The replacements are made in the topological order of the
+        variables they replace, in a single pass over the graph. A
+        substitute can depend on the variable it replaces and on variables
+        that come before it, whose replacements are then applied to the
+        substitute as well. If a substitute depends on a variable that is
+        replaced later, the graph is cloned once per replacement instead,
+        which is slower, and the later replacement isn't applied to the
+        substitute.
+
         Examples
         --------
         >>> import theano
@@ -197,17 +235,11 @@ class ComputationGraph(object):
         23.0
 
         """
-        # Due to theano specifics we have to make one replacement in time
         replacements = OrderedDict(replacements)
 
-        outputs_cur = self.outputs
-
-        # `replacements` with previous replacements applied. We have to track
-        # variables in the new graph corresponding to original replacements.
-        replacement_keys_cur = []
-        replacement_vals_cur = []
         # Sort `replacements` in topological order
         # variables in self.variables are in topological order
+        replacement_pairs = []
         remaining_replacements = replacements.copy()
         for variable in self.variables:
             if variable in replacements:
@@ -215,11 +247,10 @@ class ComputationGraph(object):
                     warnings.warn(
                         "replace method was asked to replace a variable ({}) "
                         "that is an auxiliary variable.".format(variable))
-                replacement_keys_cur.append(variable)
                 # self.variables should not contain duplicates,
                 # otherwise pop() may fail.
-                replacement_vals_cur.append(
-                    remaining_replacements.pop(variable))
+                replacement_pairs.append(
+                    (variable, remaining_replacements.pop(variable)))
 
         # if remaining_replacements is not empty
         if remaining_replacements:
@@ -228,7 +259,31 @@ class ComputationGraph(object):
                 "that is not a part of the computational "
                 "graph.".format(str(remaining_replacements.keys())))
 
-        # Replace step-by-step in topological order
+        if not replacement_pairs:
+            return ComputationGraph(self.outputs)
+        # The graph is cloned once. Because the substitutes are cloned in
+        # topological order, the replacements made before are applied to
+        # them, just like to the outputs.
+        try:
+            _, outputs, _ = rebuild_collect_shared(
+                list(self.outputs), replace=replacement_pairs)
+        except AssertionError:
+            # A substitute depends on a variable replaced after it
+            outputs = self._replace_sequentially(replacement_pairs)
+        return ComputationGraph(outputs)
+
+    def _replace_sequentially(self, replacement_pairs):
+        """Make the replacements one at a time, cloning the graph each time.
+
+        Unlike a single pass, this handles substitutes which depend on
+        variables replaced later.
+
+        """
+        outputs_cur = self.outputs
+        # `replacements` with previous replacements applied. We have to track
+        # variables in the new graph corresponding to original replacements.
+        replacement_keys_cur = [key for key, _ in replacement_pairs]
+        replacement_vals_cur = [value for _, value in replacement_pairs]
         while replacement_keys_cur:
             replace_what = replacement_keys_cur[0]
             replace_by = replacement_vals_cur[0]
@@ -244,8 +299,7 @@ class ComputationGraph(object):
                                                len(replacement_keys_cur) - 1]
             replacement_vals_cur = outputs_new[len(outputs_cur) +
                                                len(replacement_keys_cur):]
-
-        return ComputationGraph(outputs_cur)
+        return outputs_cur
 
     def get_theano_function(self, additional_updates=None, **kwargs):
         r"""Create Theano function from the graph contained.
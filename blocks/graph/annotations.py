@@ -3,12 +3,12 @@ from ..roles import add_role, AUXILIARY
 
 
 def add_annotation(var, annotation):
-    annotations = getattr(var.tag, 'annotations', [])
+    annotations = tuple(getattr(var.tag, 'annotations', ()))
     if any(old_annotation.__class__ == annotation.__class__
            for old_annotation in annotations):
         raise ValueError
     else:
-        var.tag.annotations = annotations + [annotation]
+        var.tag.annotations = annotations + (annotation,)
 
 
 class Annotation(object):
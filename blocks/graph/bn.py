@@ -161,7 +161,11 @@ def apply_batch_normalization(computation_graph):
     """
     # Avoid circular imports.
     from blocks.bricks import BatchNormalization
-    from ..filter import VariableFilter, get_application_call
+    from ..filter import VariableFilter, VariableIndex, get_application_call
+
+    # Index the graph once instead of scanning it for each filter, without
+    # relying on its cached index, which may be outdated.
+    index = VariableIndex(computation_graph.variables)
 
     # Create filters for variables involved in a batch normalization brick
     # application.
@@ -171,7 +175,7 @@ def apply_batch_normalization(computation_graph):
     # Group inputs and outputs into dicts indexed by application call.
     def get_app_call_dict(variable_filter):
         return collections.OrderedDict((get_application_call(v), v) for v in
-                                       variable_filter(computation_graph))
+                                       variable_filter.query(index))
 
     # Compose these two so that we get 4 dicts, grouped by application
     # call, of different variable roles involved in BatchNormalization.
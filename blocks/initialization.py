@@ -1,11 +1,72 @@
 """Objects for encapsulating parameter initialization strategies."""
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 import numbers
+import threading
 
 import numpy
 import theano
 from six import add_metaclass
 
+# The initializations deferred by `parallel_initialization`
+_deferred = threading.local()
+
+
+@contextmanager
+def parallel_initialization(threads=None):
+    """Initialize shared variables in parallel.
+
+    Within this context, :meth:`NdarrayInitialization.initialize` doesn't
+    generate the values of the shared variables. Instead, it draws a seed
+    from the random number generator it is given and defers the
+    initialization. When the context is left, the values are generated
+    in a pool of threads, each from a random number generator seeded
+    with its own seed. This is effective because NumPy releases the GIL
+    in e.g. linear algebra routines, and the results don't depend on the
+    number of threads.
+
+    Parameters
+    ----------
+    threads : int, optional
+        The number of threads. Defaults to the number of CPUs.
+
+    Notes
+    -----
+    The values of the shared variables are only set when the context is
+    left, so code within it shouldn't rely on them.
+
+    Examples
+    --------
+    >>> from blocks.bricks import MLP, Tanh
+    >>> mlp = MLP([Tanh(), Tanh()], [10, 20, 10],
+    ...           weights_init=Orthogonal(), biases_init=Constant(0))
+    >>> with parallel_initialization(threads=2):
+    ...     mlp.initialize()
+
+    """
+    if getattr(_deferred, 'initializations', None) is not None:
+        # Nested contexts run their initializations with the outer one
+        yield
+        return
+    _deferred.initializations = initializations = []
+    try:
+        yield
+    finally:
+        _deferred.initializations = None
+    if initializations:
+        pool = ThreadPool(min(threads or cpu_count(), len(initializations)))
+        try:
+            pool.map(_initialize, initializations)
+        finally:
+            pool.terminate()
+
+
+def _initialize(initialization):
+    init, var, seed, shape = initialization
+    var.set_value(init.generate(numpy.random.RandomState(seed), shape))
+
 
 @add_metaclass(ABCMeta)
 class NdarrayInitialization(object):
@@ -41,9 +102,23 @@ class NdarrayInitialization(object):
         shape : tuple
             A shape tuple for the requested parameter array shape.
 
+        Notes
+        -----
+        Within :func:`parallel_initialization` the initialization is
+        deferred. Shared variables whose values are memory-mapped from a
+        file (see :class:`.Initializable`) are left untouched.
+
         """
+        if getattr(var.tag, 'filename', None) is not None:
+            return
         if not shape:
             shape = var.get_value(borrow=True, return_internal_type=True).shape
+        initializations = getattr(_deferred, 'initializations', None)
+        if initializations is not None:
+            initializations.append(
+                (self, var, rng.randint(numpy.iinfo(numpy.int32).max),
+                 shape))
+            return
         var.set_value(self.generate(rng, shape))
 
 
@@ -179,26 +254,17 @@ class Orthogonal(NdarrayInitialization):
         if len(shape) != 2:
             raise ValueError
 
-        if shape[0] == shape[1]:
-            # For square weight matrices we can simplify the logic
-            # and be more exact:
-            M = rng.randn(*shape).astype(theano.config.floatX)
-            Q, R = numpy.linalg.qr(M)
-            Q = Q * numpy.sign(numpy.diag(R))
-            return Q * self.scale
-
-        M1 = rng.randn(shape[0], shape[0]).astype(theano.config.floatX)
-        M2 = rng.randn(shape[1], shape[1]).astype(theano.config.floatX)
-
-        # QR decomposition of matrix with entries in N(0, 1) is random
-        Q1, R1 = numpy.linalg.qr(M1)
-        Q2, R2 = numpy.linalg.qr(M2)
+        # The reduced QR decomposition of a tall matrix with entries in
+        # N(0, 1) has a random matrix with orthonormal columns as Q
+        rows, cols = shape
+        M = rng.randn(max(rows, cols), min(rows, cols)).astype(
+            theano.config.floatX)
+        Q, R = numpy.linalg.qr(M)
         # Correct that NumPy doesn't force diagonal of R to be non-negative
-        Q1 = Q1 * numpy.sign(numpy.diag(R1))
-        Q2 = Q2 * numpy.sign(numpy.diag(R2))
-
-        n_min = min(shape[0], shape[1])
-        return numpy.dot(Q1[:, :n_min], Q2[:n_min, :]) * self.scale
+        Q = Q * numpy.sign(numpy.diag(R))
+        if rows < cols:
+            Q = Q.T
+        return Q * self.scale
 
 
 class Sparse(NdarrayInitialization):
@@ -234,8 +300,24 @@ class Sparse(NdarrayInitialization):
                 raise ValueError
             num_init = int(self.num_init * shape[1])
         values = self.weights_init.generate(rng, (shape[0], num_init))
-        for i in range(shape[0]):
-            random_indices = numpy.random.choice(shape[1], num_init,
-                                                 replace=False)
-            weights[i, random_indices] = values[i]
+        if not num_init:
+            return weights
+        if num_init ** 2 <= shape[1]:
+            # Floyd's algorithm samples a few columns for all rows at once
+            indices = numpy.empty((shape[0], num_init), dtype='int64')
+            for i, j in enumerate(range(shape[1] - num_init, shape[1])):
+                sample = rng.randint(j + 1, size=shape[0])
+                sampled = (indices[:, :i] == sample[:, None]).any(axis=1)
+                indices[:, i] = numpy.where(sampled, j, sample)
+            weights[numpy.arange(shape[0])[:, None], indices] = values
+            return weights
+        # The indices of the smallest of a row of random numbers are a
+        # random subset of the columns. The rows are processed in blocks
+        # to limit the memory used by the random numbers.
+        block_size = max(1, 2 ** 20 // shape[1])
+        for start in range(0, shape[0], block_size):
+            rows = numpy.arange(start, min(start + block_size, shape[0]))
+            indices = rng.rand(len(rows), shape[1]).argpartition(
+                num_init - 1, axis=1)[:, :num_init]
+            weights[rows[:, None], indices] = values[rows]
         return weights
@@ -1,7 +1,9 @@
-from .log import TrainingLog
+from .columnar import ColumnarLog
+from .log import RetentionPolicy, TrainingLog  # noqa
 from .sqlite import SQLiteLog
 
 BACKENDS = {
     'python': TrainingLog,
-    'sqlite': SQLiteLog
+    'sqlite': SQLiteLog,
+    'columnar': ColumnarLog
 }
@@ -0,0 +1,449 @@
+"""Columnar backend for the main loop log."""
+import os
+from collections import MutableMapping, Mapping
+from numbers import Integral, Real
+from uuid import uuid4
+
+import numpy
+
+from blocks.config import config
+from .log import TrainingLogBase, _in_range, _to_arrays
+
+# Marks records deleted from a column in the sparse store
+_DELETED = object()
+
+
+def _column_type(value):
+    """Determine the type of column a value can be stored in.
+
+    Parameters
+    ----------
+    value : object
+        The value to store.
+
+    Returns
+    -------
+    :class:`numpy.dtype` or ``None``
+        ``int64`` for integers, ``float64`` for other real numbers, and
+        ``None`` for all other values (including booleans), which can't be
+        stored in a column.
+
+    """
+    if isinstance(value, numpy.ndarray) and value.ndim == 0:
+        value = value[()]
+    if isinstance(value, (bool, numpy.bool_)):
+        return None
+    if isinstance(value, Integral):
+        return numpy.dtype('int64')
+    if isinstance(value, Real):
+        return numpy.dtype('float64')
+    return None
+
+
+class _Column(object):
+    """An append-only column of records stored in memory-mapped files.
+
+    A column consists of segments, each of which is a file containing an
+    array of (time, value) records with increasing times. Records are
+    appended to the last segment, and the file is grown when it is full.
+    The names of the files the column consisted of when it was pickled
+    are kept in `pickled`, these files are never removed.
+
+    Parameters
+    ----------
+    directory : str
+        The directory in which to store the files.
+    dtype : :class:`numpy.dtype`
+        The type of the values.
+
+    """
+    initial_capacity = 1024
+
+    def __init__(self, directory, dtype):
+        self.directory = directory
+        self.dtype = numpy.dtype([('time', 'int64'), ('value', dtype)])
+        self.segments = []
+        self.sealed = 0
+        self.appendable = False
+        self.pickled = set()
+        self._arrays = {}
+
+    def __getstate__(self):
+        # Records in the pickled column must never be overwritten, so the
+        # unpickled column will append to a segment of its own
+        self.sealed = len(self)
+        self.pickled.update(filename for filename, _, _ in self.segments)
+        state = self.__dict__.copy()
+        state['segments'] = [list(segment) for segment in self.segments]
+        state['appendable'] = False
+        state['pickled'] = set(self.pickled)
+        del state['_arrays']
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('pickled', set(
+            filename for filename, _, _ in state['segments']))
+        self.__dict__.update(state)
+        self._arrays = {}
+
+    def __len__(self):
+        return sum(length for _, length, _ in self.segments)
+
+    def _array(self, segment):
+        """Return the records of a segment."""
+        filename, length, capacity = segment
+        if filename not in self._arrays:
+            self._arrays[filename] = numpy.memmap(
+                os.path.join(self.directory, filename), dtype=self.dtype,
+                mode='r+', shape=(capacity,))
+        return self._arrays[filename][:length]
+
+    def _allocate(self, filename, capacity):
+        with open(os.path.join(self.directory, filename), 'ab') as f:
+            f.truncate(capacity * self.dtype.itemsize)
+        self._arrays.pop(filename, None)
+
+    def _new_segment(self, length, capacity):
+        segment = [uuid4().hex + '.col', length, capacity]
+        self._allocate(segment[0], capacity)
+        self.segments.append(segment)
+        self.appendable = True
+        return segment
+
+    def append(self, time, value):
+        if not self.appendable:
+            self._new_segment(0, self.initial_capacity)
+        segment = self.segments[-1]
+        filename, length, capacity = segment
+        if length == capacity:
+            segment[2] = 2 * capacity
+            self._allocate(filename, segment[2])
+        segment[1] += 1
+        self._array(segment)[length] = (time, value)
+
+    def promote(self, dtype):
+        """Convert the column to a new type, copying it to a new file."""
+        self.rewrite(self.records().astype(
+            numpy.dtype([('time', 'int64'), ('value', dtype)])))
+
+    def rewrite(self, records):
+        """Replace all records of the column, writing them to a new file.
+
+        The old files are removed, except for those that were pickled,
+        since pickled logs might still refer to them.
+
+        """
+        old_segments = self.segments
+        self.dtype = records.dtype
+        self.segments = []
+        self.sealed = 0
+        segment = self._new_segment(
+            len(records), max(len(records), self.initial_capacity))
+        self._array(segment)[:] = records
+        for filename, _, _ in old_segments:
+            self._arrays.pop(filename, None)
+            if filename not in self.pickled:
+                os.remove(os.path.join(self.directory, filename))
+
+    @property
+    def last_time(self):
+        """The time of the last record, ``None`` if the column is empty."""
+        for segment in reversed(self.segments):
+            if segment[1]:
+                return self._array(segment)['time'][-1]
+        return None
+
+    def find(self, time):
+        """Find the position of the record at a given time.
+
+        Returns
+        -------
+        tuple
+            The segment and index of the record in it, or ``None`` if
+            there is no record at this time.
+
+        """
+        for segment in reversed(self.segments):
+            times = self._array(segment)['time']
+            if not len(times) or times[0] > time:
+                continue
+            if times[-1] < time:
+                return None
+            index = int(numpy.searchsorted(times, time))
+            if times[index] == time:
+                return segment, index
+            return None
+        return None
+
+    def _position(self, segment, index):
+        position = index
+        for other in self.segments:
+            if other is segment:
+                return position
+            position += other[1]
+
+    def get(self, location):
+        segment, index = location
+        return self._array(segment)['value'][index].item()
+
+    def set(self, location, value):
+        """Overwrite a record if it isn't sealed, returns if succesful."""
+        segment, index = location
+        if self._position(segment, index) < self.sealed:
+            return False
+        self._array(segment)['value'][index] = value
+        return True
+
+    def pop(self, location):
+        """Remove the last record if it isn't sealed, returns if succesful.
+
+        """
+        segment, index = location
+        if (segment is not self.segments[-1] or index != segment[1] - 1 or
+                self._position(segment, index) < self.sealed):
+            return False
+        segment[1] -= 1
+        return True
+
+    def records(self):
+        """Return all records, without copying if there is one segment."""
+        arrays = [self._array(segment) for segment in self.segments]
+        if len(arrays) == 1:
+            return arrays[0]
+        return numpy.concatenate(arrays) if arrays else numpy.empty(
+            0, dtype=self.dtype)
+
+    def flush(self):
+        for array in self._arrays.values():
+            array.flush()
+
+
+class ColumnarLog(TrainingLogBase, Mapping):
+    r"""Training log storing each record name as a column on disk.
+
+    Numerical records (integers, floats and scalar NumPy arrays) with the
+    same name are stored as a single append-only column of (time, value)
+    pairs in memory-mapped files. All other records, e.g. strings,
+    booleans and arrays, are kept in a sparse in-memory store, which is
+    also used for records that are written out of order. This makes
+    long runs which log a few scalars for every batch cheap in terms of
+    memory and pickling time, while a whole series can be read as a slice
+    of a NumPy array using :meth:`series`.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The directory in which the columns are stored. Uses
+        `config.columnar_log_directory` by default.
+    \*\*kwargs
+        Arguments to pass to :class:`TrainingLogBase`
+
+    Notes
+    -----
+    Pickling the log e.g. in a :class:`.Checkpoint` only stores the names
+    of the files that contain the columns, so the directory must be kept
+    around for as long as the checkpoints are. Records that were pickled
+    are never overwritten: an unpickled log continues writing to new
+    files, and changes to pickled records are kept in the sparse store.
+
+    Columns are copied to a new file when their type changes and when the
+    log is pruned. The old file is removed, unless the log was pickled
+    since it was created. The log can't tell whether the pickle is still
+    used, so the files of checkpoints that were deleted have to be
+    cleaned up by hand: the files with the ``.col`` extension in the
+    directory that none of the remaining checkpoints refer to (see
+    the `segments` of the columns of their logs) can be removed.
+
+    Integers and floats written to the same column are all stored as
+    floats.
+
+    """
+    def __init__(self, directory=None, **kwargs):
+        if directory is None:
+            directory = config.columnar_log_directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.columns = {}
+        self.sparse = {}
+        self.status = {}
+        super(ColumnarLog, self).__init__(**kwargs)
+
+    def __getstate__(self):
+        self.flush()
+        return self.__dict__.copy()
+
+    def flush(self):
+        """Write the columns to disk."""
+        for column in self.columns.values():
+            column.flush()
+
+    def _prune(self, deletions, summaries):
+        # Columns are rewritten instead of deleting records one by one,
+        # which would leave deletion markers in the sparse store. The
+        # summaries are merged into the rewritten columns, since they are
+        # written at old times, which would end up in the sparse store too.
+        deleted = {}
+        for time, keys in deletions.items():
+            sparse = self.sparse.get(time, {})
+            for key in keys:
+                if key in sparse:
+                    del sparse[key]
+                deleted.setdefault(key, []).append(time)
+            if time in self.sparse and not sparse:
+                del self.sparse[time]
+        written = {}
+        for time, records in summaries.items():
+            for key, value in records.items():
+                if _column_type(value) is None:
+                    self[time][key] = value
+                else:
+                    written.setdefault(key, []).append((time, value))
+        for key in set(deleted) | set(written):
+            column = self.columns.get(key)
+            summary = written.get(key, [])
+            if column is None and not summary:
+                continue
+            dtypes = [_column_type(value) for _, value in summary]
+            if column is None:
+                column = self.columns[key] = _Column(
+                    self.directory, numpy.result_type(*dtypes))
+            records = column.records()
+            times = deleted.get(key, []) + [time for time, _ in summary]
+            records = records[~numpy.in1d(records['time'], times)]
+            dtype = numpy.dtype([
+                ('time', 'int64'),
+                ('value', numpy.result_type(records.dtype['value'],
+                                            *dtypes))])
+            records = numpy.concatenate([
+                records.astype(dtype), numpy.array(summary, dtype=dtype)])
+            column.rewrite(records[numpy.argsort(records['time'],
+                                                 kind='mergesort')])
+            for time, _ in summary:
+                ColumnarEntry(self, time)._clear_sparse(key)
+
+    def series(self, key, start=None, stop=None, every=None):
+        """Return the values of a record over time.
+
+        See :meth:`TrainingLogBase.series`. Unless some of the records
+        are in the sparse store, the arrays returned are slices of the
+        column. If the column is stored in a single file, these are views
+        of the memory-mapped file rather than copies.
+
+        """
+        if key in self.columns:
+            records = self.columns[key].records()
+        else:
+            records = numpy.empty(0, dtype=[('time', 'int64'),
+                                            ('value', 'float64')])
+        first = (numpy.searchsorted(records['time'], start)
+                 if start is not None else None)
+        last = (numpy.searchsorted(records['time'], stop)
+                if stop is not None else None)
+        records = records[first:last]
+        sparse = {time: entry[key] for time, entry in self.sparse.items()
+                  if key in entry and _in_range(time, start, stop)}
+        if sparse:
+            records = records[~numpy.in1d(records['time'], list(sparse))]
+            return _to_arrays(sorted(
+                list(zip(records['time'].tolist(),
+                         records['value'].tolist())) +
+                [(time, value) for time, value in sparse.items()
+                 if value is not _DELETED]), every)
+        records = records[::every]
+        return records['time'], records['value']
+
+    def __getitem__(self, time):
+        self._check_time(time)
+        return ColumnarEntry(self, time)
+
+    def __iter__(self):
+        times = [column.records()['time'] for column in self.columns.values()]
+        times.append(numpy.array([time for time, entry in self.sparse.items()
+                                  if any(value is not _DELETED
+                                         for value in entry.values())],
+                                 dtype='int64'))
+        return iter(numpy.unique(numpy.concatenate(times)).tolist())
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class ColumnarEntry(MutableMapping):
+    """The records of a :class:`ColumnarLog` at a particular time."""
+    def __init__(self, log, time):
+        self.log = log
+        self.time = time
+
+    @property
+    def _sparse(self):
+        return self.log.sparse.get(self.time, {})
+
+    def __getitem__(self, key):
+        if key in self._sparse:
+            value = self._sparse[key]
+            if value is _DELETED:
+                raise KeyError(key)
+            return value
+        column = self.log.columns.get(key)
+        if column is not None:
+            location = column.find(self.time)
+            if location is not None:
+                return column.get(location)
+        raise KeyError(key)
+
+    def _set_sparse(self, key, value):
+        self.log.sparse.setdefault(self.time, {})[key] = value
+
+    def _clear_sparse(self, key):
+        sparse = self.log.sparse.get(self.time)
+        if sparse is not None and key in sparse:
+            del sparse[key]
+            if not sparse:
+                del self.log.sparse[self.time]
+
+    def __setitem__(self, key, value):
+        dtype = _column_type(value)
+        column = self.log.columns.get(key)
+        if dtype is None:
+            # A record in the column at this time is shadowed
+            self._set_sparse(key, value)
+            return
+        if column is None:
+            column = self.log.columns[key] = _Column(self.log.directory,
+                                                     dtype)
+        elif column.dtype['value'] != dtype and dtype.kind == 'f':
+            column.promote(dtype)
+        location = column.find(self.time)
+        if location is not None:
+            stored = column.set(location, value)
+        else:
+            last_time = column.last_time
+            stored = last_time is None or self.time > last_time
+            if stored:
+                column.append(self.time, value)
+        if stored:
+            self._clear_sparse(key)
+        else:
+            self._set_sparse(key, value)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        column = self.log.columns.get(key)
+        location = column.find(self.time) if column is not None else None
+        if location is not None and not column.pop(location):
+            self._set_sparse(key, _DELETED)
+        else:
+            self._clear_sparse(key)
+
+    def __iter__(self):
+        sparse = self._sparse
+        keys = [key for key, column in self.log.columns.items()
+                if key not in sparse and column.find(self.time) is not None]
+        keys.extend(key for key, value in sparse.items()
+                    if value is not _DELETED)
+        return iter(keys)
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -1,10 +1,13 @@
 """The event-based main loop of Blocks."""
+import os
 from abc import ABCMeta
 from collections import defaultdict
-from numbers import Integral
+from numbers import Integral, Real
 from uuid import uuid4
 
+import numpy
 import six
+from six.moves import cPickle
 
 
 @six.add_metaclass(ABCMeta)
@@ -85,6 +88,80 @@ class TrainingLogBase(object):
         self.status.update(old_status)
         self.status['resumed_from'] = old_uuid
 
+    def series(self, key, start=None, stop=None, every=None):
+        """Return the values of a record over time.
+
+        Parameters
+        ----------
+        key : str
+            The name of the record.
+        start : int, optional
+            The first time to return records for.
+        stop : int, optional
+            Only records made before this time are returned.
+        every : int, optional
+            Only return every `every`-th record.
+
+        Returns
+        -------
+        times : :class:`numpy.ndarray`
+            The times at which the records were made, in ascending order.
+        values : :class:`numpy.ndarray`
+            The values of the records. If these aren't scalars, this is an
+            array of objects.
+
+        Notes
+        -----
+        This implementation reads every row of the log, backends should
+        override it with something more efficient.
+
+        """
+        return _to_arrays(sorted(
+            (time, entry[key]) for time, entry in self.items()
+            if key in entry and _in_range(time, start, stop)), every)
+
+    def prune(self, policy):
+        """Thin out old records according to a retention policy.
+
+        Parameters
+        ----------
+        policy : :class:`RetentionPolicy`
+            The policy that determines which records are kept.
+
+        """
+        deletions, summaries, stop = policy.plan(self)
+        self._prune(deletions, summaries)
+        self.status['_pruned_until'] = stop
+
+    def _prune(self, deletions, summaries):
+        """Delete and write records as planned by a retention policy.
+
+        Parameters
+        ----------
+        deletions : dict
+            A dictionary mapping times to the names of the records to
+            delete at that time.
+        summaries : dict
+            A dictionary mapping times to dictionaries of records to write
+            at that time.
+
+        """
+        for time, keys in deletions.items():
+            entry = self[time]
+            for key in keys:
+                del entry[key]
+        for time, records in summaries.items():
+            self[time].update(records)
+
+    def flush(self):
+        """Make sure all the records are stored by the backend.
+
+        Backends which buffer writes should persist them when this method
+        is called. By default this does nothing.
+
+        """
+        pass
+
     def _check_time(self, time):
         if not isinstance(time, Integral) or time < 0:
             raise ValueError("time must be a non-negative integer")
@@ -102,6 +179,132 @@ class TrainingLogBase(object):
         return self[self.status['_epoch_ends'][-1]]
 
 
+def _in_range(time, start, stop):
+    return ((start is None or time >= start) and
+            (stop is None or time < stop))
+
+
+def _to_arrays(records, every=None):
+    """Convert a sorted list of (time, value) pairs to arrays.
+
+    Used to implement :meth:`TrainingLogBase.series`.
+
+    """
+    records = records[::every]
+    times = numpy.array([time for time, _ in records], dtype='int64')
+    values = numpy.array([value for _, value in records])
+    if values.ndim != 1 or values.dtype.kind not in 'biuf':
+        values = numpy.empty(len(records), dtype=object)
+        for i, (_, value) in enumerate(records):
+            values[i] = value
+    return times, values
+
+
+class RetentionPolicy(object):
+    """Determines which old records of a log are kept.
+
+    Rows of the most recent `keep_last` iterations are kept as they are.
+    Older rows are divided into windows of `every` iterations. Either the
+    first row of every window is kept, and all the others removed, or all
+    the rows of a window are replaced by a single summary. The summary is
+    written to the last row of the window, and contains the mean of every
+    numerical record under its original name, as well as its minimum and
+    maximum with the ``_min`` and ``_max`` suffixes. Windows are aligned
+    to multiples of `every`.
+
+    Rows at the end of an epoch are always kept as they are, and so are
+    "sticky" records such as notifications that the model was saved.
+
+    Parameters
+    ----------
+    keep_last : int
+        The number of most recent iterations to keep at full resolution.
+    every : int
+        The size of the windows older rows are divided into.
+    summarize : bool, optional
+        If ``True``, windows are replaced by a summary instead of by their
+        first row. Defaults to ``False``.
+    sticky : iterable of str, optional
+        The names of records which are never removed. Defaults to
+        :attr:`default_sticky`.
+    sticky_suffixes : iterable of str, optional
+        Records with a name ending in one of these suffixes are never
+        removed. Defaults to ``('_best_so_far',)``, the suffix of the
+        notifications made by :class:`.TrackTheBest`.
+
+    Notes
+    -----
+    Rows are only ever pruned once. The log remembers up to which time
+    it was pruned in its ``_pruned_until`` status record.
+
+    """
+    default_sticky = ('saved_to', 'loaded_from', 'training_finished',
+                      'training_finish_requested', 'got_exception',
+                      'epoch_interrupt_received', 'batch_interrupt_received')
+
+    def __init__(self, keep_last, every, summarize=False, sticky=None,
+                 sticky_suffixes=('_best_so_far',)):
+        if sticky is None:
+            sticky = self.default_sticky
+        self.keep_last = keep_last
+        self.every = every
+        self.summarize = summarize
+        self.sticky = frozenset(sticky)
+        self.sticky_suffixes = tuple(sticky_suffixes)
+
+    def is_sticky(self, key):
+        return key in self.sticky or key.endswith(self.sticky_suffixes)
+
+    def plan(self, log):
+        """Determine which records of a log to delete and to write.
+
+        Returns
+        -------
+        deletions : dict
+            A dictionary mapping times to the names of the records to
+            delete at that time.
+        summaries : dict
+            A dictionary mapping times to dictionaries of records to write
+            at that time.
+        stop : int
+            The time up to which the log was pruned.
+
+        """
+        start = log.status.get('_pruned_until', 0)
+        stop = log.status['iterations_done'] - self.keep_last
+        stop = max(start, stop - stop % self.every)
+        epoch_ends = set(log.status['_epoch_ends'])
+        windows = defaultdict(list)
+        for time in log:
+            if start <= time < stop and time not in epoch_ends:
+                windows[time // self.every].append(time)
+        deletions, summaries = {}, {}
+        for window, times in windows.items():
+            times.sort()
+            if not self.summarize:
+                times = times[1:]
+            values = defaultdict(list)
+            for time in times:
+                entry = log[time]
+                keys = [key for key in entry if not self.is_sticky(key)]
+                if keys:
+                    deletions[time] = keys
+                for key in keys:
+                    value = entry[key]
+                    if (isinstance(value, (Real, numpy.ndarray)) and
+                            numpy.ndim(value) == 0 and
+                            not isinstance(value, (bool, numpy.bool_))):
+                        values[key].append(value)
+            if self.summarize and values:
+                summary = {}
+                for key, series in values.items():
+                    summary[key] = float(numpy.mean(series))
+                    summary[key + '_min'] = float(numpy.min(series))
+                    summary[key + '_max'] = float(numpy.max(series))
+                summaries[times[-1]] = summary
+        return deletions, summaries, stop
+
+
 class TrainingLog(defaultdict, TrainingLogBase):
     """Training log using a `defaultdict` as backend.
 
@@ -133,3 +336,120 @@ class TrainingLog(defaultdict, TrainingLogBase):
     def __setitem__(self, time, value):
         self._check_time(time)
         return super(TrainingLog, self).__setitem__(time, value)
+
+    def _prune(self, deletions, summaries):
+        super(TrainingLog, self)._prune(deletions, summaries)
+        for time in deletions:
+            if not self[time]:
+                del self[time]
+
+
+def append_to_sidecar(log, path, offset=0, start=0):
+    """Append the rows of a log to a sidecar file.
+
+    A sidecar file is a sequence of pickled dictionaries mapping times to
+    rows, where rows in later dictionaries replace those in earlier ones.
+    It allows a log to be saved incrementally instead of pickling the
+    whole log every time.
+
+    Parameters
+    ----------
+    log : :class:`TrainingLog`
+        The log to save.
+    path : str
+        The path of the sidecar file.
+    offset : int, optional
+        The position in the file to write the rows to. Anything after it
+        is discarded. Defaults to 0, which starts a new file.
+    start : int, optional
+        Only the rows from this time on are written. Defaults to 0.
+
+    Returns
+    -------
+    int
+        The offset up to which the file was written, to be passed to
+        :func:`load_from_sidecar` and to the next call of this function.
+
+    """
+    rows = {time: dict(row) for time, row in log.items() if time >= start}
+    with open(path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.truncate()
+        cPickle.dump(rows, f, protocol=cPickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def load_from_sidecar(path, offset, state, relative=False):
+    """Recreate a log from a sidecar file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the sidecar file.
+    offset : int
+        Only the rows up to this position in the file are read.
+    state : dict
+        The attributes of the log, such as its status and UUID.
+    relative : bool, optional
+        If ``True``, `path` is relative to the directory of the file that
+        is being loaded by :func:`~blocks.serialization.load`, see
+        :func:`~blocks.serialization.loading_directory`. Defaults to
+        ``False``.
+
+    Returns
+    -------
+    :class:`TrainingLog`
+        The log.
+
+    """
+    if relative:
+        from blocks.serialization import loading_directory
+        directory = loading_directory()
+        if directory is not None:
+            path = os.path.join(directory, path)
+    log = TrainingLog.__new__(TrainingLog)
+    defaultdict.__init__(log, dict)
+    log.__dict__.update(state)
+    with open(path, 'rb') as f:
+        while f.tell() < offset:
+            log.update(cPickle.load(f))
+    return log
+
+
+class SidecarReference(object):
+    """Stands in for a log that was saved to a sidecar file.
+
+    When pickled in place of a :class:`TrainingLog` it only stores the
+    log's attributes and the location of its rows. Unpickling it returns
+    the log with its rows read from the sidecar file.
+
+    Parameters
+    ----------
+    log : :class:`TrainingLog`
+        The log that was saved.
+    path : str
+        The path of the sidecar file.
+    offset : int
+        The offset returned by :func:`append_to_sidecar`.
+    relative_to : str, optional
+        The path of the file the reference is saved to. If given, the path
+        of the sidecar file is stored relative to the directory of this
+        file, and it is found next to the file when it is loaded by
+        :func:`~blocks.serialization.load`. Otherwise `path` is stored as
+        it is.
+
+    """
+    def __init__(self, log, path, offset, relative_to=None):
+        self.state = log.__dict__
+        self.path = path
+        self.offset = offset
+        self.relative_to = relative_to
+
+    def __reduce__(self):
+        if self.relative_to is None:
+            return load_from_sidecar, (self.path, self.offset, self.state)
+        path = os.path.relpath(os.path.abspath(self.path), os.path.dirname(
+            os.path.abspath(self.relative_to)))
+        return load_from_sidecar, (path, self.offset, self.state, True)
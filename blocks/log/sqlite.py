@@ -1,5 +1,6 @@
 """SQLite backend for the main loop log."""
 import sqlite3
+import time
 import warnings
 from collections import MutableMapping, Mapping
 from operator import itemgetter
@@ -9,20 +10,15 @@ import six
 from six.moves import cPickle, map
 
 from blocks.config import config
-from .log import TrainingLogBase
+from .log import TrainingLogBase, _in_range, _to_arrays
 
 
-ANCESTORS_QUERY = """
-WITH parents (parent, child) AS (
-    SELECT uuid, value FROM status
-    WHERE key = 'resumed_from' AND uuid = ?
-    UNION ALL
-    SELECT uuid, value FROM status
-    INNER JOIN parents ON status.uuid = parents.child
-    WHERE key = 'resumed_from'
-),
-ancestors AS (SELECT parent FROM parents)
-"""
+# Markers used in the write buffer of SQLiteLog
+_DELETED = object()
+_MISSING = object()
+
+# SQL conditions selecting a given number of UUIDs
+_UUID_CONDITIONS = {}
 
 LARGE_BLOB_WARNING = """
 
@@ -109,15 +105,48 @@ class SQLiteLog(TrainingLogBase, Mapping):
         The database (file) to connect to. Can also be `:memory:`. See
         :func:`sqlite3.connect` for details. Uses `config.sqlite_database`
         by default.
+    buffered : bool, optional
+        If ``True``, writes are kept in memory and written to the database
+        in a single transaction every `flush_iterations` iterations or
+        `flush_seconds` seconds, whichever comes first, or when
+        :meth:`flush` is called. The database is put in write-ahead
+        logging (WAL) mode, so that other processes can read the log while
+        training continues. Uses `config.sqlite_buffered` by default.
+    flush_iterations : int, optional
+        The number of iterations after which a buffered log is written to
+        the database. Uses `config.sqlite_flush_iterations` by default.
+    flush_seconds : float, optional
+        The number of seconds after which a buffered log is written to the
+        database. Uses `config.sqlite_flush_seconds` by default.
     \*\*kwargs
         Arguments to pass to :class:`TrainingLogBase`
 
+    Notes
+    -----
+    Records of a buffered log that have not been flushed are visible to
+    this log object, but not to other connections to the database. They
+    are lost if the process is killed before the next flush. The main loop
+    flushes the log at the end of every epoch, when training finishes or
+    fails, and the log is flushed every time it is pickled e.g. by
+    :class:`.Checkpoint`.
+
     """
-    def __init__(self, database=None, **kwargs):
+    def __init__(self, database=None, buffered=None, flush_iterations=None,
+                 flush_seconds=None, **kwargs):
         if database is None:
             database = config.sqlite_database
+        if buffered is None:
+            buffered = config.sqlite_buffered
+        if flush_iterations is None:
+            flush_iterations = config.sqlite_flush_iterations
+        if flush_seconds is None:
+            flush_seconds = config.sqlite_flush_seconds
         self.database = database
-        self.conn = sqlite3.connect(database)
+        self.buffered = buffered
+        self.flush_iterations = flush_iterations
+        self.flush_seconds = flush_seconds
+        self._ancestry = None
+        self._reset_buffer()
         sqlite3.register_adapter(numpy.ndarray, adapt_ndarray)
         with self.conn:
             self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
@@ -127,6 +156,8 @@ class SQLiteLog(TrainingLogBase, Mapping):
                                    value,
                                    PRIMARY KEY(uuid, time, "key")
                                  );""")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS entries_key
+                                 ON entries (uuid, "key", time);""")
             self.conn.execute("""CREATE TABLE IF NOT EXISTS status (
                                    uuid TEXT NOT NULL,
                                    "key" text NOT NULL,
@@ -140,79 +171,324 @@ class SQLiteLog(TrainingLogBase, Mapping):
     def conn(self):
         if not hasattr(self, '_conn'):
             self._conn = sqlite3.connect(self.database)
+            if self.buffered:
+                self._conn.execute("PRAGMA journal_mode=WAL")
         return self._conn
 
     @conn.setter
     def conn(self, value):
         self._conn = value
 
+    @property
+    def ancestors(self):
+        """The UUIDs of this log and of the logs it was resumed from.
+
+        The UUIDs are ordered from the most recent log to the oldest one.
+        The chain is looked up once for each UUID this log has, and then
+        cached.
+
+        """
+        return self._get_ancestry()[0]
+
+    def _get_ancestry(self):
+        """Return the ancestors and the span of times they have records for.
+
+        Logs that were resumed from are not written to anymore, so the
+        first and last time they have records for are cached, and used to
+        limit the logs queried for a particular time.
+
+        """
+        h_uuid = self.h_uuid
+        if self._ancestry is None or self._ancestry[0][0] != h_uuid:
+            ancestors = [h_uuid]
+            parent = self.status.get('resumed_from')
+            while parent is not None:
+                ancestors.append(parent)
+                row = self.conn.execute(
+                    "SELECT value FROM status "
+                    "WHERE uuid = ? AND key = 'resumed_from'", (parent,)
+                ).fetchone()
+                parent = row[0] if row is not None else None
+            spans = [self.conn.execute(
+                "SELECT MIN(time), MAX(time) FROM entries WHERE uuid = ?",
+                (uuid,)).fetchone() for uuid in ancestors[1:]]
+            self._ancestry = ancestors, spans
+        return self._ancestry
+
+    def _select_ancestors(self, time_=None):
+        """Select the logs that could have records at a particular time.
+
+        Parameters
+        ----------
+        time_ : int, optional
+            The time to select logs for. By default all ancestors are
+            selected.
+
+        Returns
+        -------
+        uuids : list of str
+            The UUIDs of the selected logs, most recent first.
+        condition : str
+            An SQL condition selecting these logs.
+
+        """
+        ancestors, spans = self._get_ancestry()
+        if time_ is None:
+            uuids = ancestors
+        else:
+            uuids = [ancestors[0]] + [
+                uuid for uuid, (start, stop) in zip(ancestors[1:], spans)
+                if start is not None and start <= time_ <= stop]
+        return uuids, _uuid_condition(len(uuids))
+
+    def _reset_buffer(self):
+        self._pending_entries = {}
+        self._pending_status = {}
+        self._last_flush_time = time.time()
+        self._last_flush_iteration = None
+
+    def _maybe_flush(self, time_=None):
+        """Flush the buffer if enough iterations or time have passed."""
+        if time_ is not None and self._last_flush_iteration is None:
+            self._last_flush_iteration = time_
+        if ((time_ is not None and
+                time_ - self._last_flush_iteration >= self.flush_iterations) or
+                time.time() - self._last_flush_time >= self.flush_seconds):
+            self.flush()
+            self._last_flush_iteration = time_
+
+    def _buffer_entry(self, time_, key, value):
+        self._pending_entries.setdefault(time_, {})[key] = value
+        self._maybe_flush(time_)
+
+    def _buffer_status(self, key, value):
+        self._pending_status[key] = value
+        self._maybe_flush()
+
+    def flush(self):
+        """Write all the buffered records to the database."""
+        if self._pending_entries or self._pending_status:
+            h_uuid = self.h_uuid
+            with self.conn:
+                for time_, entry in self._pending_entries.items():
+                    for key, value in entry.items():
+                        if value is _DELETED:
+                            self.conn.execute(
+                                "DELETE FROM entries WHERE uuid = ? AND "
+                                "time = ? AND key = ?", (h_uuid, time_, key))
+                        else:
+                            self.conn.execute(
+                                "INSERT OR REPLACE INTO entries "
+                                "VALUES (?, ?, ?, ?)",
+                                (h_uuid, time_, key, value))
+                for key, value in self._pending_status.items():
+                    if value is _DELETED:
+                        self.conn.execute(
+                            "DELETE FROM status WHERE uuid = ? AND key = ?",
+                            (h_uuid, key))
+                    else:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO status VALUES (?, ?, ?)",
+                            (h_uuid, key, value))
+        self._reset_buffer()
+
+    def resume(self):
+        # Buffered records belong to the current UUID
+        self.flush()
+        super(SQLiteLog, self).resume()
+        self.status.invalidate()
+
     def __getstate__(self):
         """Retrieve the state for pickling.
 
         :class:`sqlite3.Connection` objects are not picklable, so the
         `conn` attribute is removed and the connection re-opened upon
-        unpickling.
+        unpickling. Buffered records are written to the database first.
 
         """
+        self.flush()
         state = self.__dict__.copy()
-        if '_conn' in state:
-            del state['_conn']
+        for attribute in ('_conn', '_pending_entries', '_pending_status'):
+            state.pop(attribute, None)
         self.resume()
         return state
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('buffered', False)
+        self.__dict__.setdefault('flush_iterations',
+                                 config.sqlite_flush_iterations)
+        self.__dict__.setdefault('flush_seconds', config.sqlite_flush_seconds)
+        self._ancestry = None
+        self._reset_buffer()
+
+    def series(self, key, start=None, stop=None, every=None):
+        """Return the values of a record over time.
+
+        See :meth:`TrainingLogBase.series`. The records are read from the
+        database using a single query.
+
+        """
+        ancestors, condition = self._select_ancestors()
+        query = ("SELECT time, uuid, value FROM entries "
+                 "WHERE {} AND key = ?".format(condition))
+        parameters = ancestors + [key]
+        if start is not None:
+            query += " AND time >= ?"
+            parameters.append(start)
+        if stop is not None:
+            query += " AND time < ?"
+            parameters.append(stop)
+        # Records of more recent logs take precedence
+        priorities = {uuid: i for i, uuid in enumerate(ancestors)}
+        records = {}
+        for time_, uuid, value in self.conn.execute(query, parameters):
+            if (time_ not in records or
+                    priorities[uuid] < records[time_][0]):
+                records[time_] = priorities[uuid], value
+        records = {time_: _get_row((value,), key)
+                   for time_, (_, value) in records.items()}
+        for time_, entry in self._pending_entries.items():
+            if key in entry and _in_range(time_, start, stop):
+                if entry[key] is _DELETED:
+                    records.pop(time_, None)
+                else:
+                    records[time_] = entry[key]
+        return _to_arrays(sorted(records.items()), every)
+
     def __getitem__(self, time):
         self._check_time(time)
         return SQLiteEntry(self, time)
 
     def __iter__(self):
-        return map(itemgetter(0), self.conn.execute(
-            ANCESTORS_QUERY + "SELECT DISTINCT time FROM entries "
-            "WHERE uuid IN ancestors ORDER BY time ASC", (self.h_uuid,)
+        ancestors, condition = self._select_ancestors()
+        times = map(itemgetter(0), self.conn.execute(
+            "SELECT DISTINCT time FROM entries WHERE {} "
+            "ORDER BY time ASC".format(condition), ancestors
         ))
+        if self._pending_entries:
+            # Times whose records were all deleted disappear on flushing
+            deleted = set(
+                time_ for time_, entry in self._pending_entries.items()
+                if all(value is _DELETED for value in entry.values()) and
+                len(SQLiteEntry(self, time_)) == 0)
+            times = iter(sorted(
+                (set(times) | set(self._pending_entries)) - deleted))
+        return times
 
     def __len__(self):
+        if self._pending_entries:
+            return sum(1 for _ in self)
+        ancestors, condition = self._select_ancestors()
         return self.conn.execute(
-            ANCESTORS_QUERY + "SELECT COUNT(DISTINCT time) FROM entries "
-            "WHERE uuid IN ancestors ORDER BY time ASC", (self.h_uuid,)
+            "SELECT COUNT(DISTINCT time) FROM entries WHERE {}"
+            .format(condition), ancestors
         ).fetchone()[0]
 
 
+def _uuid_condition(number):
+    """An SQL condition selecting a number of UUIDs given as parameters."""
+    if number not in _UUID_CONDITIONS:
+        _UUID_CONDITIONS[number] = "uuid IN ({})".format(
+            ', '.join('?' * number))
+    return _UUID_CONDITIONS[number]
+
+
+def _merge_pending(keys, pending):
+    """Merge keys read from the database with buffered writes."""
+    if not pending:
+        return keys
+    keys = list(keys)
+    stored = set(keys)
+    return iter([key for key in keys if pending.get(key) is not _DELETED] +
+                [key for key, value in pending.items()
+                 if value is not _DELETED and key not in stored])
+
+
+def _get_pending(pending, key):
+    """Look up a key among buffered writes, returns `_MISSING` if absent."""
+    value = pending.get(key, _MISSING)
+    if value is _DELETED:
+        raise KeyError(key)
+    return value
+
+
 class SQLiteStatus(MutableMapping):
+    """Store the status of a log in an SQLite database.
+
+    The status is read from the database once and then kept in a
+    dictionary, which is considered authoritative for the process that
+    owns the log. Writes go to both the dictionary and the database, so
+    that reading the status (which the main loop does several times per
+    iteration) does not require a query.
+
+    """
     def __init__(self, log):
         self.log = log
+        self._cache = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Pickled before the status was cached
+        self._cache = None
+
+    @property
+    def cache(self):
+        """A dictionary with the status of the log."""
+        if self._cache is None:
+            self._cache = {key: _get_row((value,), key)
+                           for key, value in self.log.conn.execute(
+                               "SELECT key, value FROM status WHERE uuid = ?",
+                               (self.log.h_uuid,))}
+            for key, value in self.log._pending_status.items():
+                if value is _DELETED:
+                    self._cache.pop(key, None)
+                else:
+                    self._cache[key] = value
+        return self._cache
+
+    def invalidate(self):
+        """Discard the cache, forcing it to be reread from the database."""
+        self._cache = None
 
     def __getitem__(self, key):
-        row = self.log.conn.execute(
-            "SELECT value FROM status WHERE uuid = ? AND key = ?",
-            (self.log.h_uuid, key)
-        ).fetchone()
-        return _get_row(row, key)
+        return self.cache[key]
 
     def __setitem__(self, key, value):
         _register_adapter(value, key)
-        with self.log.conn:
-            self.log.conn.execute(
-                "INSERT OR REPLACE INTO status VALUES (?, ?, ?)",
-                (self.log.h_uuid, key, value)
-            )
+        if self.log.buffered:
+            self.log._buffer_status(key, value)
+        else:
+            with self.log.conn:
+                self.log.conn.execute(
+                    "INSERT OR REPLACE INTO status VALUES (?, ?, ?)",
+                    (self.log.h_uuid, key, value)
+                )
+        if self._cache is not None:
+            self._cache[key] = value
 
     def __delitem__(self, key):
-        with self.log.conn:
-            self.log.conn.execute(
-                "DELETE FROM status WHERE uuid = ? AND key = ?",
-                (self.log.h_uuid, key)
-            )
+        if self.log.buffered:
+            self.log._buffer_status(key, _DELETED)
+        else:
+            with self.log.conn:
+                self.log.conn.execute(
+                    "DELETE FROM status WHERE uuid = ? AND key = ?",
+                    (self.log.h_uuid, key)
+                )
+        if self._cache is not None:
+            self._cache.pop(key, None)
 
     def __len__(self):
-        return self.log.conn.execute(
-            "SELECT COUNT(*) FROM status WHERE uuid = ?",
-            (self.log.h_uuid,)
-        ).fetchone()[0]
+        return len(self.cache)
 
     def __iter__(self):
-        return map(itemgetter(0), self.log.conn.execute(
-            "SELECT key FROM status WHERE uuid = ?", (self.log.h_uuid,)
-        ))
+        return iter(list(self.cache))
 
 
 class SQLiteEntry(MutableMapping):
@@ -231,18 +507,30 @@ class SQLiteEntry(MutableMapping):
         self.log = log
         self.time = time
 
+    @property
+    def _pending(self):
+        return self.log._pending_entries.get(self.time, {})
+
     def __getitem__(self, key):
-        row = self.log.conn.execute(
-            ANCESTORS_QUERY + "SELECT value FROM entries "
-            # JOIN statement should sort things so that the latest is returned
-            "JOIN ancestors ON entries.uuid = ancestors.parent "
-            "WHERE uuid IN ancestors AND time = ? AND key = ?",
-            (self.log.h_uuid, self.time, key)
-        ).fetchone()
+        value = _get_pending(self._pending, key)
+        if value is not _MISSING:
+            return value
+        ancestors, condition = self.log._select_ancestors(self.time)
+        values = dict(self.log.conn.execute(
+            "SELECT uuid, value FROM entries "
+            "WHERE {} AND time = ? AND key = ?".format(condition),
+            ancestors + [self.time, key]
+        ))
+        # The value written by the most recent log is returned
+        row = next(((values[uuid],) for uuid in ancestors if uuid in values),
+                   None)
         return _get_row(row, key)
 
     def __setitem__(self, key, value):
         _register_adapter(value, key)
+        if self.log.buffered:
+            self.log._buffer_entry(self.time, key, value)
+            return
         with self.log.conn:
             self.log.conn.execute(
                 "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
@@ -250,6 +538,9 @@ class SQLiteEntry(MutableMapping):
             )
 
     def __delitem__(self, key):
+        if self.log.buffered:
+            self.log._buffer_entry(self.time, key, _DELETED)
+            return
         with self.log.conn:
             self.log.conn.execute(
                 "DELETE FROM entries WHERE uuid = ? AND time = ? AND key = ?",
@@ -257,15 +548,19 @@ class SQLiteEntry(MutableMapping):
             )
 
     def __len__(self):
+        if self._pending:
+            return sum(1 for _ in self)
+        ancestors, condition = self.log._select_ancestors(self.time)
         return self.log.conn.execute(
-            ANCESTORS_QUERY + "SELECT COUNT(*) FROM entries "
-            "WHERE uuid IN ancestors AND time = ?",
-            (self.log.h_uuid, self.time,)
+            "SELECT COUNT(DISTINCT key) FROM entries "
+            "WHERE {} AND time = ?".format(condition),
+            ancestors + [self.time]
         ).fetchone()[0]
 
     def __iter__(self):
-        return map(itemgetter(0), self.log.conn.execute(
-            ANCESTORS_QUERY + "SELECT key FROM entries "
-            "WHERE uuid IN ancestors AND time = ?",
-            (self.log.h_uuid, self.time,)
-        ))
+        ancestors, condition = self.log._select_ancestors(self.time)
+        return _merge_pending(map(itemgetter(0), self.log.conn.execute(
+            "SELECT DISTINCT key FROM entries "
+            "WHERE {} AND time = ?".format(condition),
+            ancestors + [self.time]
+        )), self._pending)
@@ -83,9 +83,9 @@ class MainLoop(object):
     log : instance of :class:`.TrainingLog`, optional
         The log. When not given, a :class:`.TrainingLog` is created.
     log_backend : str
-        The backend to use for the log. Currently `python` and `sqlite` are
-        available. If not given, `config.log_backend` will be used. Ignored
-        if `log` is passed.
+        The backend to use for the log. Currently `python`, `sqlite` and
+        `columnar` are available. If not given, `config.log_backend` will
+        be used. Ignored if `log` is passed.
     extensions : list of :class:`.TrainingExtension` instances
         The training extensions. Will be called in the same order as given
         here.
@@ -187,6 +187,7 @@ class MainLoop(object):
             except Exception as e:
                 self._restore_signal_handlers()
                 self.log.current_row['got_exception'] = traceback.format_exc()
+                self.log.flush()
                 logger.error("Error occured during training." + error_message)
                 try:
                     self._run_extensions('on_error')
@@ -199,6 +200,7 @@ class MainLoop(object):
                 self._restore_signal_handlers()
                 if self.log.current_row.get('training_finished', False):
                     self._run_extensions('after_training')
+                self.log.flush()
                 if config.profile:
                     self.profile.report()
 
@@ -236,6 +238,7 @@ class MainLoop(object):
         # Log might not allow mutating objects, so use += instead of append
         self.status['_epoch_ends'] += [self.status['iterations_done']]
         self._run_extensions('after_epoch')
+        self.log.flush()
         self._check_finish_training('epoch')
         return True
 
@@ -64,12 +64,12 @@ class Model(ComputationGraph):
         bricks = [get_brick(var) for var
                   in self.variables + self.scan_variables if get_brick(var)]
         children = set(chain(*(brick.children for brick in bricks)))
-        # Quadratic complexity: we should not have thousands of
-        # top-level bricks.
         self.top_bricks = []
+        seen = set()
         for brick in bricks:
-            if brick not in children and brick not in self.top_bricks:
+            if brick not in children and brick not in seen:
                 self.top_bricks.append(brick)
+                seen.add(brick)
         names = Counter([brick.name for brick in self.top_bricks])
         repeated_names = [name for name, count in names.items() if count > 1]
         if repeated_names:
@@ -131,6 +131,14 @@ class Model(ComputationGraph):
             Dictionary of (hierarchical name, :class:`~numpy.ndarray`)
             pairs.
 
+        Notes
+        -----
+        Values are retrieved and set one at a time, and only for the
+        parameters of the model. If `parameter_values` loads them on
+        demand, as the mapping returned by
+        :func:`~blocks.serialization.load_parameter_values` with
+        ``lazy=True`` does, at most one array is held in memory at a time.
+
         """
         parameters = self.get_parameter_dict()
 
@@ -141,14 +149,16 @@ class Model(ComputationGraph):
         if len(missing):
             logger.error("missing values for parameters: {}\n".format(missing))
 
-        for name, value in parameter_values.items():
+        for name in parameter_values:
             if name in parameters:
+                value = parameter_values[name]
                 model_shape = parameters[name].container.data.shape
                 if model_shape != value.shape:
                     raise ValueError("Shape mismatch for parameter: {}. "
                                      "Expected {}, got {}."
                                      .format(name, model_shape, value.shape))
                 parameters[name].set_value(value)
+                del value
 
     def get_top_bricks(self):
         """Get the bricks that do not have parents.
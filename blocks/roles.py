@@ -1,5 +1,8 @@
 import re
 
+# Maps the classes of roles to the tuple of roles shared by variables
+_role_tuples = {}
+
 
 def add_role(var, role):
     r"""Add a role to a given Theano variable.
@@ -18,6 +21,11 @@ def add_role(var, role):
     with a parent role (e.g. replace :const:`WEIGHT` with
     :const:`PARAMETER`) you must do so manually.
 
+    The roles are stored in ``var.tag.roles`` as an immutable tuple, which
+    is shared by variables with the same roles (see :func:`role_tuple`),
+    rather than a list. To change the roles of a variable, assign a new
+    tuple instead of modifying it in place.
+
     Examples
     --------
     >>> from theano import tensor
@@ -34,12 +42,39 @@ def add_role(var, role):
     WEIGHT
 
     """
-    roles = getattr(var.tag, 'roles', [])
-    roles = [old_role for old_role in roles
-             if not isinstance(role, old_role.__class__)]
+    roles = getattr(var.tag, 'roles', ())
+    roles = tuple(old_role for old_role in roles
+                  if not isinstance(role, old_role.__class__))
     if not any(isinstance(old_role, role.__class__) for old_role in roles):
-        roles += [role]
-    var.tag.roles = roles
+        roles += (role,)
+    var.tag.roles = role_tuple(roles)
+
+
+def role_tuple(roles):
+    """Return a shared tuple of roles.
+
+    The roles of variables are stored as tuples, and variables with the
+    same roles share the same tuple, which saves memory in large graphs.
+
+    Parameters
+    ----------
+    roles : iterable of :class:`.VariableRole` instances
+
+    Returns
+    -------
+    tuple
+        A tuple equal to ``tuple(roles)``, which shouldn't be modified.
+
+    Notes
+    -----
+    Roles are equal if they are of the same class, so the tuple is shared
+    by all equal roles, e.g. those of unpickled variables, and contains
+    the instances which were seen first.
+
+    """
+    roles = tuple(roles)
+    return _role_tuples.setdefault(
+        tuple(role.__class__ for role in roles), roles)
 
 
 def has_roles(var, roles, match_all=False):
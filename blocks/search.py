@@ -67,11 +67,13 @@ class BeamSearch(object):
         self.context_names = self.generator.generate.contexts
         self.state_names = self.generator.generate.states
 
-        # Parsing the inner computation graph of sampling scan
+        # Parsing the inner computation graph of sampling scan. The graphs
+        # are built here and not changed, so they are filtered through
+        # their indices.
         self.contexts = [
             VariableFilter(bricks=[self.generator],
                            name=name,
-                           roles=[INPUT])(self.inner_cg)[0]
+                           roles=[INPUT]).query(self.inner_cg.index)[0]
             for name in self.context_names]
         self.input_states = []
         # Includes only those state names that were actually used
@@ -80,7 +82,7 @@ class BeamSearch(object):
         for name in self.generator.generate.states:
             var = VariableFilter(
                 bricks=[self.generator], name=name,
-                roles=[INPUT])(self.inner_cg)
+                roles=[INPUT]).query(self.inner_cg.index)
             if var:
                 self.input_state_names.append(name)
                 self.input_states.append(var[0])
@@ -90,11 +92,11 @@ class BeamSearch(object):
     def _compile_initial_state_and_context_computer(self):
         initial_states = VariableFilter(
                             applications=[self.generator.initial_states],
-                            roles=[OUTPUT])(self.cg)
+                            roles=[OUTPUT]).query(self.cg.index)
         outputs = OrderedDict([(v.tag.name, v) for v in initial_states])
         beam_size = unpack(VariableFilter(
                             applications=[self.generator.initial_states],
-                            name='batch_size')(self.cg))
+                            name='batch_size').query(self.cg.index))
         for name, context in equizip(self.context_names, self.contexts):
             outputs[name] = context
         outputs['beam_size'] = beam_size
@@ -102,13 +104,13 @@ class BeamSearch(object):
             self.inputs, outputs, on_unused_input='ignore')
 
     def _compile_next_state_computer(self):
-        next_states = [VariableFilter(bricks=[self.generator],
-                                      name=name,
-                                      roles=[OUTPUT])(self.inner_cg)[-1]
-                       for name in self.state_names]
+        next_states = [VariableFilter(
+            bricks=[self.generator], name=name,
+            roles=[OUTPUT]).query(self.inner_cg.index)[-1]
+            for name in self.state_names]
         next_outputs = VariableFilter(
-            applications=[self.generator.readout.emit], roles=[OUTPUT])(
-                self.inner_cg.variables)
+            applications=[self.generator.readout.emit],
+            roles=[OUTPUT]).query(self.inner_cg.index)
         self.next_state_computer = function(
             self.contexts + self.input_states + next_outputs, next_states)
 
@@ -118,7 +120,7 @@ class BeamSearch(object):
         # which to use.
         probs = VariableFilter(
             applications=[self.generator.readout.emitter.probs],
-            roles=[OUTPUT])(self.inner_cg)[0]
+            roles=[OUTPUT]).query(self.inner_cg.index)[0]
         logprobs = -tensor.log(probs)
         self.logprobs_computer = function(
             self.contexts + self.input_states, logprobs,
@@ -1,12 +1,12 @@
 import logging
 import re
 from collections import OrderedDict
+from fnmatch import fnmatchcase
 
 from picklable_itertools.extras import equizip
 import six
 
 from blocks.bricks.base import Brick
-from blocks.utils import dict_union
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +22,7 @@ class Path(object):
 
     Currently the only allowed elements of paths are names of the bricks
     and names of parameters. The latter can only be put in the end of the
-    path. It is planned to support regular expressions in some way later.
+    path. The names can contain wildcards, see :meth:`Selector.select`.
 
     Parameters
     ----------
@@ -108,54 +108,120 @@ class Selector(object):
     bricks : list of :class:`.Brick`
         The bricks of the selection.
 
+    Notes
+    -----
+    The paths of the bricks in the hierarchy are indexed the first time
+    they are needed, after which changes to the ``children`` of the
+    bricks aren't taken into account. The parameters are looked up when
+    a selection is made.
+
     """
     def __init__(self, bricks):
         if isinstance(bricks, Brick):
             bricks = [bricks]
         self.bricks = bricks
+        self._index = None
 
-    def select(self, path):
-        """Select a subset of current selection matching the path given.
+    @property
+    def index(self):
+        """The bricks of the hierarchy by their paths.
 
-        .. warning::
+        An ordered dictionary from tuples of brick names to the lists of
+        bricks with these paths. The paths are in depth-first order,
+        starting from the bricks of the selection.
 
-            Current implementation is very inefficient (theoretical
-            complexity is :math:`O(n^3)`, where :math:`n` is the number
-            of bricks in the hierarchy). It can be sped up easily.
+        """
+        if self._index is None:
+            self._index = OrderedDict()
+            stack = [((brick.name,), brick) for brick in self.bricks[::-1]]
+            while stack:
+                names, brick = stack.pop()
+                bricks = self._index.setdefault(names, [])
+                if brick not in bricks:
+                    bricks.append(brick)
+                stack.extend((names + (child.name,), child)
+                             for child in brick.children[::-1])
+        return self._index
+
+    def select(self, path):
+        """Select a subset of current selection matching the path given.
 
         Parameters
         ----------
         path : :class:`Path` or str
             The path for the desired selection. If a string is given
-            it is parsed into a path.
+            it is parsed into a path. The names in the path can contain
+            the shell-style wildcards ``*``, ``?`` and ``[...]``, which
+            match within a name, e.g. ``/encoder/*/lstm*.W``.
 
         Returns
         -------
         Depending on the path given, one of the following:
 
         * :class:`Selector` with desired bricks.
-        * list of :class:`~tensor.SharedTensorVariable`.
+        * list of :class:`~tensor.SharedTensorVariable`, the parameters
+          of the selected bricks and their descendants with the given
+          name.
 
         """
         if isinstance(path, six.string_types):
             path = Path.parse(path)
 
-        current_bricks = [None]
+        brick_names = tuple(node for node in path.nodes
+                            if isinstance(node, Path.BrickName))
+        if not any(_wildcards.search(name) for name in brick_names):
+            bricks = list(self.index.get(brick_names, []))
+        else:
+            bricks = []
+            for names, matches in self.index.items():
+                if (len(names) == len(brick_names) and
+                        all(_match(name, pattern) for name, pattern
+                            in equizip(names, brick_names))):
+                    bricks.extend(brick for brick in matches
+                                  if brick not in bricks)
         for node in path.nodes:
-            next_bricks = []
             if isinstance(node, Path.ParameterName):
-                return list(Selector(
-                    current_bricks).get_parameters(node).values())
-            if isinstance(node, Path.BrickName):
-                for brick in current_bricks:
-                    children = brick.children if brick else self.bricks
-                    matching_bricks = [child for child in children
-                                       if child.name == node]
-                    for match in matching_bricks:
-                        if match not in next_bricks:
-                            next_bricks.append(match)
-            current_bricks = next_bricks
-        return Selector(current_bricks)
+                return list(Selector(bricks).get_parameters(node).values())
+        return Selector(bricks)
+
+    def select_regex(self, regex):
+        r"""Select the bricks or parameters whose paths match a pattern.
+
+        Parameters
+        ----------
+        regex : str or compiled regular expression
+            The pattern, which has to match the whole string
+            representation of a path, e.g. ``r'/mlp/linear_\d+\.(W|b)'``.
+
+        Returns
+        -------
+        Depending on the paths matched, one of the following:
+
+        * list of :class:`~tensor.SharedTensorVariable`, if the pattern
+          matches the path of any parameter.
+        * :class:`Selector` with the bricks whose paths match otherwise.
+
+        """
+        regex = re.compile(regex)
+
+        def fullmatch(string):
+            match = regex.match(string)
+            return match is not None and match.end() == len(string)
+
+        bricks, parameters = [], []
+        for names, matches in self.index.items():
+            brick_path = _brick_path(names)
+            if fullmatch(brick_path):
+                bricks.extend(brick for brick in matches
+                              if brick not in bricks)
+            for brick in matches:
+                parameters.extend(
+                    parameter for parameter in brick.parameters
+                    if fullmatch(_parameter_path(brick_path, parameter)) and
+                    parameter not in parameters)
+        if parameters:
+            return parameters
+        return Selector(bricks)
 
     def get_parameters(self, parameter_name=None):
         r"""Returns parameters from selected bricks and their descendants.
@@ -164,7 +230,8 @@ class Selector(object):
         ----------
         parameter_name : :class:`Path.ParameterName`, optional
             If given, only parameters with a `name` attribute equal to
-            `parameter_name` are returned.
+            `parameter_name` are returned. It can contain the same
+            wildcards as a path given to :meth:`select`.
 
         Returns
         -------
@@ -196,25 +263,37 @@ class Selector(object):
         ('/mlp/linear_2.W', W)])
 
         """
-        def recursion(brick):
-            # TODO path logic should be separate
-            result = [
-                (Path([Path.BrickName(brick.name),
-                       Path.ParameterName(parameter.name)]),
-                 parameter)
-                for parameter in brick.parameters
-                if not parameter_name or parameter.name == parameter_name]
-            result = OrderedDict(result)
-            for child in brick.children:
-                for path, parameter in recursion(child).items():
-                    new_path = Path([Path.BrickName(brick.name)]) + path
-                    if new_path in result:
+        result = OrderedDict()
+        for names, bricks in self.index.items():
+            brick_path = _brick_path(names)
+            for brick in bricks:
+                parameters = OrderedDict(
+                    (_parameter_path(brick_path, parameter), parameter)
+                    for parameter in brick.parameters
+                    if not parameter_name or
+                    _match(parameter.name, parameter_name))
+                for path, parameter in parameters.items():
+                    if path in result:
                         raise ValueError(
                             "Name collision encountered while retrieving " +
                             "parameters." +
-                            name_collision_error_message.format(new_path))
-                    result[new_path] = parameter
-            return result
-        result = dict_union(*[recursion(brick)
-                            for brick in self.bricks])
-        return OrderedDict((str(key), value) for key, value in result.items())
+                            name_collision_error_message.format(path))
+                    result[path] = parameter
+        return result
+
+
+_wildcards = re.compile(r'[*?[]')
+
+
+def _match(name, pattern):
+    """Match a name with a pattern which can contain wildcards."""
+    return name == pattern or (isinstance(name, six.string_types) and
+                               fnmatchcase(name, pattern))
+
+
+def _brick_path(names):
+    return "".join(Path.BrickName(name).part() for name in names)
+
+
+def _parameter_path(brick_path, parameter):
+    return brick_path + Path.ParameterName(parameter.name).part()
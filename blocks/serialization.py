@@ -1,10 +1,23 @@
+import hashlib
+import io
+import json
 import os
 import shutil
 import six
+import struct
 import tempfile
+import threading
+import time
 import warnings
 import zipfile
+import zlib
+from collections import Mapping, OrderedDict
 from contextlib import closing
+from importlib import import_module
+from itertools import chain
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from uuid import uuid4
 from pickle import HIGHEST_PROTOCOL
 try:
     from pickle import DEFAULT_PROTOCOL
@@ -14,10 +27,12 @@ except ImportError:
     from pickle import Pickler as _Pickler
 
 import numpy
+import theano
 from six.moves import cPickle
 from theano.compile.sharedvalue import SharedVariable
 from theano.misc import pkl_utils
 from theano.misc.pkl_utils import (PersistentCudaNdarrayID,
+                                   PersistentNdarrayLoad,
                                    PersistentSharedVariableID)
 
 from blocks.config import config
@@ -26,6 +41,14 @@ from blocks.utils import change_recursion_limit
 
 
 BRICK_DELIMITER = '-'
+# The boundary to which the data of uncompressed arrays is aligned
+ALIGNMENT = 4096
+# The zip file entry mapping array names to blobs in a BlobStore
+BLOB_INDEX = 'blobs.json'
+# The zip file entry listing the shards that arrays were saved to
+SHARD_INDEX = 'shards.json'
+# The directory of the file which `load` is reading
+_loading = threading.local()
 MAIN_MODULE_WARNING = """WARNING: Main loop depends on the function `{}` in \
 `__main__` namespace.
 
@@ -70,9 +93,721 @@ class PersistentParameterID(PersistentSharedVariableID):
                 )
             else:
                 name = obj.name
-            self.ndarray_names[id(obj.container.storage[0])] = name
+            # Arrays of unnamed shared variables are pickled as usual
+            if name is not None:
+                self.ndarray_names[id(obj.container.storage[0])] = name
         if id(obj) in self.ndarray_names:
-            PersistentCudaNdarrayID.__call__(self, obj)
+            return PersistentCudaNdarrayID.__call__(self, obj)
+
+
+class PersistentBlobID(PersistentParameterID):
+    """Persist parameter arrays as blobs in a :class:`BlobStore`.
+
+    Instead of writing arrays to the zip file, they are added to the
+    store, and only their names and content hashes are recorded in
+    :attr:`blobs`. Other arguments are those of
+    :class:`PersistentParameterID`.
+
+    Parameters
+    ----------
+    store : :class:`BlobStore`
+        The store to add the arrays to.
+
+    """
+    def __init__(self, zip_file, store, **kwargs):
+        super(PersistentBlobID, self).__init__(zip_file, **kwargs)
+        self.store = store
+        self.blobs = {}
+
+    def __call__(self, obj):
+        if type(obj) is numpy.ndarray and id(obj) in self.ndarray_names:
+            if id(obj) not in self.seen:
+                name = self._resolve_name(obj)
+                self.blobs[name] = self.store.add(obj)
+                self.seen[id(obj)] = 'blob.{}'.format(name)
+            return self.seen[id(obj)]
+        return super(PersistentBlobID, self).__call__(obj)
+
+
+class PersistentShardID(PersistentParameterID):
+    """Persist parameter arrays to the shards of a :class:`Shards`.
+
+    The arrays are only collected while pickling, and are written when
+    :meth:`Shards.write` is called. Other arguments are those of
+    :class:`PersistentParameterID`.
+
+    Parameters
+    ----------
+    shards : :class:`Shards`
+        The shards to add the arrays to.
+
+    """
+    def __init__(self, zip_file, shards, **kwargs):
+        super(PersistentShardID, self).__init__(zip_file, **kwargs)
+        self.shards = shards
+
+    def __call__(self, obj):
+        if type(obj) is numpy.ndarray and id(obj) in self.ndarray_names:
+            if id(obj) not in self.seen:
+                name = self._resolve_name(obj)
+                self.shards.add(name, obj)
+                self.seen[id(obj)] = 'shard.{}'.format(name)
+            return self.seen[id(obj)]
+        return super(PersistentShardID, self).__call__(obj)
+
+
+class PersistentParameterLoad(PersistentNdarrayLoad):
+    """Load the parameter arrays persisted by :class:`PersistentParameterID`.
+
+    Unlike Theano's loader, this supports array names containing dots,
+    which are used for the parameters of bricks.
+
+    Parameters
+    ----------
+    zip_file : :class:`zipfile.ZipFile`
+        The zip file in which the arrays are saved.
+    arrays : dict, optional
+        Arrays that were already read from the zip file, see
+        :func:`read_arrays`.
+    blobs : dict, optional
+        A dictionary of (name, array) pairs of the arrays that were saved
+        to a :class:`BlobStore`, see :func:`read_blobs`.
+    shards : dict, optional
+        A dictionary of (name, array) pairs of the arrays that were saved
+        to :class:`Shards`, see :func:`read_shards`.
+
+    """
+    def __init__(self, zip_file, arrays=None, blobs=None, shards=None):
+        super(PersistentParameterLoad, self).__init__(zip_file)
+        self.arrays = arrays if arrays is not None else {}
+        self.blobs = blobs if blobs is not None else {}
+        self.shards = shards if shards is not None else {}
+
+    def __call__(self, persid):
+        array_type, name = persid.split('.', 1)
+        if array_type == 'blob':
+            return self.blobs[name]
+        if array_type == 'shard':
+            return self.shards[name]
+        if name not in self.cache:
+            if name in self.arrays:
+                array = self.arrays.pop(name)
+            else:
+                array = numpy.lib.format.read_array(self.zip_file.open(name))
+            if array_type == 'cuda_ndarray':
+                if theano.config.experimental.unpickle_gpu_on_cpu:
+                    warnings.warn("config.experimental.unpickle_gpu_on_cpu "
+                                  "is set to True. Unpickling CudaNdarray as "
+                                  "numpy.ndarray")
+                elif pkl_utils.cuda_ndarray:
+                    array = pkl_utils.cuda_ndarray.cuda_ndarray.CudaNdarray(
+                        array)
+                else:
+                    raise ImportError("Cuda not found. Cannot unpickle "
+                                      "CudaNdarray")
+            self.cache[name] = array
+        return self.cache[name]
+
+
+class PersistentBufferID(object):
+    """Persist the arrays of shared variables in a side channel.
+
+    The arrays which store the values of shared variables are collected
+    in :attr:`buffers` by this `persistent_id` hook, and only their
+    index, type and shape are pickled. This is not pickle protocol 5's
+    out-of-band buffers, which aren't available on Python 2, but a
+    substitute for them which works with any protocol.
+
+    Attributes
+    ----------
+    buffers : list of :class:`numpy.ndarray`
+        The data of the arrays, as flat arrays of bytes. These are views
+        of the arrays unless they weren't contiguous.
+
+    """
+    def __init__(self):
+        self.buffers = []
+        self.arrays = set()
+        self.seen = {}
+
+    def __call__(self, obj):
+        if isinstance(obj, SharedVariable):
+            self.arrays.add(id(obj.container.storage[0]))
+        elif (type(obj) is numpy.ndarray and id(obj) in self.arrays and
+                obj.size and not obj.dtype.hasobject):
+            if id(obj) not in self.seen:
+                self.seen[id(obj)] = ('buffer', len(self.buffers),
+                                      obj.dtype.str, obj.shape)
+                self.buffers.append(numpy.ascontiguousarray(obj).reshape(
+                    -1).view(numpy.uint8))
+            return self.seen[id(obj)]
+
+
+class PersistentBufferLoad(object):
+    """Load the arrays persisted by :class:`PersistentBufferID`.
+
+    Parameters
+    ----------
+    buffers : list
+        The buffers, which can be any objects that support the buffer
+        protocol. The arrays are created on top of them without copying,
+        so they are read-only if the buffers are.
+
+    """
+    def __init__(self, buffers):
+        self.buffers = buffers
+
+    def __call__(self, persid):
+        _, index, dtype, shape = persid
+        return numpy.frombuffer(self.buffers[index],
+                                dtype=dtype).reshape(shape)
+
+
+class AlignedZipFile(zipfile.ZipFile):
+    """A zip file in which uncompressed NPY files are aligned.
+
+    When the compression method is ``ZIP_STORED``, the data of NumPy
+    arrays is aligned to :const:`ALIGNMENT` bytes within the file by
+    padding the extra field of their local headers. This way, arrays can
+    be memory-mapped efficiently (see :func:`load_parameter_values`).
+    Other files are written as usual. The zip files can be read by any
+    zip reader.
+
+    """
+    def write(self, filename, arcname=None, compress_type=None):
+        with open(filename, 'rb') as f:
+            is_array = f.read(len(numpy.lib.format.MAGIC_PREFIX)) == \
+                numpy.lib.format.MAGIC_PREFIX
+            if (_compress_type(self, compress_type) == zipfile.ZIP_STORED and
+                    is_array and arcname is not None):
+                f.seek(0)
+                self.writestr(arcname, f.read())
+                return
+        super(AlignedZipFile, self).write(filename, arcname, compress_type)
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None):
+        if (isinstance(zinfo_or_arcname, zipfile.ZipInfo) or
+                _compress_type(self, compress_type) != zipfile.ZIP_STORED or
+                not data.startswith(numpy.lib.format.MAGIC_PREFIX)):
+            return super(AlignedZipFile, self).writestr(
+                zinfo_or_arcname, data, compress_type)
+        zinfo = zipfile.ZipInfo(filename=zinfo_or_arcname,
+                                date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.external_attr = 0o600 << 16
+        # The local header consists of 30 bytes, the file name, the extra
+        # field and, for large files, a ZIP64 record of 20 bytes
+        header_offset = _header_offset(self)
+        zip64 = len(data) * 1.05 > zipfile.ZIP64_LIMIT
+        array_offset = (header_offset + 30 + len(zinfo.filename.encode()) +
+                        (20 if zip64 else 0) + _npy_header_length(data))
+        # The padding is an extra field record of at least 4 bytes
+        padding = -(array_offset + 4) % ALIGNMENT
+        zinfo.extra = struct.pack('<HH', 0xD935, padding) + b'\0' * padding
+        super(AlignedZipFile, self).writestr(zinfo, data)
+
+
+def _compress_type(zip_file, compress_type):
+    """The compression method of a file written to a zip file."""
+    return zip_file.compression if compress_type is None else compress_type
+
+
+def _header_offset(zip_file):
+    """Return the position at which the next file will be written.
+
+    :class:`zipfile.ZipFile` has no public API for this. Python 3.5 and
+    later keep it in the `start_dir` attribute and seek to it before
+    writing, earlier versions write at the current position of the file.
+
+    """
+    start_dir = getattr(zip_file, 'start_dir', None)
+    return zip_file.fp.tell() if start_dir is None else start_dir
+
+
+def _npy_header_length(data):
+    """Return the length of the header of an NPY file."""
+    if data[6:7] == b'\x01':
+        return 10 + struct.unpack('<H', data[8:10])[0]
+    return 12 + struct.unpack('<I', data[8:12])[0]
+
+
+class ParallelZipFile(AlignedZipFile):
+    """A zip file which compresses files in parallel.
+
+    Files written with the ``ZIP_DEFLATED`` method are compressed by a
+    pool of threads, which is effective because zlib releases the GIL.
+    They are added to the zip file in the order in which they were
+    written, once they have been compressed. Other files are written as
+    by :class:`AlignedZipFile`.
+
+    Parameters
+    ----------
+    compression_level : int, optional
+        The zlib compression level, from 1 (fastest) to 9 (smallest).
+        Defaults to zlib's default level (6).
+    threads : int, optional
+        The number of threads to compress with. Defaults to the number of
+        CPUs.
+
+    Notes
+    -----
+    Other parameters are those of :class:`zipfile.ZipFile`. Only writing
+    is done in parallel, see :func:`read_arrays` for reading.
+
+    """
+    def __init__(self, file, mode='r', compression=zipfile.ZIP_STORED,
+                 allowZip64=True, compression_level=None, threads=None):
+        if compression_level is None:
+            compression_level = zlib.Z_DEFAULT_COMPRESSION
+        self.compression_level = compression_level
+        self.threads = threads or cpu_count()
+        self._pool = None
+        self._pending = []
+        super(ParallelZipFile, self).__init__(file, mode, compression,
+                                              allowZip64)
+
+    def write(self, filename, arcname=None, compress_type=None):
+        if (_compress_type(self, compress_type) != zipfile.ZIP_DEFLATED or
+                arcname is None):
+            self._write_pending()
+            return super(ParallelZipFile, self).write(filename, arcname,
+                                                      compress_type)
+        with open(filename, 'rb') as f:
+            self.writestr(arcname, f.read())
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None):
+        if (isinstance(zinfo_or_arcname, zipfile.ZipInfo) or
+                _compress_type(self, compress_type) != zipfile.ZIP_DEFLATED):
+            self._write_pending()
+            return super(ParallelZipFile, self).writestr(
+                zinfo_or_arcname, data, compress_type)
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        if self._pool is None:
+            self._pool = ThreadPool(self.threads)
+        self._pending.append((zinfo_or_arcname, self._pool.apply_async(
+            _deflate, (data, self.compression_level))))
+        # Limit the amount of data kept in memory
+        while len(self._pending) > 2 * self.threads:
+            self._write_next()
+
+    def _write_pending(self):
+        while self._pending:
+            self._write_next()
+
+    def _write_next(self):
+        """Add the next compressed file to the zip file."""
+        arcname, result = self._pending.pop(0)
+        file_size, crc, compressed = result.get()
+        zinfo = zipfile.ZipInfo(filename=arcname,
+                                date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(compressed)
+        zinfo.CRC = crc
+        # This is what ZipFile.writestr does on both Python 2 and 3, but
+        # without compressing
+        zinfo.header_offset = _header_offset(self)
+        self.fp.seek(zinfo.header_offset)
+        self.fp.write(zinfo.FileHeader(
+            file_size > zipfile.ZIP64_LIMIT or
+            len(compressed) > zipfile.ZIP64_LIMIT))
+        self.fp.write(compressed)
+        self.filelist.append(zinfo)
+        self.NameToInfo[zinfo.filename] = zinfo
+        if hasattr(self, 'start_dir'):
+            self.start_dir = self.fp.tell()
+        self._didModify = True
+
+    def close(self):
+        try:
+            if self.fp is not None:
+                self._write_pending()
+        finally:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+            super(ParallelZipFile, self).close()
+
+
+def _deflate(data, compression_level):
+    """Compress data as stored in zip files, with its size and CRC."""
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+    return (len(data), zlib.crc32(data) & 0xffffffff,
+            compressor.compress(data) + compressor.flush())
+
+
+def _inflate_array(info, data):
+    """Decompress and read an NPY file from a zip file."""
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -15)
+    if zlib.crc32(data) & 0xffffffff != info.CRC:
+        raise zipfile.BadZipfile("Bad CRC-32 for file {}".format(
+            info.filename))
+    return numpy.lib.format.read_array(io.BytesIO(data))
+
+
+def _data_offset(f, info):
+    """Return the position of the data of a file in a zip file."""
+    f.seek(info.header_offset + 26)
+    name_length, extra_length = struct.unpack('<HH', f.read(4))
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def read_arrays(zip_file, names=None, threads=None):
+    """Read NPY files from a zip file, decompressing them in parallel.
+
+    Parameters
+    ----------
+    zip_file : :class:`zipfile.ZipFile`
+        The zip file.
+    names : list of str, optional
+        The names of the files to read. By default all files but the
+        pickled object (`pkl`) are read.
+    threads : int, optional
+        The number of threads to decompress with. Defaults to the number
+        of CPUs.
+
+    Returns
+    -------
+    dict
+        A dictionary of (name, :class:`numpy.ndarray`) pairs.
+
+    """
+    if names is None:
+        names = [name for name in zip_file.namelist()
+                 if name not in ('pkl', BLOB_INDEX, SHARD_INDEX)]
+    infos = [zip_file.getinfo(name) for name in names]
+    if any(info.compress_type not in (zipfile.ZIP_STORED,
+                                      zipfile.ZIP_DEFLATED)
+           for info in infos):
+        return {name: numpy.lib.format.read_array(zip_file.open(name))
+                for name in names}
+    pool = ThreadPool(threads or cpu_count())
+    try:
+        results = []
+        for info in infos:
+            zip_file.fp.seek(_data_offset(zip_file.fp, info))
+            results.append(pool.apply_async(
+                _inflate_array, (info, zip_file.fp.read(info.compress_size))))
+        return {name: result.get() for name, result in zip(names, results)}
+    finally:
+        pool.terminate()
+
+
+class BlobStore(object):
+    """A directory of arrays, named by the hash of their contents.
+
+    Checkpoints which are saved with a store (see :func:`dump`) contain
+    only the names and hashes of their parameters, while the arrays
+    themselves are saved to the store as uncompressed NPY files. Arrays
+    that didn't change since an earlier checkpoint, such as frozen
+    embeddings, are not written again and take no extra space.
+
+    Parameters
+    ----------
+    directory : str
+        The directory in which the arrays are stored. It is created if it
+        doesn't exist.
+
+    Notes
+    -----
+    Blobs are never removed automatically, use :meth:`collect_garbage` to
+    remove the ones that are no longer referenced by checkpoints.
+    Checkpoints refer to the absolute path of the store, so they can only
+    be loaded while the store is kept in place.
+
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def path(self, digest):
+        """The path of the blob with a given hash."""
+        return os.path.join(self.directory, digest + '.npy')
+
+    @staticmethod
+    def hash(array):
+        """Compute the hash of the type, shape and contents of an array."""
+        digest = hashlib.sha1('{}{}'.format(array.dtype.str,
+                                            array.shape).encode())
+        digest.update(numpy.ascontiguousarray(array).ravel().view(numpy.uint8))
+        return digest.hexdigest()
+
+    def add(self, array):
+        """Add an array to the store, unless it is there already.
+
+        Returns
+        -------
+        str
+            The hash of the array.
+
+        """
+        digest = self.hash(array)
+        path = self.path(digest)
+        if not os.path.exists(path):
+            secure_dump(array, path, _save_array)
+        return digest
+
+    def load(self, digest, mmap_mode=None):
+        """Load a blob, see :func:`numpy.load`."""
+        return numpy.load(self.path(digest), mmap_mode=mmap_mode)
+
+    def collect_garbage(self, checkpoints):
+        """Remove the blobs which aren't referenced by any checkpoint.
+
+        Parameters
+        ----------
+        checkpoints : list of str
+            The paths of all the checkpoints to retain which use this
+            store. Checkpoints which don't exist are ignored.
+
+        Returns
+        -------
+        int
+            The number of blobs which were removed.
+
+        """
+        referenced = set()
+        for checkpoint in checkpoints:
+            if not os.path.exists(checkpoint):
+                continue
+            with closing(zipfile.ZipFile(checkpoint)) as zip_file:
+                index = _read_blob_index(zip_file)
+            if index is not None:
+                referenced.update(index['blobs'].values())
+        removed = 0
+        for filename in os.listdir(self.directory):
+            digest, extension = os.path.splitext(filename)
+            if extension == '.npy' and digest not in referenced:
+                os.remove(os.path.join(self.directory, filename))
+                removed += 1
+        return removed
+
+
+def _save_array(array, file_handler):
+    numpy.lib.format.write_array(file_handler, array)
+
+
+def _read_blob_index(zip_file):
+    """Return the blob index of a zip file, ``None`` if there is none."""
+    if BLOB_INDEX not in zip_file.namelist():
+        return None
+    return json.loads(zip_file.read(BLOB_INDEX).decode('utf-8'))
+
+
+def read_blobs(zip_file, mmap_mode=None):
+    """Load the arrays that a zip file saved to a :class:`BlobStore`.
+
+    Parameters
+    ----------
+    zip_file : :class:`zipfile.ZipFile`
+        The zip file written by :func:`dump`.
+    mmap_mode : str, optional
+        Memory-map the arrays with this mode, see :func:`numpy.load`.
+
+    Returns
+    -------
+    dict
+        A dictionary of (name, :class:`numpy.ndarray`) pairs, which is
+        empty if the file wasn't saved with a store.
+
+    """
+    index = _read_blob_index(zip_file)
+    if index is None:
+        return {}
+    store = BlobStore(index['directory'])
+    return {name: store.load(digest, mmap_mode)
+            for name, digest in index['blobs'].items()}
+
+
+class Shards(object):
+    """Saves arrays to several zip files, which are written in parallel.
+
+    When an object is saved with shards (see :func:`dump`), its parameter
+    arrays are divided over a number of shard files, and the file written
+    by :func:`dump` only contains the pickled object and the index of the
+    shards. The arrays are assigned to the shards so that these are of
+    about the same size, which makes writing and reading them in parallel
+    effective for large models. Each shard is a zip file of NPY files,
+    which can be read by :func:`numpy.load`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file written by :func:`dump`. The shards are
+        saved in the same directory, and are named after it.
+    count : int
+        The number of shards. Fewer shards are written if there are fewer
+        arrays.
+    compression : int, optional
+        The compression method of the shards, see :func:`dump`.
+    compression_level : int, optional
+        The zlib compression level, see :class:`ParallelZipFile`.
+    threads : int, optional
+        The number of shards written at the same time, defaults to the
+        number of CPUs.
+
+    Notes
+    -----
+    The names of the shards contain a random token, so that the shards of
+    a file which is overwritten aren't changed before the new index is in
+    place. The shards that are no longer used aren't removed
+    automatically, see :func:`shard_paths`.
+
+    """
+    def __init__(self, path, count, compression=zipfile.ZIP_DEFLATED,
+                 compression_level=None, threads=None):
+        self.path = path
+        self.count = count
+        self.compression = compression
+        self.compression_level = compression_level
+        self.threads = threads or cpu_count()
+        self.arrays = OrderedDict()
+
+    def add(self, name, array):
+        """Add an array to be written to the shards."""
+        self.arrays[name] = array
+
+    def assign(self):
+        """Assign the arrays to shards, largest first.
+
+        Returns
+        -------
+        list of lists
+            The names of the arrays in each shard, leaving out empty ones.
+
+        """
+        sizes = [0] * self.count
+        shards = [[] for _ in range(self.count)]
+        for name in sorted(self.arrays,
+                           key=lambda name: -self.arrays[name].nbytes):
+            shard = sizes.index(min(sizes))
+            sizes[shard] += self.arrays[name].nbytes
+            shards[shard].append(name)
+        return [names for names in shards if names]
+
+    def write(self):
+        """Write the arrays to the shards.
+
+        Returns
+        -------
+        dict
+            The index of the shards, containing the list of their file
+            names and a list of the names of the arrays, in the order in
+            which they were added, with the numbers of their shards.
+
+        """
+        directory, filename = os.path.split(os.path.abspath(self.path))
+        token = uuid4().hex[:8]
+        shards = self.assign()
+        filenames = ['{}.{}.shard{}'.format(filename, token, i)
+                     for i in range(len(shards))]
+        if shards:
+            pool = ThreadPool(min(self.threads, len(shards)))
+            try:
+                pool.map(self._write_shard, [
+                    (os.path.join(directory, filename), names)
+                    for filename, names in zip(filenames, shards)])
+            finally:
+                pool.terminate()
+        numbers = {name: i for i, names in enumerate(shards)
+                   for name in names}
+        return {'shards': filenames,
+                'names': [[name, numbers[name]] for name in self.arrays]}
+
+    def _write_shard(self, args):
+        path, names = args
+        with open(path, 'wb') as f:
+            with closing(ParallelZipFile(
+                    f, 'w', self.compression, allowZip64=True,
+                    compression_level=self.compression_level,
+                    threads=1)) as zip_file:
+                for name in names:
+                    data = io.BytesIO()
+                    numpy.lib.format.write_array(data, self.arrays[name])
+                    zip_file.writestr(name, data.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _read_shard_index(zip_file):
+    """Return the shard index of a zip file, ``None`` if there is none.
+
+    The file names of the shards are replaced by their absolute paths,
+    and the names of the arrays are turned into an ordered dictionary.
+
+    """
+    if SHARD_INDEX not in zip_file.namelist():
+        return None
+    if zip_file.filename is None:
+        raise ValueError("the shards of a zip file can only be found if "
+                         "its path is known")
+    index = json.loads(zip_file.read(SHARD_INDEX).decode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(zip_file.filename))
+    index['shards'] = [os.path.join(directory, filename)
+                       for filename in index['shards']]
+    index['names'] = OrderedDict(index['names'])
+    return index
+
+
+def shard_paths(path):
+    """Return the paths of the shards of a file written by :func:`dump`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Returns
+    -------
+    list of str
+        The paths of the shards, which is empty if the file wasn't saved
+        with shards.
+
+    """
+    with closing(zipfile.ZipFile(path)) as zip_file:
+        index = _read_shard_index(zip_file)
+    return index['shards'] if index is not None else []
+
+
+def read_shards(zip_file, threads=None):
+    """Read the arrays that a zip file saved to :class:`Shards`.
+
+    Parameters
+    ----------
+    zip_file : :class:`zipfile.ZipFile`
+        The zip file written by :func:`dump`, opened from a path.
+    threads : int, optional
+        The number of shards read at the same time, defaults to the
+        number of CPUs.
+
+    Returns
+    -------
+    dict
+        A dictionary of (name, :class:`numpy.ndarray`) pairs, which is
+        empty if the file wasn't saved with shards.
+
+    """
+    index = _read_shard_index(zip_file)
+    if not index or not index['shards']:
+        return {}
+    pool = ThreadPool(min(threads or cpu_count(), len(index['shards'])))
+    try:
+        shards = pool.map(_read_shard, index['shards'])
+    finally:
+        pool.terminate()
+    arrays = {}
+    for shard in shards:
+        arrays.update(shard)
+    return arrays
+
+
+def _read_shard(path):
+    with closing(zipfile.ZipFile(path)) as zip_file:
+        return read_arrays(zip_file, threads=1)
 
 
 class PicklerWithWarning(_Pickler):
@@ -94,7 +829,9 @@ class PicklerWithWarning(_Pickler):
 
 
 def dump(obj, file_handler, protocol=DEFAULT_PROTOCOL,
-         persistent_id=PersistentParameterID, use_cpickle=False):
+         persistent_id=PersistentParameterID, use_cpickle=False,
+         compression=zipfile.ZIP_DEFLATED, compression_level=None,
+         threads=None, store=None, shards=None):
     """Pickles an object to a zip file using external persistence.
 
     Parameters
@@ -116,6 +853,25 @@ def dump(obj, file_handler, protocol=DEFAULT_PROTOCOL,
         This enables the use of C-version of `pickle` (known as ``cPickle``
         in Python 2). Note that this disables warnings about trying to
         pickle objects in the ``__main__`` namespace.
+    compression : int, optional
+        The compression method of the zip file, ``ZIP_DEFLATED`` by
+        default. Use ``zipfile.ZIP_STORED`` to write the file without
+        compression, in which case arrays are aligned so that
+        :func:`load_parameter_values` can memory-map them (see
+        :class:`AlignedZipFile`). This makes saving and loading large
+        models a lot faster, at the cost of larger files.
+    compression_level : int, optional
+        The zlib compression level, see :class:`ParallelZipFile`.
+    threads : int, optional
+        The number of threads used to compress the arrays, defaults to
+        the number of CPUs.
+    store : str or :class:`BlobStore`, optional
+        If given, the parameter arrays are saved to this store instead of
+        the zip file, see :class:`BlobStore`.
+    shards : :class:`Shards`, optional
+        If given, the parameter arrays are saved to these shards instead
+        of the zip file. They are written in parallel once the object is
+        pickled, using the compression settings of the shards.
 
     Notes
     -----
@@ -144,20 +900,252 @@ def dump(obj, file_handler, protocol=DEFAULT_PROTOCOL,
     <blocks.bricks.sequences.MLP object at ...: name=mlp>
 
     """
-    with closing(zipfile.ZipFile(file_handler, 'w', zipfile.ZIP_DEFLATED,
-                                 allowZip64=True)) as zip_file:
+    with closing(ParallelZipFile(file_handler, 'w', compression,
+                                 allowZip64=True,
+                                 compression_level=compression_level,
+                                 threads=threads)) as zip_file:
+        if store is not None and shards is not None:
+            raise ValueError("can't save arrays both to a store and to "
+                             "shards")
+        if store is not None:
+            if not isinstance(store, BlobStore):
+                store = BlobStore(store)
+            persistent_id = PersistentBlobID(zip_file, store)
+        elif shards is not None:
+            persistent_id = PersistentShardID(zip_file, shards)
+        else:
+            persistent_id = persistent_id(zip_file)
+
         def func(f):
             if use_cpickle:
                 p = cPickle.Pickler(f, protocol=protocol)
             else:
                 p = PicklerWithWarning(f, protocol=protocol)
-            p.persistent_id = persistent_id(zip_file)
+            p.persistent_id = persistent_id
             p.dump(obj)
         pkl_utils.zipadd(func, zip_file, 'pkl')
+        if store is not None:
+            zip_file.writestr(BLOB_INDEX, json.dumps(
+                {'directory': store.directory,
+                 'blobs': persistent_id.blobs}).encode('utf-8'))
+        if shards is not None:
+            zip_file.writestr(SHARD_INDEX, json.dumps(
+                shards.write()).encode('utf-8'))
+
+
+def load(file_handler, threads=None):
+    """Loads an object saved by :func:`dump`.
+
+    Parameters
+    ----------
+    file_handler : file or str
+        The file to load the object from.
+    threads : int, optional
+        The number of threads used to decompress the arrays, defaults to
+        the number of CPUs.
+
+    Returns
+    -------
+    object
+        The unpickled object.
+
+    """
+    with closing(zipfile.ZipFile(file_handler, 'r')) as zip_file:
+        arrays = read_arrays(zip_file, threads=threads)
+        unpickler = cPickle.Unpickler(io.BytesIO(zip_file.open('pkl').read()))
+        unpickler.persistent_load = PersistentParameterLoad(
+            zip_file, arrays, read_blobs(zip_file),
+            read_shards(zip_file, threads))
+        previous = loading_directory()
+        _loading.directory = (
+            os.path.dirname(os.path.abspath(zip_file.filename))
+            if zip_file.filename else None)
+        try:
+            return unpickler.load()
+        finally:
+            _loading.directory = previous
+
+
+def loading_directory():
+    """Return the directory of the file :func:`load` is reading.
+
+    Objects which refer to files saved next to a checkpoint, such as the
+    sidecar file of its log, can resolve relative paths against this
+    directory while they are unpickled, so that the checkpoint can be
+    loaded from anywhere, and moved together with these files.
+
+    Returns
+    -------
+    str or ``None``
+        The absolute path of the directory, or ``None`` if no file is
+        being loaded or its path is unknown.
+
+    """
+    return getattr(_loading, 'directory', None)
+
+
+def stage(obj, **kwargs):
+    r"""Pickles an object to an uncompressed zip file in memory.
+
+    Staging an object takes a snapshot of it, including the values of its
+    shared variables, without spending time on compression. The staged
+    object can then be written to disk by :func:`dump_staged` e.g. in a
+    background thread, while the object itself continues to change.
+
+    Parameters
+    ----------
+    obj : object
+        The object to pickle.
+    \*\*kwargs
+        Keyword arguments to be passed to :func:`dump`.
+
+    Returns
+    -------
+    :class:`io.BytesIO`
+        The zip file.
+
+    """
+    staged = io.BytesIO()
+    dump(obj, staged, compression=zipfile.ZIP_STORED, **kwargs)
+    return staged
+
+
+def dump_staged(staged, file_handler, compression=zipfile.ZIP_DEFLATED,
+                compression_level=None, threads=None):
+    """Writes an object staged by :func:`stage` to a zip file.
+
+    Parameters
+    ----------
+    staged : :class:`io.BytesIO`
+        The zip file returned by :func:`stage`.
+    file_handler : file
+        The file handle to save the object to. The file can be read by
+        :func:`load` like one written by :func:`dump`.
+    compression : int, optional
+        The compression method, see :func:`dump`.
+    compression_level : int, optional
+        The zlib compression level, see :class:`ParallelZipFile`.
+    threads : int, optional
+        The number of threads used to compress the arrays, defaults to
+        the number of CPUs.
+
+    """
+    staged.seek(0)
+    with closing(zipfile.ZipFile(staged)) as source, \
+            closing(ParallelZipFile(file_handler, 'w', compression,
+                                    allowZip64=True,
+                                    compression_level=compression_level,
+                                    threads=threads)) as zip_file:
+        for name in source.namelist():
+            zip_file.writestr(name, source.read(name))
+
+
+def dumps_with_buffers(obj, protocol=DEFAULT_PROTOCOL, use_cpickle=False):
+    """Pickles an object, leaving the arrays of shared variables out.
+
+    Use this to send bricks or models to other processes without copying
+    their parameters into the pickle, see :class:`PersistentBufferID`.
+
+    Parameters
+    ----------
+    obj : object
+        The object to pickle.
+    protocol : int, optional
+        The pickling protocol to use.
+    use_cpickle : bool
+        See :func:`dump`.
+
+    Returns
+    -------
+    data : bytes
+        The pickled object.
+    buffers : list of :class:`numpy.ndarray`
+        The data of the arrays, which needs to be passed to
+        :func:`loads_with_buffers` along with `data`.
+
+    """
+    f = io.BytesIO()
+    if use_cpickle:
+        pickler = cPickle.Pickler(f, protocol=protocol)
+    else:
+        pickler = PicklerWithWarning(f, protocol=protocol)
+    pickler.persistent_id = persistent_id = PersistentBufferID()
+    pickler.dump(obj)
+    return f.getvalue(), persistent_id.buffers
+
+
+def loads_with_buffers(data, buffers):
+    """Loads an object pickled by :func:`dumps_with_buffers`.
+
+    Parameters
+    ----------
+    data : bytes
+        The pickled object.
+    buffers : list
+        The buffers, see :class:`PersistentBufferLoad`.
+
+    Returns
+    -------
+    object
+        The unpickled object.
+
+    """
+    unpickler = cPickle.Unpickler(io.BytesIO(data))
+    unpickler.persistent_load = PersistentBufferLoad(buffers)
+    return unpickler.load()
+
+
+def send_object(connection, obj, **kwargs):
+    r"""Send an object through a connection, e.g. to another process.
+
+    The pickled object and the buffers of its arrays (see
+    :func:`dumps_with_buffers`) are sent as separate messages, so that
+    the arrays aren't pickled. Note that sending each buffer through the
+    connection still copies it.
+
+    Parameters
+    ----------
+    connection : :class:`multiprocessing.connection.Connection`
+        The connection, e.g. one end of a :func:`multiprocessing.Pipe`.
+    obj : object
+        The object to send.
+    \*\*kwargs
+        Keyword arguments to be passed to :func:`dumps_with_buffers`.
+
+    """
+    data, buffers = dumps_with_buffers(obj, **kwargs)
+    connection.send_bytes(cPickle.dumps(
+        (data, [len(buffer) for buffer in buffers]),
+        protocol=DEFAULT_PROTOCOL))
+    for buffer in buffers:
+        connection.send_bytes(buffer)
+
+
+def receive_object(connection):
+    """Receive an object sent by :func:`send_object`.
+
+    The arrays are received directly into writable buffers, on top of
+    which they are created.
+
+    Parameters
+    ----------
+    connection : :class:`multiprocessing.connection.Connection`
+        The connection.
 
+    Returns
+    -------
+    object
+        The object which was sent.
 
-# A thin wrapper around Theano load.
-load = pkl_utils.load
+    """
+    data, sizes = cPickle.loads(connection.recv_bytes())
+    buffers = []
+    for size in sizes:
+        buffer = bytearray(size)
+        if connection.recv_bytes_into(buffer) != size:
+            raise ValueError("received a buffer of the wrong size")
+        buffers.append(buffer)
+    return loads_with_buffers(data, buffers)
 
 
 def secure_dump(object_, path, dump_function=dump, **kwargs):
@@ -181,6 +1169,9 @@ def secure_dump(object_, path, dump_function=dump, **kwargs):
         with tempfile.NamedTemporaryFile(delete=False,
                                          dir=config.temp_dir) as temp:
             dump_function(object_, temp, **kwargs)
+            # Make sure the file is on disk before it replaces the old one
+            temp.flush()
+            os.fsync(temp.fileno())
         shutil.move(temp.name, path)
     except:
         if "temp" in locals():
@@ -188,13 +1179,212 @@ def secure_dump(object_, path, dump_function=dump, **kwargs):
         raise
 
 
-def continue_training(path):
+class MainLoopState(object):
+    """The state of a main loop, without its computation graphs.
+
+    Only the values of the model parameters and of the other shared
+    variables updated by the training algorithm (e.g. the buffers of step
+    rules), the log (which includes the status) and the iteration state
+    are kept. Pickling this is a lot faster than pickling the main loop
+    with its bricks, graphs and compiled functions, and unpickling it
+    doesn't require a high recursion limit. Training is resumed by
+    building a new main loop in the same way as the original one, and
+    calling :meth:`restore`.
+
+    Parameters
+    ----------
+    main_loop : :class:`.MainLoop`
+        The main loop to take the state of.
+
+    Attributes
+    ----------
+    parameters : :class:`~collections.OrderedDict`
+        The values of the model parameters by their hierarchical names,
+        see :meth:`.Model.get_parameter_dict`.
+    buffers : list
+        The values of the other shared variables of the training
+        algorithm, see :func:`algorithm_variables`.
+    log : :class:`.TrainingLog`
+        The log of the main loop.
+    iteration_state : tuple
+        The data stream and epoch iterator, ``None`` if there is no epoch
+        iterator yet.
+
+    Notes
+    -----
+    The values are kept as new shared variables named after the
+    originals, so that they are saved to separate files by :func:`dump`
+    like the parameters of a pickled main loop are, and
+    :func:`load_parameter_values` works for both.
+
+    The state of the extensions is not kept, except for what they store
+    in the log.
+
+    """
+    def __init__(self, main_loop):
+        parameters = _model_parameters(main_loop)
+        self.parameters = OrderedDict(
+            (name, _copy_shared(
+                parameter,
+                name[1:].replace('/', BRICK_DELIMITER)
+                if name.startswith('/') else name))
+            for name, parameter in parameters.items())
+        self.buffers = [
+            _copy_shared(variable, 'algorithm{}{}.{}'.format(
+                BRICK_DELIMITER, i, variable.name))
+            for i, variable in enumerate(algorithm_variables(
+                main_loop.algorithm, parameters.values()))]
+        self.log = main_loop.log
+        self.iteration_state = (main_loop.iteration_state
+                                if hasattr(main_loop, 'epoch_iterator')
+                                else None)
+
+    def restore(self, main_loop):
+        """Restore the state to a newly built main loop.
+
+        If training had already started, the extensions are attached to
+        the main loop and the training algorithm is initialized, since
+        running the main loop won't do that any more.
+
+        Parameters
+        ----------
+        main_loop : :class:`.MainLoop`
+            A main loop which was built like the one the state was taken
+            from.
+
+        Raises
+        ------
+        ValueError
+            If the parameters and the shared variables of the training
+            algorithm don't match those of the state.
+
+        """
+        parameters = _model_parameters(main_loop)
+        if set(parameters) != set(self.parameters):
+            raise ValueError("the parameters of the model don't match those "
+                             "of the state: {} and {}".format(
+                                 sorted(parameters), sorted(self.parameters)))
+        variables = algorithm_variables(main_loop.algorithm,
+                                        parameters.values())
+        if len(variables) != len(self.buffers):
+            raise ValueError("expected {} shared variables for the training "
+                             "algorithm, found {}".format(
+                                 len(self.buffers), len(variables)))
+        values = [(parameter, self.parameters[name])
+                  for name, parameter in parameters.items()]
+        values.extend(zip(variables, self.buffers))
+        for variable, saved in values:
+            value = saved.get_value(borrow=True)
+            shape = variable.get_value(borrow=True).shape
+            if shape != value.shape:
+                raise ValueError("shape mismatch for {}: expected {}, got "
+                                 "{}".format(saved.name, shape, value.shape))
+            variable.set_value(value)
+        main_loop.log = self.log
+        if self.iteration_state is not None:
+            main_loop.iteration_state = self.iteration_state
+        if main_loop.status['training_started']:
+            for extension in main_loop.extensions:
+                extension.main_loop = main_loop
+            main_loop.algorithm.initialize()
+
+
+def algorithm_variables(algorithm, exclude=()):
+    """Return the shared variables updated by a training algorithm.
+
+    These are the parameters of the algorithm, followed by the shared
+    variables which are updated by it, e.g. the buffers of step rules.
+    The order only depends on the way the algorithm was built, so it is
+    the same before and after it is initialized.
+
+    Parameters
+    ----------
+    algorithm : :class:`.TrainingAlgorithm`
+        The training algorithm.
+    exclude : iterable, optional
+        Shared variables to leave out, e.g. the parameters of the model.
+
+    Returns
+    -------
+    list of :class:`~tensor.TensorSharedVariable`
+
+    """
+    seen = set(exclude)
+    variables = []
+    updates = chain(getattr(algorithm, 'updates', []),
+                    getattr(algorithm, 'step_rule_updates', []))
+    for variable in chain(getattr(algorithm, 'parameters', []),
+                          (variable for variable, _ in updates)):
+        if isinstance(variable, SharedVariable) and variable not in seen:
+            seen.add(variable)
+            variables.append(variable)
+    return variables
+
+
+def _model_parameters(main_loop):
+    try:
+        model = main_loop.model
+    except AttributeError:
+        return OrderedDict()
+    return model.get_parameter_dict()
+
+
+def _copy_shared(variable, name):
+    return theano.shared(variable.get_value(borrow=True), name=name,
+                         borrow=True)
+
+
+def dump_state(main_loop, file_handler, **kwargs):
+    r"""Saves the state of a main loop, see :class:`MainLoopState`.
+
+    Parameters
+    ----------
+    main_loop : :class:`.MainLoop`
+        The main loop to save the state of.
+    file_handler : file
+        The file handle to save the state to.
+    \*\*kwargs
+        Keyword arguments to be passed to :func:`dump`.
+
+    """
+    dump(MainLoopState(main_loop), file_handler, **kwargs)
+
+
+def import_factory(factory):
+    """Import a function given as ``'module:function'``.
+
+    Parameters
+    ----------
+    factory : str or callable
+        The module and name of the function, separated by a colon. The
+        name may contain dots to refer to attributes. Callables are
+        returned as they are.
+
+    """
+    if callable(factory):
+        return factory
+    module_name, _, name = factory.partition(':')
+    if not module_name or not name:
+        raise ValueError("expected a factory of the form 'module:function', "
+                         "got {}".format(factory))
+    factory = import_module(module_name)
+    for attribute in name.split('.'):
+        factory = getattr(factory, attribute)
+    return factory
+
+
+def continue_training(path, factory=None):
     """Continues training using checkpoint.
 
     Parameters
     ----------
     path : str
         Path to checkpoint.
+    factory : str or callable, optional
+        A function without arguments which returns a new main loop, or
+        its name as ``'module:function'``. Required for checkpoints which
+        contain only the state of the main loop (see
+        :class:`MainLoopState`), which is restored to the new main loop.
 
     Notes
     -----
@@ -215,29 +1405,207 @@ def continue_training(path):
     section.
 
     """
-    with change_recursion_limit(config.recursion_limit):
+    if factory is not None:
+        main_loop = import_factory(factory)()
         with open(path, "rb") as f:
-            main_loop = load(f)
+            state = load(f)
+        if not isinstance(state, MainLoopState):
+            raise ValueError("{} doesn't contain the state of a main loop, "
+                             "don't pass a factory to resume it".format(path))
+        state.restore(main_loop)
+    else:
+        with change_recursion_limit(config.recursion_limit):
+            with open(path, "rb") as f:
+                main_loop = load(f)
+        if isinstance(main_loop, MainLoopState):
+            raise ValueError("{} only contains the state of a main loop, "
+                             "pass a factory to resume it".format(path))
     main_loop.run()
 
 
-def load_parameter_values(path):
-    """Load parameter values saved by :func:`dump`.
+class ParameterValues(Mapping):
+    """The parameter values saved by :func:`dump`, loaded on demand.
 
-    This is a thin wrapper over :func:`numpy.load`. It changes the names of
-    the arrays to ones compatible with :meth:`.Model.set_param_values`.
+    Arrays are only read (and decompressed) when they are accessed, so
+    loading a few parameters from a large checkpoint is cheap and only
+    one array needs to be in memory at a time. The names of the arrays
+    are changed to ones compatible with :meth:`.Model.set_param_values`.
+    Arrays saved to a :class:`BlobStore` or to :class:`Shards` are loaded
+    from there.
+
+    Parameters
+    ----------
+    path : str or file
+        The source for loading from, which needs to remain open while
+        the values are used.
+    mmap_mode : str, optional
+        If `path` is a file name, arrays that were saved without
+        compression, or to a :class:`BlobStore`, are memory-mapped with
+        this mode instead of being read into memory (see
+        :class:`numpy.memmap`). The default is ``'c'`` (copy-on-write),
+        which makes the arrays writable without changing the file. Pass
+        ``None`` to always read the arrays into memory.
+
+    Notes
+    -----
+    The file stays open until :meth:`close` is called, so use the
+    mapping as a context manager, e.g. ``with ParameterValues(path) as
+    values:``. The mapping is read-only, use :meth:`load` to get a
+    dictionary with all the values.
+
+    """
+    def __init__(self, path, mmap_mode='c'):
+        self.path = path
+        if not isinstance(path, six.string_types):
+            mmap_mode = None
+        self.mmap_mode = mmap_mode
+        self.zip_file = zipfile.ZipFile(path)
+        index = _read_blob_index(self.zip_file)
+        self.store = BlobStore(index['directory']) if index else None
+        self.blobs = index['blobs'] if index else {}
+        index = _read_shard_index(self.zip_file)
+        self.shard_paths = index['shards'] if index else []
+        self.shards = index['names'] if index else {}
+        self._shard_files = {}
+        self.names = OrderedDict()
+        for name in chain(self.blobs, self.shards,
+                          self.zip_file.namelist()):
+            if name in ('pkl', BLOB_INDEX, SHARD_INDEX):
+                continue
+            parameter_name = name
+            if name.endswith('.npy'):
+                parameter_name = name[:-len('.npy')]
+            self.names['/' + parameter_name.replace(BRICK_DELIMITER, '/')] = \
+                name
+
+    def __getitem__(self, key):
+        name = self.names[key]
+        if name in self.blobs:
+            return self.store.load(self.blobs[name], self.mmap_mode)
+        path, zip_file = self.path, self.zip_file
+        if name in self.shards:
+            path = self.shard_paths[self.shards[name]]
+            zip_file = self._shard_file(path)
+        info = zip_file.getinfo(name)
+        if self.mmap_mode is not None:
+            with open(path, 'rb') as f:
+                array = _map_array(f, info, self.mmap_mode)
+            if array is not None:
+                return array
+        return numpy.lib.format.read_array(zip_file.open(name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _shard_file(self, path):
+        if path not in self._shard_files:
+            self._shard_files[path] = zipfile.ZipFile(path)
+        return self._shard_files[path]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        """Close the file, and the shards that were opened."""
+        self.zip_file.close()
+        for zip_file in self._shard_files.values():
+            zip_file.close()
+        self._shard_files = {}
+
+    def load(self, threads=None):
+        """Load all values, decompressing them in parallel.
+
+        Parameters
+        ----------
+        threads : int, optional
+            The number of threads used to decompress the arrays, and to
+            read shards, defaults to the number of CPUs.
+
+        Returns
+        -------
+        dict
+            A dictionary of (parameter name, numpy array) pairs.
+
+        """
+        compressed = {
+            key: name for key, name in self.names.items()
+            if name not in self.blobs and name not in self.shards and
+            self.zip_file.getinfo(name).compress_type != zipfile.ZIP_STORED}
+        sharded = {key: name for key, name in self.names.items()
+                   if name in self.shards}
+        values = {key: self[key] for key in self.names
+                  if key not in compressed and key not in sharded}
+        if sharded:
+            arrays = read_shards(self.zip_file, threads)
+            values.update((key, arrays[name])
+                          for key, name in sharded.items())
+        arrays = read_arrays(self.zip_file, list(compressed.values()),
+                             threads)
+        values.update((key, arrays[name]) for key, name in compressed.items())
+        return values
+
+
+def load_parameter_values(path, mmap_mode='c', lazy=False, threads=None):
+    """Load parameter values saved by :func:`dump`.
 
     Parameters
     ----------
     path : str or file
         The source for loading from.
+    mmap_mode : str, optional
+        See :class:`ParameterValues`.
+    lazy : bool, optional
+        If ``True``, return a :class:`ParameterValues` mapping which loads
+        the arrays when they are accessed, and which needs to be closed
+        when done, e.g. by using it as a context manager. By default all
+        arrays are loaded at once, in parallel.
+    threads : int, optional
+        The number of threads used to decompress the arrays if `lazy` is
+        ``False``, defaults to the number of CPUs.
+
+    Returns
+    -------
+    dict or :class:`ParameterValues`
+        A dictionary of (parameter name, numpy array) pairs, or a
+        read-only mapping of them if `lazy` is ``True``.
+
+    """
+    values = ParameterValues(path, mmap_mode)
+    if lazy:
+        return values
+    with closing(values):
+        return values.load(threads)
+
+
+def _map_array(f, info, mode):
+    """Memory-map an uncompressed NPY file in a zip file.
 
     Returns
     -------
-    A dictionary of (parameter name, numpy array) pairs.
+    :class:`numpy.memmap`
+        The array, or ``None`` if it is compressed, empty or contains
+        Python objects.
 
     """
-    with closing(numpy.load(path)) as source:
-        param_values = {'/' + name.replace(BRICK_DELIMITER, '/'): value
-                        for name, value in source.items() if name != 'pkl'}
-    return param_values
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    f.seek(_data_offset(f, info))
+    try:
+        version = numpy.lib.format.read_magic(f)
+    except ValueError:
+        return None
+    if version == (1, 0):
+        header = numpy.lib.format.read_array_header_1_0(f)
+    else:
+        header = numpy.lib.format.read_array_header_2_0(f)
+    shape, fortran_order, dtype = header
+    if dtype.hasobject or not numpy.prod(shape, dtype='int64'):
+        return None
+    return numpy.memmap(f.name, dtype=dtype, mode=mode, offset=f.tell(),
+                        shape=shape, order='F' if fortran_order else 'C')
@@ -1,6 +1,7 @@
 from __future__ import print_function
 import sys
 import contextlib
+import threading
 from collections import OrderedDict, deque
 
 import numpy
@@ -100,6 +101,53 @@ def shared_floatx_zeros_matching(shared_variable, name=None, **kwargs):
                                **kwargs)
 
 
+# The parameter files used by `shared_floatx_zeros` and `shared_floatx_nans`
+_mapping = threading.local()
+
+
+@contextlib.contextmanager
+def mapped_parameters(parameter_files, mode='r'):
+    """Memory-map the shared variables created in this context from files.
+
+    Within this context, :func:`shared_floatx_zeros` and
+    :func:`shared_floatx_nans` don't allocate the shared variables whose
+    names are in `parameter_files`. Their values are memory-mapped from
+    the files instead, using :func:`memmap_floatx`, and the name of the
+    file is stored in their ``tag.filename``. Contexts can be nested, the
+    innermost one is used.
+
+    Parameters
+    ----------
+    parameter_files : dict
+        A mapping from the names of shared variables to ``.npy`` files.
+    mode : str, optional
+        The mode in which the files are mapped, see :func:`memmap_floatx`.
+
+    """
+    previous = getattr(_mapping, 'files', None)
+    _mapping.files = parameter_files, mode
+    try:
+        yield
+    finally:
+        _mapping.files = previous
+
+
+def _mapped_floatx(shape, kwargs):
+    """Map a shared variable from a file if it is in `mapped_parameters`.
+
+    Returns ``None`` if the variable needs to be allocated.
+
+    """
+    parameter_files, mode = getattr(_mapping, 'files', None) or ({}, None)
+    filename = parameter_files.get(kwargs.get('name'))
+    if filename is None:
+        return None
+    variable = shared_floatx(memmap_floatx(filename, shape, mode),
+                             **dict(kwargs, borrow=True))
+    variable.tag.filename = filename
+    return variable
+
+
 def shared_floatx_zeros(shape, **kwargs):
     r"""Creates a shared variable array filled with zeros.
 
@@ -116,6 +164,9 @@ def shared_floatx_zeros(shape, **kwargs):
         A Theano shared variable filled with zeros.
 
     """
+    variable = _mapped_floatx(shape, kwargs)
+    if variable is not None:
+        return variable
     return shared_floatx(numpy.zeros(shape), **kwargs)
 
 
@@ -135,6 +186,9 @@ def shared_floatx_nans(shape, **kwargs):
         A Theano shared variable filled with nans.
 
     """
+    variable = _mapped_floatx(shape, kwargs)
+    if variable is not None:
+        return variable
     return shared_floatx(numpy.nan * numpy.zeros(shape), **kwargs)
 
 
@@ -168,6 +222,47 @@ def shared_floatx(value, name=None, borrow=False, dtype=None, **kwargs):
                          name=name, borrow=borrow, **kwargs)
 
 
+def memmap_floatx(filename, shape=None, mode='r'):
+    """Memory-map an array of type floatX stored in a ``.npy`` file.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the ``.npy`` file, e.g. as written by
+        :func:`numpy.save`.
+    shape : tuple, optional
+        The shape the array is expected to have.
+    mode : str, optional
+        The mode in which the file is mapped, see :func:`numpy.load`.
+        With ``'r'`` (the default) the array is read-only, so that
+        processes mapping the same file share its pages in memory. With
+        ``'c'`` pages are copied when written to, leaving the file
+        untouched, and with ``'r+'`` changes are written to the file.
+
+    Returns
+    -------
+    :class:`~numpy.memmap`
+        The memory-mapped array. Pass it with ``borrow=True`` to
+        :func:`shared_floatx` or to the `set_value` method of a shared
+        variable to use it as its value without reading it into memory.
+
+    Raises
+    ------
+    ValueError
+        If the array in the file doesn't have the dtype floatX or the
+        expected shape. Casting or reshaping it would read it into memory.
+
+    """
+    value = numpy.load(filename, mmap_mode=mode)
+    if value.dtype != theano.config.floatX:
+        raise ValueError("{} has dtype {} instead of {}".format(
+            filename, value.dtype, theano.config.floatX))
+    if shape is not None and value.shape != tuple(shape):
+        raise ValueError("{} has shape {} instead of {}".format(
+            filename, value.shape, tuple(shape)))
+    return value
+
+
 def shared_like(variable, name=None, **kwargs):
     r"""Construct a shared variable to hold the value of a tensor variable.
 
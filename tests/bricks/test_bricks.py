@@ -1,3 +1,7 @@
+import os
+from collections import OrderedDict
+from tempfile import mkstemp
+
 import numpy
 import six
 import theano
@@ -7,10 +11,14 @@ from six.moves import cPickle
 
 from blocks.bricks import (Identity, Linear, Maxout, LinearMaxout, MLP, Tanh,
                            Sequence, Random, Logistic, Softplus, Softmax)
-from blocks.bricks.base import application, Brick, lazy, NoneAllocation
+from blocks.bricks.base import (application, ApplicationCall, Brick, lazy,
+                                NoneAllocation)
 from blocks.bricks.parallel import Parallel, Fork
+from blocks.config import config
 from blocks.filter import get_application_call, get_brick
 from blocks.initialization import Constant
+from blocks.roles import INPUT, OUTPUT
+from blocks import utils
 from blocks.utils import shared_floatx
 
 
@@ -205,6 +213,82 @@ def test_tagging():
     assert_raises(AttributeError, check_output_variable, u)
 
 
+def test_tagging_copies():
+    brick = TestBrick(0, name='brick')
+    x = tensor.vector('x')
+    u, v = brick.apply(x, y=1)
+    assert u.name == 'brick_apply_output_0'
+    assert u.tag.name == 'output_0'
+    assert u.tag.roles == (OUTPUT,)
+    x_copy, = u.owner.inputs
+    assert x_copy.name == 'brick_apply_x'
+    assert x_copy.tag.roles == (INPUT,)
+    assert x_copy.tag.annotations[0] is brick
+    assert get_application_call(x_copy) is get_application_call(u)
+    # Tags share their roles and annotations
+    assert x_copy.tag.annotations is u.tag.annotations
+    assert brick.apply(x, y=1)[0].tag.roles is u.tag.roles
+    assert x_copy.owner.inputs == [x]
+    assert x_copy.owner.op == tensor.tensor_copy
+    assert x_copy.type == x.type
+
+    # Test values are computed for the copies too
+    compute_test_value = theano.config.compute_test_value
+    theano.config.compute_test_value = 'raise'
+    try:
+        x.tag.test_value = numpy.ones(3, dtype=theano.config.floatX)
+        u, v = brick.apply(x)
+    finally:
+        theano.config.compute_test_value = compute_test_value
+    assert_allclose(u.tag.test_value, numpy.ones(3))
+
+
+def test_memoization():
+    mlp = MLP([Tanh(), Tanh()], [3, 4, 5])
+    x = tensor.matrix('x')
+    y = mlp.apply(x)
+    assert mlp.apply(x) is not y
+
+    mlp.apply.memoize = True
+    y = mlp.apply(x)
+    assert mlp.apply(x) is y
+    assert mlp.apply(x, as_list=True) == [y]
+    assert mlp.apply(tensor.matrix('x')) is not y
+    # The children aren't memoized
+    linear = mlp.linear_transformations[0]
+    assert linear.apply(x) is not linear.apply(x)
+
+    mlp.clear_application_cache()
+    assert mlp.apply(x) is not y
+    assert cPickle.loads(cPickle.dumps(mlp)).apply(x) is not y
+
+    # Other arguments are compared by value
+    brick = TestBrick(0)
+    brick.apply.memoize = True
+    u, v = brick.apply(x, 2)
+    assert brick.apply(x, 2)[0] is u
+    assert brick.apply(x, 2.)[0] is not u
+    assert brick.apply(x, y=2)[0] is not u
+    assert brick.apply(x, [2])[0] is not brick.apply(x, [2])[0]
+
+    # It can be enabled for all applications
+    memoize_applications = config.memoize_applications
+    config.memoize_applications = True
+    try:
+        assert linear.apply(x) is linear.apply(x)
+        mlp.apply.memoize = False
+        assert mlp.apply(x) is not mlp.apply(x)
+    finally:
+        config.memoize_applications = memoize_applications
+
+
+def test_application_signature():
+    assert TestBrick.apply.args_names == ['x', 'y']
+    assert TestBrick.apply.varargs_name is None
+    assert Sequence.apply.args_names == []
+    assert Sequence.apply.varargs_name == 'args'
+
+
 def test_apply_not_child():
     child = TestBrick()
     parent = ParentBrick(child)
@@ -298,6 +382,41 @@ def test_linear():
     assert_allclose(y.eval({x: x_val}), x_val.dot(2 * numpy.ones((16, 8))))
 
 
+def test_parameter_files():
+    handle, filename = mkstemp(suffix='.npy', dir=config.temp_dir)
+    os.close(handle)
+    try:
+        weights = numpy.arange(6).reshape(3, 2).astype(theano.config.floatX)
+        numpy.save(filename, weights)
+        mlp = MLP(activations=[None], dims=[3, 2], weights_init=Constant(2),
+                  biases_init=Constant(1))
+        linear = mlp.linear_transformations[0]
+        linear.mmap_mode = 'c'
+        linear.parameter_files = {'W': filename}
+        # The weights are never allocated in memory
+        values = []
+        shared_floatx = utils.shared_floatx
+
+        def recording_shared_floatx(value, *args, **kwargs):
+            values.append(value)
+            return shared_floatx(value, *args, **kwargs)
+        utils.shared_floatx = recording_shared_floatx
+        try:
+            mlp.initialize()
+        finally:
+            utils.shared_floatx = shared_floatx
+        assert [isinstance(value, numpy.memmap) for value in values] == [
+            True, False]
+        assert_allclose(linear.W.get_value(), weights)
+        assert_allclose(linear.b.get_value(), numpy.ones(2))
+
+        # Copy-on-write mappings can be changed without changing the file
+        linear.W.get_value(borrow=True, return_internal_type=True)[0] = 0
+        assert_allclose(numpy.load(filename), weights)
+    finally:
+        os.remove(filename)
+
+
 def test_linear_maxout():
     x = tensor.matrix()
 
@@ -459,6 +578,21 @@ def test_application_call():
     assert get_brick(auxiliary_variable) == brick
     assert get_application_call(Y).auxiliary_variables[0].name == 'test_val'
 
+    call = get_application_call(Y)
+    call.metadata['key'] = 'value'
+    call = cPickle.loads(cPickle.dumps(call))
+    assert call.metadata == {'key': 'value'}
+    assert call.auxiliary_variables[0].name == 'test_val'
+    assert call.updates == OrderedDict()
+
+    # Application calls pickled before they had slots
+    state = call.__getstate__()
+    state['metadata'] = state.pop('_metadata')
+    old_call = ApplicationCall.__new__(ApplicationCall)
+    old_call.__setstate__(state)
+    assert old_call.metadata == {'key': 'value'}
+    assert old_call.application is call.application
+
 
 def test_linear_nan_allocation():
     x = tensor.matrix()
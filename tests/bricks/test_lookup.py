@@ -1,10 +1,16 @@
+import os
+from tempfile import mkstemp
+
 import numpy
-from numpy.testing import assert_equal, assert_raises
+from numpy.testing import assert_allclose, assert_equal, assert_raises
 
 import theano
 from theano import tensor
 
-from blocks.bricks.lookup import LookupTable
+from blocks.bricks.lookup import HashedLookupTable, LookupTable
+from blocks.bricks.sequence_generators import LookupFeedback
+from blocks.config import config
+from blocks.initialization import Constant, IsotropicGaussian
 
 
 def test_lookup_table():
@@ -26,3 +32,66 @@ def test_lookup_table():
     assert_equal(lt.get_dim(lt.apply.inputs[0]), 0)
     assert_equal(lt.get_dim(lt.apply.outputs[0]), lt.dim)
     assert_raises(ValueError, lt.get_dim, 'random_name')
+
+
+def test_lookup_table_memmap():
+    handle, filename = mkstemp(suffix='.npy', dir=config.temp_dir)
+    os.close(handle)
+    try:
+        values = numpy.arange(15).reshape(5, 3).astype(theano.config.floatX)
+        numpy.save(filename, values)
+        lt = LookupTable(5, 3, weights_init=Constant(0),
+                         parameter_files={'W': filename})
+        lt.initialize()
+        W = lt.W.get_value(borrow=True, return_internal_type=True)
+        assert isinstance(W.base, numpy.memmap)
+        assert not W.flags.writeable
+        x = tensor.lmatrix('x')
+        assert_equal(lt.apply(x).eval({x: [[1, 2], [0, 3]]}),
+                     values[numpy.array([[1, 2], [0, 3]])])
+
+        # Reallocating maps the file again
+        lt.allocate()
+        assert_equal(lt.W.get_value(), values)
+
+        lt = LookupTable(4, 3, parameter_files={'W': filename})
+        assert_raises(ValueError, lt.allocate)
+    finally:
+        os.remove(filename)
+
+
+def test_hashed_lookup_table():
+    lt = HashedLookupTable(1000, 3, 50, num_hashes=3,
+                           weights_init=IsotropicGaussian(), seed=1)
+    lt.initialize()
+    assert lt.W.get_value().shape == (50, 3)
+
+    x = tensor.lmatrix('x')
+    rows = lt.hash_indices(x.flatten()).eval({x: [[1, 999], [0, 3]]})
+    assert rows.shape == (4, 3)
+    assert rows.min() >= 0 and rows.max() < 50
+    W = lt.W.get_value()
+    assert_allclose(lt.apply(x).eval({x: [[1, 999], [0, 3]]}),
+                    W[rows].sum(axis=1).reshape((2, 2, 3)))
+
+    # Few indices share all their rows
+    rows = lt.hash_indices(tensor.arange(1000)).eval()
+    assert len(set(map(tuple, numpy.sort(rows, axis=1)))) > 950
+
+    # The hash functions don't depend on the seed of the brick
+    other = HashedLookupTable(1000, 3, 50, num_hashes=3, seed=2)
+    assert_equal(other.hash_indices(tensor.arange(1000)).eval(), rows)
+
+    assert_equal(lt.get_dim('indices'), 0)
+    assert_equal(lt.get_dim('output'), 3)
+    assert_raises(ValueError, HashedLookupTable(2 ** 32, 3, 50).allocate)
+
+
+def test_lookup_feedback_hashed():
+    feedback = LookupFeedback(1000, 4, lookup=HashedLookupTable(buckets=20),
+                              weights_init=Constant(1))
+    feedback.initialize()
+    assert feedback.lookup.W.get_value().shape == (20, 4)
+    outputs = tensor.lvector('outputs')
+    assert_allclose(feedback.lookup.apply(outputs).eval({outputs: [3, 999]}),
+                    2 * numpy.ones((2, 4)))
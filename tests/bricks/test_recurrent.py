@@ -1,6 +1,9 @@
 import itertools
+import os
 import unittest
 from collections import OrderedDict
+from tempfile import mkstemp
+
 import numpy
 import theano
 from numpy.testing import assert_allclose, assert_raises
@@ -9,6 +12,7 @@ from theano.gof.graph import is_same_graph
 
 from blocks.utils import is_shared_variable
 from blocks.bricks.base import application
+from blocks.config import config
 from blocks.bricks import Tanh
 from blocks.bricks.recurrent import (
     recurrent, BaseRecurrent, GatedRecurrent,
@@ -494,6 +498,22 @@ class TestGatedRecurrent(unittest.TestCase):
         assert is_shared_variable(initial_state)
         assert initial_state.name == 'initial_state'
 
+    def test_parameter_files(self):
+        handle, filename = mkstemp(suffix='.npy', dir=config.temp_dir)
+        os.close(handle)
+        try:
+            weights = numpy.arange(18).reshape(3, 6).astype(
+                theano.config.floatX)
+            numpy.save(filename, weights)
+            gated = GatedRecurrent(
+                dim=3, weights_init=IsotropicGaussian(), mmap_mode='r+',
+                parameter_files={'state_to_gates': filename})
+            gated.initialize()
+            assert_allclose(gated.state_to_gates.get_value(), weights)
+            assert_allclose(numpy.load(filename), weights)
+        finally:
+            os.remove(filename)
+
 
 class TestBidirectional(unittest.TestCase):
     def setUp(self):
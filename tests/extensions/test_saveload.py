@@ -1,16 +1,27 @@
+import json
+import os
+import shutil
+import zipfile
+from tempfile import mkdtemp
+
 import numpy
 import theano
 from fuel.datasets import IterableDataset
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_raises
 from theano import tensor
 
-from blocks.algorithms import GradientDescent
+from blocks.algorithms import GradientDescent, Momentum
 from blocks.bricks import MLP
-from blocks.extensions import FinishAfter
+from blocks.config import config
+from blocks.extensions import FinishAfter, TrainingExtension
+from blocks.extensions import saveload
 from blocks.extensions.saveload import Checkpoint, Load
 from blocks.initialization import Constant
+from blocks.log import RetentionPolicy
 from blocks.main_loop import MainLoop
 from blocks.model import Model
+from blocks.serialization import (BLOB_INDEX, MainLoopState, continue_training,
+                                  load, load_parameter_values, shard_paths)
 
 
 def test_checkpoint_save_separately_paths():
@@ -73,3 +84,380 @@ def test_load():
     )
     main_loop.extensions[0].main_loop = main_loop
     main_loop._run_extensions('before_training')
+
+
+def test_checkpoint_log_sidecar():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX))
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+    data_stream = IterableDataset(data).get_example_stream()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    cwd = os.getcwd()
+    try:
+        # The checkpoint is saved to a path relative to the working
+        # directory, and loaded from another one
+        os.chdir(directory)
+        checkpoint = Checkpoint('sidecar.tar', log_sidecar=True,
+                                every_n_batches=2)
+        main_loop = MainLoop(
+            data_stream=data_stream,
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=5), checkpoint])
+        main_loop.run()
+        os.chdir(cwd)
+        path = os.path.join(directory, 'sidecar.tar')
+        assert os.path.exists(path + '.log')
+
+        with open(path, 'rb') as f:
+            loaded_log = load(f).log
+        log = main_loop.log
+        assert loaded_log.h_uuid == log.h_uuid
+        assert loaded_log.status['iterations_done'] == 5
+        # The path is only logged after the checkpoint was written
+        assert 'saved_to' not in loaded_log[5]
+        for time in range(5):
+            assert loaded_log[time] == log[time]
+        assert main_loop.log is log
+
+        # The checkpoint can be moved together with its sidecar
+        moved = os.path.join(directory, 'moved')
+        os.mkdir(moved)
+        for filename in ['sidecar.tar', 'sidecar.tar.log']:
+            os.rename(os.path.join(directory, filename),
+                      os.path.join(moved, filename))
+        with open(os.path.join(moved, 'sidecar.tar'), 'rb') as f:
+            loaded_log = load(f).log
+        for time in range(5):
+            assert loaded_log[time] == log[time]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_log_sidecar_pruned():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX))
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+    data_stream = IterableDataset(data).get_example_stream()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'sidecar.tar')
+        checkpoint = Checkpoint(path, log_sidecar=True, every_n_batches=2)
+        main_loop = MainLoop(
+            data_stream=data_stream,
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=5), checkpoint])
+        main_loop.run()
+        log = main_loop.log
+        rows = {time: dict(log[time]) for time in range(5)}
+
+        # The pruned log goes to a new sidecar file, the last checkpoint
+        # can still be loaded if writing the new one fails
+        log.prune(RetentionPolicy(keep_last=1, every=2))
+        secure_dump = saveload.secure_dump
+
+        def failing_secure_dump(*args, **kwargs):
+            raise IOError
+        saveload.secure_dump = failing_secure_dump
+        try:
+            assert_raises(IOError, checkpoint.do, 'after_epoch')
+        finally:
+            saveload.secure_dump = secure_dump
+        with open(path, 'rb') as f:
+            loaded_log = load(f).log
+        for time in range(5):
+            assert loaded_log[time] == rows[time]
+
+        checkpoint.do('after_epoch')
+        assert sorted(os.listdir(directory)) == ['sidecar.tar',
+                                                 'sidecar.tar.4.log']
+        with open(path, 'rb') as f:
+            loaded_log = load(f).log
+        assert sorted(loaded_log) == sorted(log)
+        for time in range(4):
+            assert loaded_log[time] == log[time]
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_asynchronous():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX))
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+    data_stream = IterableDataset(data).get_example_stream()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'asynchronous.tar')
+        main_loop = MainLoop(
+            data_stream=data_stream,
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=5),
+                        Checkpoint(path, asynchronous=True,
+                                   every_n_batches=2,
+                                   save_separately=['log'])])
+        main_loop.run()
+        checkpoint = main_loop.extensions[-1]
+        assert checkpoint._writer is None
+        # The last checkpoint is made after training, so all of them are
+        # logged
+        saved_to = sum((row['saved_to'] for row in main_loop.log.values()
+                        if 'saved_to' in row), ())
+        assert saved_to == (path,) * 3
+        assert main_loop.log[5]['saved_to'][-1] == path
+        with open(path, 'rb') as f:
+            loaded_main_loop = load(f)
+        assert loaded_main_loop.log.status['iterations_done'] == 5
+        assert_allclose(loaded_main_loop.algorithm.parameters[0].get_value(),
+                        W.get_value())
+        assert os.path.exists(os.path.join(directory, 'asynchronous_log.tar'))
+
+        # Errors in the background are raised in the main loop
+        checkpoint = Checkpoint(
+            os.path.join(directory, 'nonexisting', 'checkpoint.tar'),
+            asynchronous=True)
+        checkpoint.main_loop = main_loop
+        checkpoint.do('after_epoch')
+        assert_raises(IOError, checkpoint.wait)
+        assert main_loop.log.current_row['saved_to'][-1] is None
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_uncompressed():
+    mlp = MLP(activations=[None], dims=[10, 10], weights_init=Constant(1.),
+              use_bias=False)
+    mlp.initialize()
+    W = mlp.linear_transformations[0].W
+    x = tensor.vector('data')
+    cost = mlp.apply(x).mean()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+    data_stream = IterableDataset(data).get_example_stream()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'uncompressed.tar')
+        main_loop = MainLoop(
+            model=Model(cost),
+            data_stream=data_stream,
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=5),
+                        Checkpoint(path, compress=False)])
+        main_loop.run()
+        assert isinstance(load_parameter_values(path)['/mlp/linear_0.W'],
+                          numpy.memmap)
+
+        old_value = W.get_value()
+        W.set_value(old_value * 2)
+        Load(path).load_to(main_loop)
+        assert_allclose(W.get_value(), old_value)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_store():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX),
+                      name='W')
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+    data_stream = IterableDataset(data).get_example_stream()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'store.tar')
+        store = os.path.join(directory, 'store')
+        main_loop = MainLoop(
+            data_stream=data_stream,
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=5),
+                        Checkpoint(path, store=store, asynchronous=True,
+                                   every_n_batches=2)])
+        main_loop.run()
+        # Three values of W, and the learning rate which is stored once
+        assert len(os.listdir(store)) == 4
+        with zipfile.ZipFile(path) as zip_file:
+            assert set(json.loads(zip_file.read(BLOB_INDEX).decode(
+                'utf-8'))['blobs']) == set(['W', 'learning_rate'])
+        assert_allclose(load_parameter_values(path)['/W'], W.get_value())
+        with open(path, 'rb') as f:
+            assert_allclose(load(f).algorithm.parameters[0].get_value(),
+                            W.get_value())
+    finally:
+        shutil.rmtree(directory)
+
+
+class NotifyBest(TrainingExtension):
+    def after_batch(self, batch):
+        if self.main_loop.status['iterations_done'] in (1, 3):
+            self.main_loop.log.current_row['cost_best_so_far'] = True
+
+
+def test_checkpoint_rotation():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX),
+                      name='W')
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+
+    for asynchronous in [False, True]:
+        directory = mkdtemp(dir=config.temp_dir)
+        try:
+            store = (os.path.join(directory, 'store') if asynchronous
+                     else None)
+            main_loop = MainLoop(
+                data_stream=IterableDataset(data).get_example_stream(),
+                algorithm=GradientDescent(cost=cost, parameters=[W]),
+                extensions=[FinishAfter(after_n_batches=6), NotifyBest(),
+                            Checkpoint(os.path.join(
+                                directory, 'rotation_{iterations_done}.tar'),
+                                every_n_batches=1, keep_last=2,
+                                keep_best=1,
+                                best_notification='cost_best_so_far',
+                                save_separately=['log'],
+                                asynchronous=asynchronous, store=store)])
+            main_loop.run()
+            assert sorted(filename for filename in os.listdir(directory)
+                          if filename.startswith('rotation_')) == [
+                'rotation_3_best.tar', 'rotation_3_best_log.tar',
+                'rotation_5.tar', 'rotation_5_log.tar',
+                'rotation_6.tar', 'rotation_6_log.tar']
+            with open(os.path.join(directory, 'rotation_3_best.tar'),
+                      'rb') as f:
+                assert load(f).status['iterations_done'] == 3
+            if store:
+                # W for each of the three checkpoints, and the learning
+                # rate
+                assert len(os.listdir(store)) == 4
+        finally:
+            shutil.rmtree(directory)
+
+
+def test_checkpoint_rotation_requires_best_notification():
+    assert_raises(ValueError, Checkpoint, 'rotation_{iterations_done}.tar',
+                  keep_best=1)
+
+
+def test_checkpoint_format_path():
+    x = tensor.vector('data')
+    W = theano.shared(numpy.ones((10,), dtype=theano.config.floatX))
+    cost = (W * x).sum()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        # Only paths whose fields are all in the status are formatted
+        paths = ['model_{iterations_done}.tar', 'model_{}.tar',
+                 'model_{iterations_done}_{foo}.tar', 'model_{.tar']
+        main_loop = MainLoop(
+            data_stream=IterableDataset(data).get_example_stream(),
+            algorithm=GradientDescent(cost=cost, parameters=[W]),
+            extensions=[FinishAfter(after_n_batches=2)] + [
+                Checkpoint(os.path.join(directory, path))
+                for path in paths])
+        main_loop.run()
+        assert sorted(os.listdir(directory)) == sorted(
+            ['model_2.tar'] + paths[1:])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_state_only():
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+
+    def build_main_loop(extensions):
+        mlp = MLP(activations=[None], dims=[10, 10],
+                  weights_init=Constant(0.1), use_bias=False)
+        mlp.initialize()
+        x = tensor.vector('data')
+        cost = mlp.apply(x).mean()
+        algorithm = GradientDescent(
+            cost=cost, parameters=[mlp.linear_transformations[0].W],
+            step_rule=Momentum(0.1, 0.9))
+        return MainLoop(
+            model=Model(cost), algorithm=algorithm,
+            data_stream=IterableDataset(data).get_example_stream(),
+            extensions=extensions)
+
+    def values(main_loop):
+        W, = main_loop.algorithm.parameters
+        velocity, = [variable for variable, _ in
+                     main_loop.algorithm.step_rule_updates]
+        return W.get_value(), velocity.get_value()
+
+    reference = build_main_loop([FinishAfter(after_n_batches=7)])
+    reference.run()
+
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'state_only.tar')
+        main_loop = build_main_loop([FinishAfter(after_n_batches=4),
+                                     Checkpoint(path, state_only=True)])
+        main_loop.run()
+        state = load(path)
+        assert isinstance(state, MainLoopState)
+        assert state.log.status['iterations_done'] == 4
+        assert (list(load_parameter_values(path)) ==
+                ['/mlp/linear_0.W', '/algorithm/0.velocity'])
+        assert_raises(ValueError, continue_training, path)
+
+        resumed = []
+
+        def factory():
+            resumed.append(build_main_loop([FinishAfter(after_n_batches=7)]))
+            return resumed[-1]
+        continue_training(path, factory)
+        assert resumed[0].status['iterations_done'] == 7
+        for value, resumed_value in zip(values(reference),
+                                        values(resumed[0])):
+            assert_allclose(value, resumed_value)
+
+        # Restoring the state to a main loop built differently fails
+        other = build_main_loop([])
+        other.algorithm = GradientDescent(
+            cost=other.algorithm.cost, parameters=other.algorithm.parameters)
+        assert_raises(ValueError, state.restore, other)
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_checkpoint_shards():
+    mlp = MLP(activations=[None, None], dims=[10, 10, 10],
+              weights_init=Constant(1.), biases_init=Constant(0.))
+    mlp.initialize()
+    x = tensor.vector('data')
+    cost = mlp.apply(x).mean()
+    data = numpy.random.rand(10, 10).astype(theano.config.floatX)
+
+    assert_raises(ValueError, Checkpoint, 'sharded.tar', shards=2,
+                  asynchronous=True)
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        path = os.path.join(directory, 'sharded.tar')
+        main_loop = MainLoop(
+            model=Model(cost),
+            data_stream=IterableDataset(data).get_example_stream(),
+            algorithm=GradientDescent(cost=cost, parameters=Model(
+                cost).parameters),
+            extensions=[FinishAfter(after_n_batches=5),
+                        Checkpoint(path, shards=2, every_n_batches=2)])
+        main_loop.run()
+        # The shards of the overwritten checkpoints were removed
+        shards = shard_paths(path)
+        assert len(shards) == 2
+        assert sorted(filename for filename in os.listdir(directory)
+                      if filename.startswith('sharded.tar.')) == \
+            sorted(os.path.basename(shard) for shard in shards)
+
+        W = mlp.linear_transformations[0].W
+        old_value = W.get_value()
+        W.set_value(old_value * 2)
+        Load(path).load_to(main_loop)
+        assert_allclose(W.get_value(), old_value)
+    finally:
+        shutil.rmtree(directory)
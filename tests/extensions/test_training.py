@@ -8,15 +8,17 @@ import theano
 from fuel.datasets import IterableDataset
 from six.moves import cPickle
 from theano import tensor
-from theano.misc.pkl_utils import load
 
 from blocks.algorithms import GradientDescent, Scale
 from blocks.config import config
 from blocks.extensions import FinishAfter, TrainingExtension
 from blocks.extensions.saveload import Checkpoint
-from blocks.extensions.training import SharedVariableModifier, TrackTheBest
+from blocks.extensions.training import (
+    SharedVariableModifier, TrackTheBest, PruneLog)
 from blocks.extensions.predicates import OnLogRecord
+from blocks.log import RetentionPolicy
 from blocks.main_loop import MainLoop
+from blocks.serialization import load
 from blocks.utils import shared_floatx
 from blocks.utils.testing import MockMainLoop, skip_if_configuration_set
 
@@ -121,6 +123,18 @@ def test_track_the_best():
     assert main_loop.log.current_row['cost_best_so_far']
 
 
+def test_prune_log():
+    main_loop = MockMainLoop()
+    extension = PruneLog(RetentionPolicy(keep_last=2, every=2))
+    extension.main_loop = main_loop
+
+    for i in range(10):
+        main_loop.log.current_row['cost'] = i
+        main_loop.status['iterations_done'] += 1
+    extension.dispatch('after_epoch')
+    assert sorted(main_loop.log) == [0, 2, 4, 6, 8, 9]
+
+
 class WriteCostExtension(TrainingExtension):
 
     def after_batch(self, batch):
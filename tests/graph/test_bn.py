@@ -5,6 +5,7 @@ from theano import tensor
 
 from blocks.bricks import (BatchNormalization, Sequence, Tanh, MLP,
                            BatchNormalizedMLP)
+from blocks.config import config
 from blocks.filter import get_brick
 from blocks.graph import (ComputationGraph, batch_normalization,
                           apply_batch_normalization,
@@ -50,6 +51,27 @@ def test_batch_normalization_nested():
     assert_allclose(y_, y_expected, rtol=1e-4)
 
 
+def test_batch_normalization_memoized():
+    x = tensor.matrix()
+    mlp = BatchNormalizedMLP([Tanh(), Tanh()], [4, 5, 6],
+                             weights_init=Constant(0.1))
+    mlp.initialize()
+    memoize_applications = config.memoize_applications
+    config.memoize_applications = True
+    try:
+        y = mlp.apply(x)
+        with batch_normalization(mlp):
+            y_bn = mlp.apply(x)
+            assert mlp.apply(x) is y_bn
+        assert y_bn is not y
+        assert mlp.apply(x) is y
+    finally:
+        config.memoize_applications = memoize_applications
+    x_ = numpy.random.RandomState(1).uniform(
+        size=(5, 4)).astype(theano.config.floatX)
+    assert not numpy.allclose(y.eval({x: x_}), y_bn.eval({x: x_}))
+
+
 def test_apply_batch_normalization_nested():
     x = tensor.matrix()
     eps = 1e-8
@@ -105,6 +105,31 @@ def test_replace_multiple_inputs():
     assert_allclose(cg.outputs[1].eval({x: 1.0}), 1.5)
 
 
+def test_replace_dependent():
+    # Replacements are applied to the substitutes of later variables
+    x = tensor.scalar('x')
+    variables = [x]
+    for i in range(50):
+        variables.append(variables[-1] + 1)
+    cg = ComputationGraph([variables[-1]])
+    replacements = [(var, 2 * var) for var in variables[::-1]]
+    new_cg = cg.replace(replacements)
+    assert_allclose(new_cg.outputs[0].eval({x: 0.}), 2 ** 51 - 2)
+    assert x in new_cg.inputs
+    # The original graph isn't changed
+    assert_allclose(cg.outputs[0].eval({x: 0.}), 50)
+
+
+def test_replace_depends_on_later():
+    # A substitute can depend on a variable which is replaced after it,
+    # that replacement isn't applied to the substitute
+    x = tensor.scalar('x')
+    y = x + 2
+    z = x * 5
+    cg = ComputationGraph([y + z])
+    new_cg = cg.replace([(y, z + 1), (z, x * 7)])
+    assert_allclose(new_cg.outputs[0].eval({x: 1.}), (5 + 1) + 7)
+
 def test_replace_variable_not_in_graph():
     # Test if warning appears when variable is not in graph
     with warnings.catch_warnings(record=True) as w:
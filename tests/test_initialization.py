@@ -4,8 +4,9 @@ import numpy
 import theano
 from numpy.testing import assert_equal, assert_allclose, assert_raises
 
+from blocks.bricks import Linear, MLP, Tanh
 from blocks.initialization import Constant, IsotropicGaussian, Sparse
-from blocks.initialization import Uniform, Orthogonal
+from blocks.initialization import Uniform, Orthogonal, parallel_initialization
 
 
 def test_constant():
@@ -124,3 +125,48 @@ def test_orthogonal():
     yield check_orthogonal, rng, (50, 50), .5
     yield check_orthogonal, rng, (50, 51), .5
     yield check_orthogonal, rng, (51, 50), .5
+
+
+def test_sparse_rows():
+    # Large enough to be processed in several blocks of rows
+    shape = (5, 2 ** 19)
+    for num_init in [3, 1000]:
+        sparse = Sparse(num_init=num_init, weights_init=Constant(1.))
+        weights = sparse.generate(numpy.random.RandomState(1), shape)
+        assert_equal(weights.sum(axis=1), num_init)
+        assert_equal(weights,
+                     sparse.generate(numpy.random.RandomState(1), shape))
+
+
+def test_orthogonal_reduced():
+    rng = numpy.random.RandomState(1)
+    W = Orthogonal(2.).generate(rng, (100, 20))
+    assert_allclose(numpy.dot(W.T, W), 4 * numpy.eye(20), atol=1e-4)
+    W = Orthogonal(2.).generate(rng, (20, 100))
+    assert_allclose(numpy.dot(W, W.T), 4 * numpy.eye(20), atol=1e-4)
+
+
+def test_parallel_initialization():
+    def initialize(threads):
+        mlp = MLP([Tanh(), Tanh()], [10, 20, 30],
+                  weights_init=Orthogonal(), biases_init=Uniform(width=1.),
+                  seed=1)
+        mlp.initialize(threads=threads)
+        return [parameter.get_value() for parameter in mlp.parameters]
+
+    serial = initialize(None)
+    single = initialize(1)
+    multiple = initialize(3)
+    for value, single_value, multiple_value in zip(serial, single, multiple):
+        assert not numpy.isnan(single_value).any()
+        assert not numpy.allclose(value, single_value)
+        assert_equal(single_value, multiple_value)
+
+    linear = Linear(10, 20, weights_init=Constant(1.),
+                    biases_init=Constant(2.))
+    linear.allocate()
+    with parallel_initialization():
+        linear.initialize()
+        assert numpy.isnan(linear.W.get_value()).all()
+    assert_equal(linear.W.get_value(), 1.)
+    assert_equal(linear.b.get_value(), 2.)
@@ -1,8 +1,17 @@
+import os
+import shutil
+import sqlite3
 from operator import getitem
+from tempfile import mkdtemp, mkstemp
 
+import numpy
 from numpy.testing import assert_raises
+from six.moves import cPickle
 
-from blocks.log import TrainingLog
+from blocks.config import config
+from blocks.log import ColumnarLog, RetentionPolicy, SQLiteLog, TrainingLog
+from blocks.log.sqlite import SQLiteStatus
+from blocks.log.log import append_to_sidecar, SidecarReference
 from blocks.serialization import load, dump
 
 
@@ -33,3 +42,299 @@ def test_pickle_log():
     log2.resume()
     dump(log2, "log3.pkl")
     load("log3.pkl")  # loading a resumed log does not work
+
+
+def test_buffered_sqlite_log():
+    handle, database = mkstemp(dir=config.temp_dir)
+    os.close(handle)
+    try:
+        log = SQLiteLog(database, buffered=True, flush_iterations=2,
+                        flush_seconds=float('inf'))
+        reader = sqlite3.connect(database)
+
+        def entries_written():
+            return reader.execute(
+                "SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        assert log.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        log[0]['field'] = 1
+        log[1]['field'] = 2
+        assert log[1]['field'] == 2
+        assert len(log) == 2
+        del log[1]['field']
+        assert list(log[1]) == []
+        assert len(log) == 1
+        assert list(log) == [0]
+        log[1]['field'] = 2
+        assert entries_written() == 0
+        log[2]['field'] = 3
+        assert entries_written() == 3
+        log[3]['field'] = 4
+        assert entries_written() == 3
+        log.flush()
+        assert entries_written() == 4
+        del log[3]['field']
+        assert len(log) == 3
+        assert list(log) == [0, 1, 2]
+        reader.close()
+        log.conn.close()
+    finally:
+        os.remove(database)
+
+
+def test_sqlite_status_cache():
+    log = SQLiteLog(':memory:', buffered=False)
+    log.status['field'] = 1
+    assert log.status['field'] == 1
+    log.conn.execute("UPDATE status SET value = 2 WHERE key = 'field'")
+    assert log.status['field'] == 1
+    log.status.invalidate()
+    assert log.status['field'] == 2
+
+    del log.status['field']
+    assert 'field' not in log.status
+    log.status['iterations_done'] += 1
+    old_uuid = log.h_uuid
+    log.resume()
+    assert log.status['iterations_done'] == 1
+    assert log.status['resumed_from'] == old_uuid
+    assert len(log.status) == len(list(log.status))
+
+
+def test_sqlite_log_old_pickle():
+    handle, database = mkstemp(dir=config.temp_dir)
+    os.close(handle)
+    log_getstate = SQLiteLog.__getstate__
+    status_getstate = SQLiteStatus.__getstate__
+    try:
+        log = SQLiteLog(database, buffered=False)
+        log[0]['field'] = 1
+        log.status['iterations_done'] = 1
+
+        # Pickle the log as it was before it was buffered and its status
+        # was cached
+        def old_log_getstate(self):
+            state = {key: value for key, value in self.__dict__.items()
+                     if key in ('database', 'status', 'uuid')}
+            self.resume()
+            return state
+        SQLiteLog.__getstate__ = old_log_getstate
+        SQLiteStatus.__getstate__ = lambda self: {'log': self.log}
+        pickled = cPickle.dumps(log)
+        SQLiteLog.__getstate__ = log_getstate
+        SQLiteStatus.__getstate__ = status_getstate
+
+        log = cPickle.loads(pickled)
+        assert log.status['iterations_done'] == 1
+        assert log[0]['field'] == 1
+        log[1]['field'] = 2
+        assert log.status['iterations_done'] == 1
+        assert [log[time]['field'] for time in log] == [1, 2]
+    finally:
+        SQLiteLog.__getstate__ = log_getstate
+        SQLiteStatus.__getstate__ = status_getstate
+        os.remove(database)
+
+
+def test_sqlite_log_ancestors():
+    log = SQLiteLog(':memory:')
+    log[0]['field'] = 1
+    log[1]['field'] = 1
+    first_uuid = log.h_uuid
+    log.resume()
+    log[1]['field'] = 2
+    second_uuid = log.h_uuid
+    log.resume()
+    log[2]['field'] = 3
+    assert log.ancestors == [log.h_uuid, second_uuid, first_uuid]
+    assert [log[time]['field'] for time in log] == [1, 2, 3]
+    assert len(log) == 3
+    assert len(log[1]) == 1
+
+
+def test_columnar_log():
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        log = ColumnarLog(directory)
+        for time in range(2000):
+            log[time]['cost'] = numpy.float32(time)
+            log[time]['batch'] = time
+        log[1999]['saved_to'] = ('model.zip',)
+        log[1999]['training_finish_requested'] = True
+        assert log[1999]['cost'] == 1999.
+        assert isinstance(log[1999]['batch'], int)
+        assert set(log[1999]) == {'cost', 'batch', 'saved_to',
+                                  'training_finish_requested'}
+        assert log[2000] == {}
+        assert len(log) == 2000
+        times, values = log.series('cost')
+        assert (times == values).all()
+
+        # Out of order records, changed types and deletions
+        log[10]['cost'] = 'nan'
+        log[10]['extra'] = 1.
+        log[5]['extra'] = 1.
+        log[20]['batch'] = 20.5
+        assert log.series('batch')[1][20] == 20.5
+        del log[1999]['cost']
+        del log[5]['extra']
+        assert 'cost' not in log[1999]
+        assert set(log[5]) == {'batch', 'cost'}
+        assert log[10]['cost'] == 'nan'
+
+        # Pickled records are not overwritten
+        pickled_log = cPickle.loads(cPickle.dumps(log))
+        log[1998]['cost'] = 0.
+        log[2000]['cost'] = 2000.
+        pickled_log[2000]['cost'] = -1.
+        assert pickled_log[1998]['cost'] == 1998.
+        assert log[1998]['cost'] == 0.
+        assert log[2000]['cost'] == 2000.
+        assert pickled_log[2000]['cost'] == -1.
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_columnar_log_rewrite():
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        log = ColumnarLog(directory)
+        for time in range(10):
+            log[time]['cost'] = time
+        # Promoting the column to floats replaces its file
+        log[10]['cost'] = 0.5
+        assert len(os.listdir(directory)) == 1
+        log.status['iterations_done'] = 10
+        log.prune(RetentionPolicy(keep_last=2, every=2))
+        assert log.series('cost')[0].tolist() == [0, 2, 4, 6, 8, 9, 10]
+        assert len(os.listdir(directory)) == 1
+
+        # Files that were pickled are kept
+        pickled_log = cPickle.loads(cPickle.dumps(log))
+        for time in range(11, 20):
+            log[time]['cost'] = time
+        log.status['iterations_done'] = 19
+        log.prune(RetentionPolicy(keep_last=2, every=2))
+        assert len(os.listdir(directory)) == 2
+        assert pickled_log.series('cost')[0].tolist() == [0, 2, 4, 6, 8, 9,
+                                                          10]
+        log[20]['cost'] = 20
+        log.status['iterations_done'] = 20
+        log.prune(RetentionPolicy(keep_last=2, every=2))
+        assert len(os.listdir(directory)) == 2
+        assert log.series('cost')[0].tolist() == [
+            0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 19, 20]
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_series():
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        logs = [TrainingLog(), SQLiteLog(':memory:', buffered=False),
+                SQLiteLog(':memory:', buffered=True), ColumnarLog(directory)]
+        for log in logs:
+            for time in range(0, 100, 2):
+                log[time]['cost'] = float(time)
+            del log[98]['cost']
+            log.resume()
+            log[50]['cost'] = -1.
+            log[51]['cost'] = 'error'
+            log[52]['other'] = 1.
+
+            times, values = log.series('cost', start=40, stop=60, every=2)
+            assert times.tolist() == [40, 44, 48, 51, 54, 58]
+            assert values.tolist() == [40., 44., 48., 'error', 54., 58.]
+            times, values = log.series('cost', start=49, stop=51)
+            assert times.tolist() == [50]
+            assert values.tolist() == [-1.]
+            times, values = log.series('cost')
+            assert times.tolist() == list(range(0, 51, 2)) + [51] + list(
+                range(52, 98, 2))
+            assert values[26] == 'error'
+            times, values = log.series('missing')
+            assert len(times) == len(values) == 0
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_prune():
+    directory = mkdtemp(dir=config.temp_dir)
+    try:
+        for summarize in [False, True]:
+            policy = RetentionPolicy(keep_last=20, every=10,
+                                     summarize=summarize)
+            for log in [TrainingLog(), SQLiteLog(':memory:'),
+                        ColumnarLog(directory)]:
+                for time in range(100):
+                    log[time]['cost'] = float(time)
+                    log[time]['message'] = 'batch'
+                    log.status['iterations_done'] = time
+                log[15]['saved_to'] = ('model.zip',)
+                log.status['_epoch_ends'] = [25]
+                log.prune(policy)
+                assert log.status['_pruned_until'] == 70
+                assert log[15]['saved_to'] == ('model.zip',)
+                assert log[25] == {'cost': 25., 'message': 'batch'}
+                assert log[75] == {'cost': 75., 'message': 'batch'}
+                if summarize:
+                    assert set(log[9]) == {'cost', 'cost_min', 'cost_max'}
+                    assert log[9]['cost'] == 4.5
+                    assert log[29]['cost_max'] == 29.
+                    assert len(log[0]) == 0
+                    assert len(log[15]) == 1
+                else:
+                    assert log[10] == {'cost': 10., 'message': 'batch'}
+                    assert len(log[11]) == 0
+                    assert log.series('cost')[0][:8].tolist() == [
+                        0, 10, 20, 25, 30, 40, 50, 60]
+
+                # Pruning again only affects new rows
+                log.status['iterations_done'] = 100
+                log.prune(policy)
+                assert log.status['_pruned_until'] == 80
+                assert len(log[71]) == 0
+                assert ('cost_min' in log[79]) == summarize
+                assert ('cost_min' in log[69]) == summarize
+                if isinstance(log, ColumnarLog):
+                    # Summaries are stored in the columns
+                    assert not any(key.startswith('cost')
+                                   for entry in log.sparse.values()
+                                   for key in entry)
+                    assert log.series('cost_max')[0].tolist() == (
+                        [9, 19, 29, 39, 49, 59, 69, 79] if summarize
+                        else [])
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_log_sidecar():
+    handle, path = mkstemp()
+    os.close(handle)
+    try:
+        log = TrainingLog()
+        log[0]['cost'] = 1.
+        log.status['iterations_done'] = 1
+        offset = append_to_sidecar(log, path)
+        log[1]['cost'] = 2.
+        log[1]['saved_to'] = 'here'
+        log.status['iterations_done'] = 2
+        offset = append_to_sidecar(log, path, offset, start=1)
+        log[1]['cost'] = 3.
+        log[2]['cost'] = 4.
+        new_offset = append_to_sidecar(log, path, offset, start=1)
+
+        # Only the rows up to the given offset are read
+        loaded_log = cPickle.loads(cPickle.dumps(
+            SidecarReference(log, path, offset)))
+        assert isinstance(loaded_log, TrainingLog)
+        assert loaded_log.h_uuid == log.h_uuid
+        assert loaded_log.status['iterations_done'] == 2
+        assert dict(loaded_log) == {0: {'cost': 1.},
+                                    1: {'cost': 2., 'saved_to': 'here'}}
+        loaded_log = cPickle.loads(cPickle.dumps(
+            SidecarReference(log, path, new_offset)))
+        assert loaded_log[1]['cost'] == 3.
+        assert loaded_log[2]['cost'] == 4.
+    finally:
+        os.remove(path)
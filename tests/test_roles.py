@@ -1,5 +1,8 @@
 import blocks.roles
 from six.moves import cPickle
+from theano import tensor
+
+from blocks.roles import add_role
 
 
 def test_role_serialization():
@@ -16,3 +19,18 @@ def test_role_serialization():
     for role in roles:
         deserialized = cPickle.loads(cPickle.dumps(role))
         assert deserialized == role
+
+
+def test_role_tuples_shared():
+    W = tensor.matrix()
+    add_role(W, blocks.roles.WEIGHT)
+    role_tuples = []
+    for _ in range(3):
+        # Unpickled roles are new instances, but equal roles share tuples
+        unpickled = cPickle.loads(cPickle.dumps(W))
+        add_role(unpickled, blocks.roles.COST)
+        role_tuples.append(unpickled.tag.roles)
+        if len(role_tuples) == 1:
+            count = len(blocks.roles._role_tuples)
+    assert all(roles is role_tuples[0] for roles in role_tuples)
+    assert len(blocks.roles._role_tuples) == count
@@ -79,3 +79,29 @@ def test_selector():
     assert parameters[2][1] == b2.parameters[0]
     assert parameters[3][0] == "/t1/b2.W"
     assert parameters[3][1] == b2.parameters[1]
+
+
+def test_selector_wildcards():
+    b1 = MockBrickBottom(name="b1")
+    b2 = MockBrickBottom(name="b2")
+    b3 = MockBrickBottom(name="c3")
+    t1 = MockBrickTop([b1, b2], name="t1")
+    t2 = MockBrickTop([b2, b3], name="t2")
+    top = MockBrickTop([t1, t2], name="top")
+    selector = Selector([top])
+
+    assert selector.select("/top/*").bricks == [t1, t2]
+    assert selector.select("/top/*/b?").bricks == [b1, b2]
+    assert selector.select("/top/t[2]/*").bricks == [b2, b3]
+    assert selector.select("/top/*/d*").bricks == []
+    assert selector.select("/top/*/c3.*") == b3.parameters
+    assert selector.select("/top/t1.W") == [b1.parameters[1],
+                                            b2.parameters[1]]
+    assert list(selector.get_parameters("[V]")) == [
+        "/top/t1/b1.V", "/top/t1/b2.V", "/top/t2/b2.V", "/top/t2/c3.V"]
+
+    assert selector.select_regex(r"/top/t\d").bricks == [t1, t2]
+    assert selector.select_regex(r"/top/t\d/b").bricks == []
+    assert selector.select_regex(r"/top/t2/.*\.W") == [
+        b2.parameters[1], b3.parameters[1]]
+    assert selector.select_regex(r".*b1.*") == b1.parameters
@@ -1,15 +1,29 @@
+import io
+import os
+import shutil
 import warnings
+import zipfile
+from multiprocessing import Pipe
 from pickle import PicklingError
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, mkdtemp
 
 import numpy
 import theano
+from mock import patch
 from numpy.testing import assert_allclose, assert_raises
+from theano import tensor
 
 from blocks.bricks import MLP
 from blocks.config import config
 from blocks.initialization import Constant
-from blocks.serialization import load, dump, secure_dump, load_parameter_values
+from blocks.model import Model
+from blocks.serialization import (
+    ALIGNMENT, BLOB_INDEX, SHARD_INDEX, AlignedZipFile, BlobStore,
+    ParallelZipFile, ParameterValues, Shards,
+    dumps_with_buffers, import_factory, load, loads_with_buffers, dump,
+    dump_staged, receive_object, secure_dump, send_object,
+    load_parameter_values, read_arrays, shard_paths, stage)
+from blocks.serialization import _data_offset, _npy_header_length
 
 def foo():
     pass
@@ -79,3 +93,271 @@ def test_secure_dump():
     assert_raises(PicklingError, secure_dump, bar, f.name)
     with open(f.name, 'rb') as f:
         assert type(load(f)) is object
+
+
+def test_stage():
+    mlp = MLP(activations=[None], dims=[10, 10], weights_init=Constant(1.),
+              use_bias=False)
+    mlp.initialize()
+    W = mlp.linear_transformations[0].W
+    staged = stage(mlp)
+
+    # Changes after staging don't affect the staged object
+    W.set_value(W.get_value() * 2)
+    with NamedTemporaryFile(delete=False, dir=config.temp_dir) as f:
+        dump_staged(staged, f)
+    assert_allclose(load_parameter_values(f.name)['/mlp/linear_0.W'],
+                    numpy.ones((10, 10)))
+    mlp = load(f.name)
+    assert_allclose(mlp.linear_transformations[0].W.get_value(),
+                    numpy.ones((10, 10)))
+
+
+def test_load_parameter_values_mmap():
+    mlp = MLP(activations=[None], dims=[10, 10], weights_init=Constant(1.),
+              biases_init=Constant(2.))
+    mlp.initialize()
+    with NamedTemporaryFile(delete=False, dir=config.temp_dir) as f:
+        dump(mlp, f, compression=zipfile.ZIP_STORED)
+    with zipfile.ZipFile(f.name) as zip_file:
+        assert all(info.compress_type == zipfile.ZIP_STORED
+                   for info in zip_file.infolist())
+
+    parameter_values = load_parameter_values(f.name)
+    W = parameter_values['/mlp/linear_0.W']
+    assert isinstance(W, numpy.memmap)
+    assert W.ctypes.data % ALIGNMENT == 0
+    assert_allclose(W, numpy.ones((10, 10)))
+    assert_allclose(parameter_values['/mlp/linear_0.b'], 2 * numpy.ones(10))
+
+    # Changes to the arrays aren't written to the file
+    W[:] = 3
+    assert_allclose(load_parameter_values(f.name)['/mlp/linear_0.W'],
+                    numpy.ones((10, 10)))
+    W = load_parameter_values(f.name, mmap_mode=None)['/mlp/linear_0.W']
+    assert not isinstance(W, numpy.memmap)
+
+    # The file can still be read as usual
+    mlp = load(f.name)
+    assert_allclose(mlp.linear_transformations[0].W.get_value(),
+                    numpy.ones((10, 10)))
+    assert_allclose(numpy.load(f.name)['mlp-linear_0.W'],
+                    numpy.ones((10, 10)))
+
+
+def test_parallel_compression():
+    mlp = MLP(activations=[None, None], dims=[10, 20, 30],
+              weights_init=Constant(1.), biases_init=Constant(2.))
+    mlp.initialize()
+    values = {}
+    for i, linear in enumerate(mlp.linear_transformations):
+        for parameter in linear.parameters:
+            parameter.set_value(numpy.random.rand(
+                *parameter.get_value().shape).astype(parameter.dtype))
+            name = 'mlp-linear_{}.{}'.format(i, parameter.name)
+            values[name] = parameter.get_value()
+    with NamedTemporaryFile(delete=False, dir=config.temp_dir) as f:
+        dump(mlp, f, compression_level=1, threads=3)
+    with zipfile.ZipFile(f.name) as zip_file:
+        assert zip_file.testzip() is None
+        assert set(zip_file.namelist()) == set(values) | set(['pkl'])
+        # The arrays are only stored once, outside of the pickle
+        assert values['mlp-linear_1.W'].tobytes() not in zip_file.read('pkl')
+        arrays = read_arrays(zip_file, threads=2)
+    for name, value in values.items():
+        assert_allclose(arrays[name], value)
+
+    mlp = load(f.name, threads=2)
+    assert_allclose(mlp.linear_transformations[1].W.get_value(),
+                    values['mlp-linear_1.W'])
+    parameter_values = load_parameter_values(f.name, lazy=False, threads=2)
+    assert_allclose(parameter_values['/mlp/linear_1.W'],
+                    values['mlp-linear_1.W'])
+
+
+def test_zip_files_round_trip():
+    # The zip files are written using internals of the zipfile module
+    # which differ between Python versions, they must be readable by it
+    arrays = {}
+    for i, shape in enumerate([(3,), (100, 7), (0,)]):
+        data = io.BytesIO()
+        numpy.save(data, numpy.random.rand(*shape))
+        arrays['array_{}'.format(i)] = data.getvalue()
+    contents = [('array_0', zipfile.ZIP_DEFLATED), ('text', None),
+                ('array_1', zipfile.ZIP_STORED), ('array_2', None),
+                ('zinfo', zipfile.ZIP_DEFLATED)]
+    for zip_class in [AlignedZipFile, ParallelZipFile]:
+        for compression in [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]:
+            f = io.BytesIO()
+            f.write(b'preamble')
+            with zip_class(f, 'w', compression) as zip_file:
+                for name, compress_type in contents:
+                    if name == 'zinfo':
+                        zip_file.writestr(zipfile.ZipInfo(name), b'zinfo')
+                    else:
+                        zip_file.writestr(name, arrays.get(name, b'text'),
+                                          compress_type)
+            # Appending to the zip file
+            with zip_class(f, 'a', compression) as zip_file:
+                zip_file.writestr('appended', arrays['array_1'])
+            with zipfile.ZipFile(f) as zip_file:
+                assert zip_file.testzip() is None
+                assert zip_file.namelist() == [
+                    name for name, _ in contents] + ['appended']
+                for name, data in arrays.items():
+                    assert zip_file.read(name) == data
+                assert zip_file.read('text') == b'text'
+                assert zip_file.read('zinfo') == b'zinfo'
+                assert zip_file.read('appended') == arrays['array_1']
+                # Stored arrays are aligned
+                for info in zip_file.infolist():
+                    if (info.compress_type == zipfile.ZIP_STORED and
+                            info.filename in ('array_1', 'appended')):
+                        offset = (_data_offset(f, info) +
+                                  _npy_header_length(arrays['array_1']))
+                        assert offset % ALIGNMENT == 0
+
+
+def test_blob_store():
+    store = BlobStore(mkdtemp())
+    try:
+        mlp = MLP(activations=[None], dims=[10, 10],
+                  weights_init=Constant(1.), biases_init=Constant(2.))
+        mlp.initialize()
+        W = mlp.linear_transformations[0].W
+        checkpoints = []
+        for i in range(3):
+            with NamedTemporaryFile(delete=False, dir=config.temp_dir) as f:
+                dump(mlp, f, store=store)
+            checkpoints.append(f.name)
+            if i == 0:
+                W.set_value(W.get_value() * 2)
+        # The biases are only stored once, the weights twice
+        assert len(os.listdir(store.directory)) == 3
+        with zipfile.ZipFile(checkpoints[0]) as zip_file:
+            assert set(zip_file.namelist()) == set(['pkl', BLOB_INDEX])
+
+        parameter_values = load_parameter_values(checkpoints[0])
+        assert_allclose(parameter_values['/mlp/linear_0.W'],
+                        numpy.ones((10, 10)))
+        assert isinstance(parameter_values['/mlp/linear_0.W'], numpy.memmap)
+        assert_allclose(load_parameter_values(checkpoints[2])[
+            '/mlp/linear_0.b'], 2 * numpy.ones(10))
+        mlp = load(checkpoints[2])
+        assert_allclose(mlp.linear_transformations[0].W.get_value(),
+                        2 * numpy.ones((10, 10)))
+
+        os.remove(checkpoints[0])
+        assert store.collect_garbage(checkpoints) == 1
+        assert len(os.listdir(store.directory)) == 2
+        assert_allclose(load_parameter_values(checkpoints[1])[
+            '/mlp/linear_0.W'], 2 * numpy.ones((10, 10)))
+    finally:
+        shutil.rmtree(store.directory)
+
+
+def test_shards():
+    directory = mkdtemp()
+    try:
+        mlp = MLP(activations=[None, None], dims=[10, 20, 30],
+                  weights_init=Constant(1.), biases_init=Constant(2.))
+        mlp.initialize()
+        values = {}
+        for i, linear in enumerate(mlp.linear_transformations):
+            for parameter in linear.parameters:
+                parameter.set_value(numpy.random.rand(
+                    *parameter.get_value().shape).astype(parameter.dtype))
+                name = '/mlp/linear_{}.{}'.format(i, parameter.name)
+                values[name] = parameter.get_value()
+        path = os.path.join(directory, 'sharded.tar')
+        shards = Shards(path, 3, compression=zipfile.ZIP_STORED)
+        with open(path, 'wb') as f:
+            dump(mlp, f, shards=shards)
+        with zipfile.ZipFile(path) as zip_file:
+            assert set(zip_file.namelist()) == set(['pkl', SHARD_INDEX])
+        # The weights of 20x30 and 10x20 go to shards of their own
+        paths = shard_paths(path)
+        assert len(paths) == 3
+        assert all(os.path.dirname(shard) == directory for shard in paths)
+        assert (set(numpy.load(paths[0]).keys()) ==
+                set(['mlp-linear_1.W']))
+        assert (set(numpy.load(paths[2]).keys()) ==
+                set(['mlp-linear_0.b', 'mlp-linear_1.b']))
+
+        with load_parameter_values(path, lazy=True) as parameter_values:
+            assert set(parameter_values) == set(values)
+            assert isinstance(parameter_values['/mlp/linear_1.W'],
+                              numpy.memmap)
+            for name, value in values.items():
+                assert_allclose(parameter_values[name], value)
+        for name, value in load_parameter_values(path, lazy=False).items():
+            assert_allclose(value, values[name])
+        mlp = load(path, threads=2)
+        assert_allclose(mlp.linear_transformations[1].W.get_value(),
+                        values['/mlp/linear_1.W'])
+
+        with open(path, 'wb') as f:
+            assert_raises(ValueError, dump, mlp, f, store=directory,
+                          shards=Shards(path, 2))
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_parameter_values_lazy():
+    mlp = MLP(activations=[None, None], dims=[10, 10, 10],
+              weights_init=Constant(1.), biases_init=Constant(2.))
+    mlp.initialize()
+    with NamedTemporaryFile(delete=False, dir=config.temp_dir) as f:
+        dump(mlp, f)
+
+    assert isinstance(load_parameter_values(f.name), dict)
+    with load_parameter_values(f.name, lazy=True) as parameter_values:
+        assert isinstance(parameter_values, ParameterValues)
+        assert len(parameter_values) == 4
+        assert '/mlp/linear_1.b' in parameter_values
+
+        # Only the parameters of the model are read
+        partial_mlp = MLP(activations=[None], dims=[10, 10])
+        partial_mlp.allocate()
+        model = Model(partial_mlp.apply(tensor.matrix('x')))
+        with patch('numpy.lib.format.read_array',
+                   wraps=numpy.lib.format.read_array) as read_array:
+            model.set_parameter_values(parameter_values)
+        assert read_array.call_count == 2
+        assert_allclose(partial_mlp.linear_transformations[0].b.get_value(),
+                        2 * numpy.ones(10))
+    assert parameter_values.zip_file.fp is None
+
+
+def test_import_factory():
+    assert import_factory('blocks.serialization:load') is load
+    assert import_factory('blocks.serialization:BlobStore.hash') is \
+        BlobStore.hash
+    assert import_factory(foo) is foo
+    assert_raises(ValueError, import_factory, 'blocks.serialization')
+
+
+def test_dumps_with_buffers():
+    mlp = MLP(activations=[None], dims=[10, 10], weights_init=Constant(1.),
+              biases_init=Constant(2.))
+    mlp.initialize()
+    W = mlp.linear_transformations[0].W
+    data, buffers = dumps_with_buffers(mlp)
+    assert len(buffers) == 2
+    assert W.get_value().tobytes() not in data
+
+    # The arrays are created on top of the buffers
+    mlp2 = loads_with_buffers(data, buffers)
+    W2 = mlp2.linear_transformations[0].W
+    assert_allclose(W2.get_value(), numpy.ones((10, 10)))
+    assert numpy.may_share_memory(W.get_value(borrow=True),
+                                  W2.get_value(borrow=True))
+
+    connection, other_connection = Pipe()
+    send_object(connection, mlp)
+    mlp3 = receive_object(other_connection)
+    W3 = mlp3.linear_transformations[0].W
+    assert_allclose(W3.get_value(), numpy.ones((10, 10)))
+    assert W3.get_value(borrow=True).flags.writeable
+    assert_allclose(mlp3.linear_transformations[0].b.get_value(),
+                    2 * numpy.ones(10))
@@ -1,10 +1,12 @@
 from nose.tools import raises
+from six.moves import cPickle
 
-from blocks.bricks import Bias, Linear, Logistic
+from blocks.bricks import Bias, Linear, Logistic, MLP
 from blocks.bricks.parallel import Merge
 from blocks.filter import VariableFilter
 from blocks.graph import ComputationGraph
-from blocks.roles import BIAS, FILTER, PARAMETER, OUTPUT
+from blocks.roles import (BIAS, COST, FILTER, INPUT, PARAMETER, OUTPUT,
+                          add_role)
 
 from theano import tensor
 
@@ -91,6 +93,49 @@ def test_variable_filter():
     assert outputs_application == [merged]
 
 
+def test_variable_filter_index():
+    mlp = MLP([Logistic(), Logistic()], [2, 3, 4])
+    x = tensor.matrix('x')
+    y = mlp.apply(x)
+    y.name = 'y'
+    cg = ComputationGraph(mlp.apply(y))
+    linear = mlp.linear_transformations[0]
+    filters = [
+        VariableFilter(),
+        VariableFilter(roles=[PARAMETER]),
+        VariableFilter(roles=[INPUT, OUTPUT]),
+        VariableFilter(roles=[PARAMETER, BIAS], each_role=True),
+        VariableFilter(roles=[FILTER]),
+        VariableFilter(bricks=[Linear]),
+        VariableFilter(bricks=[linear, Logistic], roles=[OUTPUT]),
+        VariableFilter(bricks=[]),
+        VariableFilter(name='W'),
+        VariableFilter(name_regex='(W|b)$', bricks=[linear]),
+        VariableFilter(theano_name='y'),
+        VariableFilter(theano_name_regex='linear_0'),
+        VariableFilter(applications=[linear.apply, mlp.apply],
+                       roles=[INPUT])]
+    for var_filter in filters:
+        assert var_filter.query(cg.index) == var_filter(cg.variables)
+    inputs = VariableFilter(roles=[INPUT], applications=[mlp.apply]).query(
+        cg.index)
+    assert len(inputs) == 2
+
+    # Filtering the graph itself sees later annotations, the index doesn't
+    add_role(cg.outputs[0], COST)
+    cg.outputs[0].name = 'cost'
+    for var_filter in [VariableFilter(roles=[COST]),
+                       VariableFilter(theano_name='cost')]:
+        assert var_filter(cg) == [cg.outputs[0]]
+        assert var_filter.query(cg.index) == []
+    del cg.index
+    for var_filter in [VariableFilter(roles=[COST]),
+                       VariableFilter(theano_name='cost')]:
+        assert var_filter.query(cg.index) == [cg.outputs[0]]
+
+    assert '_index' not in cPickle.loads(cPickle.dumps(cg)).__dict__
+
+
 @raises(TypeError)
 def test_variable_filter_roles_error():
     # Creating computation graph